@@ -0,0 +1,279 @@
+"""!
+\file assignmentcodec.py
+
+# Assignment Codec
+
+Assignments to a set of random variables are represented throughout the
+library as sets of (variable id, value) pairs. This file contains a codec that
+maps such assignments to a single integer using mixed radix strides: the
+variables of the scope are ordered, the values of each variable are indexed,
+and an assignment \f[ (x_1, \dots, x_k) \f] with value indices
+\f[ (i_1, \dots, i_k) \f] is encoded as \f[ \sum_j i_j \cdot s_j \f] where
+\f[ s_j = \prod_{l > j} |Val(X_l)| \f]. This is the same computation that
+maps an assignment to a position in a factor table, see Koller, Friedman 2009,
+p. 358-359.
+"""
+
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+
+from typing import Set, List, Tuple, Dict, Iterable, Sequence
+
+
+def strides_of(cards: List[int]) -> List[int]:
+    """!
+    \brief compute row major strides of given axis cardinalities
+
+    \param cards cardinality of each axis
+
+    \code{.py}
+
+    >>> strides_of([2, 3, 4])
+    >>> [12, 4, 1]
+
+    \endcode
+    """
+    strides = [1] * len(cards)
+    for i in range(len(cards) - 2, -1, -1):
+        strides[i] = strides[i + 1] * cards[i + 1]
+    return strides
+
+
+class AssignmentCodec:
+    """!
+    \brief Mixed radix encoding of assignments over an ordered scope
+    """
+
+    def __init__(self, var_ids: List[str], domains: List[List[NumericValue]]):
+        """!
+        \brief constructor of the codec
+
+        \param var_ids identifiers of variables in axis order
+        \param domains values of each variable
+
+        \throws ValueError if the number of domains does not match the number
+        of variables
+        """
+        if len(var_ids) != len(domains):
+            raise ValueError("number of domains must match number of variables")
+        self.var_ids: List[str] = list(var_ids)
+        self.domains: List[List[NumericValue]] = [list(d) for d in domains]
+        self.value_index: List[Dict[NumericValue, int]] = [
+            {v: i for i, v in enumerate(d)} for d in self.domains
+        ]
+        self.cards: List[int] = [len(d) for d in self.domains]
+        self.strides: List[int] = strides_of(self.cards)
+        self.axis_of: Dict[str, int] = {vid: i for i, vid in enumerate(self.var_ids)}
+        size = 1
+        for c in self.cards:
+            size *= c
+        self.size = size
+
+    @classmethod
+    def from_vars(cls, svars: List[NumCatRVariable]):
+        """!
+        \brief make codec from ordered random variables using their values
+
+        \param svars random variables in axis order
+        """
+        return AssignmentCodec(
+            var_ids=[s.id() for s in svars], domains=[list(s.values()) for s in svars]
+        )
+
+    def __eq__(self, other):
+        """!
+        \brief two codecs are equal if they encode the same scope in the same
+        order
+        """
+        if not isinstance(other, AssignmentCodec):
+            return False
+        if self is other:
+            return True
+        return self.var_ids == other.var_ids and self.domains == other.domains
+
+    def __hash__(self):
+        ""
+        return hash((tuple(self.var_ids), tuple([tuple(d) for d in self.domains])))
+
+    def __len__(self):
+        """!
+        \brief number of variables in the scope of the codec
+        """
+        return len(self.var_ids)
+
+    def encode(
+        self, assignment: Iterable[Tuple[str, NumericValue]], partial: bool = False
+    ) -> int:
+        """!
+        \brief encode an assignment into an integer
+
+        Pairs whose variable is not in the scope of the codec are ignored.
+
+        \param assignment iterable of (id, value) pairs
+        \param partial if True, unassigned variables are encoded as their first
+        value, which gives the offset of the slice that fixes the assigned
+        variables.
+
+        \throws ValueError if a value is not in the domain of its variable, or
+        if the assignment does not cover the scope while partial is False.
+        """
+        if isinstance(assignment, EncodedAssignment):
+            if assignment.codec == self:
+                return assignment.index
+        index = 0
+        nb_assigned = 0
+        for vid, value in assignment:
+            axis = self.axis_of.get(vid)
+            if axis is None:
+                continue
+            pos = self.value_index[axis].get(value)
+            if pos is None:
+                msg = "Value " + str(value) + " is not in domain of " + vid
+                raise ValueError(msg)
+            index += pos * self.strides[axis]
+            nb_assigned += 1
+        if partial is False and nb_assigned != len(self.cards):
+            raise ValueError("Assignment does not cover the scope of this codec")
+        return index
+
+    def decode(self, index: int) -> Set[Tuple[str, NumericValue]]:
+        """!
+        \brief decode an integer into an assignment
+        """
+        return set(self.decode_pairs(index))
+
+    def decode_pairs(self, index: int) -> List[Tuple[str, NumericValue]]:
+        """!
+        \brief decode an integer into (id, value) pairs in axis order
+        """
+        if index < 0 or index >= self.size:
+            raise ValueError("Index " + str(index) + " is out of codec range")
+        return [
+            (vid, domain[(index // stride) % card])
+            for vid, domain, stride, card in zip(
+                self.var_ids, self.domains, self.strides, self.cards
+            )
+        ]
+
+    def encode_indices(self, row: Sequence[int]) -> int:
+        """!
+        \brief encode value indices given in axis order
+        """
+        return sum([i * s for i, s in zip(row, self.strides)])
+
+    def decode_indices(self, index: int) -> List[int]:
+        """!
+        \brief decode an integer into value indices in axis order
+        """
+        return [(index // s) % c for s, c in zip(self.strides, self.cards)]
+
+    def encode_batch(self, rows: Sequence[Sequence[int]]) -> List[int]:
+        """!
+        \brief encode a batch of value index rows
+
+        The batch is processed column by column so that each variable
+        costs a single pass over the batch.
+
+        \param rows N x k value indices in axis order
+
+        \throws ValueError if a row does not have k indices or if an index is
+        out of the range of its axis
+
+        \return N codes
+        """
+        if any(len(row) != len(self.cards) for row in rows):
+            msg = "Each row must have " + str(len(self.cards)) + " value indices"
+            raise ValueError(msg)
+        codes = [0] * len(rows)
+        for axis, (stride, card) in enumerate(zip(self.strides, self.cards)):
+            column = [row[axis] for row in rows]
+            if len(column) > 0 and (min(column) < 0 or max(column) >= card):
+                msg = "Value index out of range for " + self.var_ids[axis]
+                raise ValueError(msg)
+            codes = [c + i * stride for c, i in zip(codes, column)]
+        return codes
+
+    def decode_batch(self, codes: Sequence[int]) -> List[List[int]]:
+        """!
+        \brief decode a batch of codes into value index rows
+
+        \return N x k value indices in axis order
+        """
+        columns = [[(c // s) % card for c in codes] for s, card in zip(self.strides, self.cards)]
+        return [list(row) for row in zip(*columns)]
+
+    def encode_value_batch(self, rows: Sequence[Sequence[NumericValue]]) -> List[int]:
+        """!
+        \brief encode a batch of value rows given in axis order
+
+        \throws KeyError if a value is not in the domain of its variable
+        """
+        codes = [0] * len(rows)
+        for axis, (stride, index) in enumerate(zip(self.strides, self.value_index)):
+            codes = [c + index[row[axis]] * stride for c, row in zip(codes, rows)]
+        return codes
+
+    def assignment(self, index: int):
+        """!
+        \brief wrap a code as an EncodedAssignment of this codec
+        """
+        if index < 0 or index >= self.size:
+            raise ValueError("Index " + str(index) + " is out of codec range")
+        return EncodedAssignment(codec=self, index=index)
+
+    def project(self, other, index: int) -> int:
+        """!
+        \brief map a code of this codec into the code of another codec
+
+        The scope of the other codec must be contained in the scope of this
+        one.
+        """
+        code = 0
+        for vid, stride in zip(other.var_ids, other.strides):
+            axis = self.axis_of[vid]
+            pos = (index // self.strides[axis]) % self.cards[axis]
+            value = self.domains[axis][pos]
+            code += other.value_index[other.axis_of[vid]][value] * stride
+        return code
+
+
+class EncodedAssignment:
+    """!
+    \brief An assignment stored as a code of an AssignmentCodec
+
+    It iterates over (id, value) pairs like the set based assignments used
+    throughout the library, so it can be given wherever such an assignment is
+    expected. Factors sharing the same codec read the code directly.
+    """
+
+    def __init__(self, codec: AssignmentCodec, index: int):
+        ""
+        self.codec = codec
+        self.index = index
+
+    def __iter__(self):
+        ""
+        return iter(self.codec.decode_pairs(self.index))
+
+    def __len__(self):
+        ""
+        return len(self.codec)
+
+    def __contains__(self, pair):
+        ""
+        return pair in self.codec.decode_pairs(self.index)
+
+    def __eq__(self, other):
+        ""
+        if isinstance(other, EncodedAssignment):
+            return self.codec == other.codec and self.index == other.index
+        return set(self) == set(other)
+
+    def __hash__(self):
+        ""
+        return hash(frozenset(self.codec.decode_pairs(self.index)))
+
+    def to_set(self) -> Set[Tuple[str, NumericValue]]:
+        """!
+        \brief decode into a set of (id, value) pairs
+        """
+        return self.codec.decode(self.index)
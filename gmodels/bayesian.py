@@ -1,5 +1,23 @@
 """!
 Bayesian Network model
+
+Queries on a Bayesian network only need a part of the network, Koller,
+Friedman 2009, p. 301 and Darwiche 2009, p. 144:
+
+- barren nodes, leaves that are neither queried nor observed, can be removed
+  with their conditional probability distribution, and removing them can
+  make their parents barren. The nodes left are the ancestors of query and
+  observed variables.
+
+- in the remaining network, the distributions of nodes that are
+  d-separated from the query given the evidence only scale the result by a
+  constant. They are found with the moral graph of the remaining network
+  from which observed variables are removed, Lauritzen et al. 1990: a
+  distribution is needed if its scope, without observed variables, is
+  connected to a query variable.
+
+The factors left after pruning give a result proportional to the result of
+the whole network, so normalized results do not change.
 """
 
 from gmodels.gtypes.digraph import DiGraph
@@ -7,7 +25,9 @@ from gmodels.gtypes.edge import Edge
 from gmodels.randomvariable import NumCatRVariable
 from gmodels.factor import Factor
 from gmodels.pgmodel import PGModel
-from typing import Set
+from gmodels.sampling import ForwardSampler, LikelihoodWeighting
+from gmodels.randomvariable import NumericValue
+from typing import Set, List, Dict, Optional, Tuple
 from uuid import uuid4
 
 
@@ -46,3 +66,110 @@ class BayesianNetwork(PGModel, DiGraph):
         return BayesianNetwork(
             gid=str(uuid4()), nodes=dig.nodes(), edges=dig.edges(), factors=fs
         )
+
+    def forward_sampler(self, seed: Optional[int] = None) -> ForwardSampler:
+        """!
+        \brief sampler of joint assignments of the network, Koller, Friedman
+        2009, p. 489
+
+        \see ForwardSampler
+        """
+        return ForwardSampler(self, seed=seed)
+
+    def likelihood_weighting(
+        self,
+        evidences: Optional[Set[Tuple[str, NumericValue]]] = None,
+        proposal: Optional[Dict[str, List[List[float]]]] = None,
+        seed: Optional[int] = None,
+    ) -> LikelihoodWeighting:
+        """!
+        \brief approximate inference by weighted samples of the network,
+        Koller, Friedman 2009, p. 493
+
+        \see LikelihoodWeighting
+        """
+        return LikelihoodWeighting(
+            self, evidences=evidences, proposal=proposal, seed=seed
+        )
+
+    def parent_ids(self) -> Dict[str, Set[str]]:
+        """!
+        \brief identifiers of the parents of each node
+        """
+        parents: Dict[str, Set[str]] = {n.id(): set() for n in self.nodes()}
+        for e in self.edges():
+            parents[e.end().id()].add(e.start().id())
+        return parents
+
+    def family_factors(self, factors: List[Factor]) -> Optional[Dict[str, int]]:
+        """!
+        \brief index of the conditional distribution of each node, the factor
+        whose scope is the node and its parents
+
+        \return None if some node has no such factor or if a factor is not
+        the distribution of a node
+        """
+        parents = self.parent_ids()
+        family_of = {frozenset(ps | set([n])): n for n, ps in parents.items()}
+        cpd: Dict[str, int] = {}
+        for i, f in enumerate(factors):
+            n = family_of.get(frozenset(f.var_of))
+            if n is None or n in cpd:
+                return None
+            cpd[n] = i
+        if len(cpd) != len(parents):
+            return None
+        return cpd
+
+    def ancestral_set(self, nodes: Set[str]) -> Set[str]:
+        """!
+        \brief given nodes and their ancestors, the nodes left once barren
+        nodes are removed repeatedly
+        """
+        parents = self.parent_ids()
+        ancestors = set(nodes)
+        stack = list(nodes)
+        while len(stack) > 0:
+            for p in parents[stack.pop()]:
+                if p not in ancestors:
+                    ancestors.add(p)
+                    stack.append(p)
+        return ancestors
+
+    def relevant_factors(
+        self, factors: List[Factor], queries: Set[str], evidence: Set[str]
+    ) -> Optional[Set[int]]:
+        """!
+        \brief conditional distributions needed by a query, after removing
+        barren nodes and nodes d-separated from the query given the evidence
+
+        \see PGModel.relevant_factors(factors, queries, evidence)
+
+        \return None if the factors are not one distribution per node
+        """
+        cpd = self.family_factors(factors)
+        if cpd is None:
+            return None
+        evidence = set(evidence) - set(queries)
+        kept = self.ancestral_set(set(queries) | evidence)
+        parents = self.parent_ids()
+        # moral graph of the kept nodes without observed variables
+        moral: Dict[str, Set[str]] = {n: set() for n in kept - evidence}
+        for n in kept:
+            family = (parents[n] | set([n])) - evidence
+            for a in family:
+                moral[a].update(family - set([a]))
+        connected = set(queries)
+        stack = list(queries)
+        while len(stack) > 0:
+            for m in moral[stack.pop()]:
+                if m not in connected:
+                    connected.add(m)
+                    stack.append(m)
+        return set(
+            [
+                cpd[n]
+                for n in kept
+                if len(((parents[n] | set([n])) - evidence) & connected) > 0
+            ]
+        )
@@ -0,0 +1,375 @@
+"""!
+\file beliefpropagation.py
+
+# Loopy Belief Propagation
+
+Exact inference is exponential in the treewidth of a model, which makes it
+unusable on grids and densely connected Markov networks. This file contains
+loopy belief propagation, Koller, Friedman 2009, p. 391, which passes sum
+product messages on the factor graph of the model until they stop changing:
+
+\f[ \delta_{v \rightarrow a}(x) = \prod_{b \in N(v) - \{a\}}
+\delta_{b \rightarrow v}(x) \f]
+
+\f[ \delta_{a \rightarrow v}(x) = \sum_{x_a : x_v = x} \phi_a(x_a)
+\prod_{u \in N(a) - \{v\}} \delta_{u \rightarrow a}(x_u) \f]
+
+Messages are normalized so that they sum to one. Two schedules are
+available:
+
+- synchronous: every factor to variable message is computed from the
+  messages of the previous iteration,
+- residual: the message that changes the most is sent first, Elidan et al.
+  2006, and only the messages that depend on it are computed again.
+
+Damping replaces a new message by a weighted average of the new and the
+previous message, which helps convergence on models with strong loops.
+
+Messages are lists of floats over the values of a variable and factors are
+read once into tables, so a message update only costs a pass over the table
+of its factor.
+"""
+
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+from gmodels.tabularfactor import TabularFactor
+
+from collections import namedtuple
+from typing import Set, List, Dict, Tuple, Optional, Union
+import heapq
+import time
+
+
+SCHEDULES = ("synchronous", "residual")
+
+IterationStats = namedtuple(
+    "IterationStats", ["iteration", "max_residual", "nb_updates", "elapsed"]
+)
+IterationStats.__doc__ = """!
+\\brief convergence statistics of an iteration of loopy belief propagation
+
+- iteration: number of the iteration, starting at 1
+- max_residual: largest change of a factor to variable message, in max norm
+- nb_updates: number of factor to variable messages sent
+- elapsed: seconds since the start of the run
+"""
+
+
+def normalize(m: List[float]) -> List[float]:
+    """!
+    \brief scale a message so that it sums to one
+
+    \throws ValueError if every value is zero
+    """
+    total = sum(m)
+    if total == 0:
+        raise ValueError("Evidence has zero probability")
+    return [x / total for x in m]
+
+
+class LoopyBeliefPropagation:
+    """!
+    \brief approximate marginals by message passing on the factor graph of a
+    model
+
+    \code{.py}
+
+    >>> bp = LoopyBeliefPropagation(model, damping=0.5, schedule="residual")
+    >>> bp.run(set([("a", True)]))
+    >>> True
+    >>> bp.marginal(c).phi(set([("c", True)]))
+    >>> 0.32
+    >>> bp.stats[-1].max_residual
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        model,
+        damping: float = 0.0,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100,
+        schedule: str = "synchronous",
+        time_limit: Optional[float] = None,
+    ):
+        """!
+        \param model a PGModel, its factors are read once and are not modified
+        \param damping weight of the previous message in a new message, in
+        [0, 1)
+        \param tolerance messages have converged when no message changes by
+        more than tolerance
+        \param max_iterations maximum number of iterations. An iteration of
+        the residual schedule sends as many messages as there are edges in
+        the factor graph.
+        \param schedule one of SCHEDULES
+        \param time_limit maximum duration of a run in seconds, checked after
+        each iteration
+
+        \throws ValueError if a parameter is out of range or the model has no
+        factors
+        """
+        if not 0 <= damping < 1:
+            raise ValueError("Damping must be in [0, 1)")
+        if schedule not in SCHEDULES:
+            msg = "Unknown schedule " + str(schedule) + ", must be one of "
+            msg += ", ".join(SCHEDULES)
+            raise ValueError(msg)
+        if max_iterations < 1:
+            raise ValueError("max_iterations must be positive")
+        factors = sorted(model.factors(), key=lambda f: f.id())
+        if len(factors) == 0:
+            raise ValueError("Model must have factors")
+        self.damping = damping
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.schedule = schedule
+        self.time_limit = time_limit
+        self.variables: Dict[str, NumCatRVariable] = {n.id(): n for n in model.nodes()}
+        for f in factors:
+            for v in f.scope_vars():
+                self.variables.setdefault(v.id(), v)
+        self.domains: Dict[str, List[NumericValue]] = {
+            vid: list(v.values()) for vid, v in self.variables.items()
+        }
+        # factor graph: scopes, tables and value indices of each entry
+        self.scopes: List[List[str]] = []
+        self.tables: List[List[float]] = []
+        self.entries: List[List[Tuple[int, ...]]] = []
+        self.neighbours: Dict[str, List[Tuple[int, int]]] = {
+            vid: [] for vid in self.variables
+        }
+        for a, f in enumerate(factors):
+            t = TabularFactor.from_factor(f)
+            index = [
+                {x: i for i, x in enumerate(self.domains[vid])} for vid in t.var_ids
+            ]
+            self.scopes.append(list(t.var_ids))
+            self.tables.append(t.table_values())
+            # factor domains can be smaller than variable domains
+            positions = [
+                [index[k][x] for x in domain] for k, domain in enumerate(t.domains)
+            ]
+            self.entries.append(
+                [
+                    tuple([positions[k][i] for k, i in enumerate(row)])
+                    for row in t.codec.decode_batch(range(t.codec.size))
+                ]
+            )
+            for k, vid in enumerate(t.var_ids):
+                self.neighbours[vid].append((a, k))
+        self.edges: List[Tuple[int, int]] = [
+            (a, k) for a in range(len(self.scopes)) for k in range(len(self.scopes[a]))
+        ]
+        self.evidence: Dict[str, int] = {}
+        self.to_var: Dict[Tuple[int, int], List[float]] = {}
+        self.to_factor: Dict[Tuple[int, int], List[float]] = {}
+        self.stats: List[IterationStats] = []
+        self.converged = False
+
+    def set_evidences(self, evidences: Set[Tuple[str, NumericValue]]):
+        """!
+        \brief observed values, replacing previous ones
+
+        \throws ValueError if a variable is unknown or a value is not in its
+        domain
+        """
+        evidence = {}
+        for vid, value in evidences:
+            if vid not in self.domains:
+                raise ValueError("Variable " + str(vid) + " is not in the model")
+            if value not in self.domains[vid]:
+                msg = "Value " + str(value) + " is not in domain of " + vid
+                raise ValueError(msg)
+            evidence[vid] = self.domains[vid].index(value)
+        self.evidence = evidence
+
+    def unit(self, vid: str) -> List[float]:
+        """!
+        \brief message that only carries the evidence on a variable
+        """
+        if vid in self.evidence:
+            return [
+                1.0 if i == self.evidence[vid] else 0.0
+                for i in range(len(self.domains[vid]))
+            ]
+        return [1.0 for _ in self.domains[vid]]
+
+    def variable_message(self, a: int, k: int) -> List[float]:
+        """!
+        \brief message from the k-th variable of factor a to the factor
+        """
+        vid = self.scopes[a][k]
+        m = self.unit(vid)
+        for b, j in self.neighbours[vid]:
+            if b != a:
+                incoming = self.to_var[(b, j)]
+                m = [x * y for x, y in zip(m, incoming)]
+        return normalize(m)
+
+    def factor_message(self, a: int, k: int) -> List[float]:
+        """!
+        \brief damped message from factor a to its k-th variable
+        """
+        incoming = [self.to_factor[(a, j)] for j in range(len(self.scopes[a]))]
+        others = [j for j in range(len(incoming)) if j != k]
+        m = [0.0 for _ in self.domains[self.scopes[a][k]]]
+        for value, entry in zip(self.tables[a], self.entries[a]):
+            if value == 0:
+                continue
+            for j in others:
+                value *= incoming[j][entry[j]]
+            m[entry[k]] += value
+        m = normalize(m)
+        if self.damping > 0:
+            old = self.to_var[(a, k)]
+            m = [(1 - self.damping) * x + self.damping * y for x, y in zip(m, old)]
+        return m
+
+    @staticmethod
+    def residual(m: List[float], old: List[float]) -> float:
+        ""
+        return max([abs(x - y) for x, y in zip(m, old)])
+
+    def run(self, evidences: Optional[Set[Tuple[str, NumericValue]]] = None) -> bool:
+        """!
+        \brief pass messages until they converge, the iteration limit or the
+        time limit
+
+        Messages start from uniform messages at each run.
+
+        \param evidences set of (id, value) pairs, previous evidence is kept if
+        it is not provided
+
+        \return whether messages converged, statistics of each iteration are
+        in stats
+        """
+        if evidences is not None:
+            self.set_evidences(evidences)
+        for a, k in self.edges:
+            size = len(self.domains[self.scopes[a][k]])
+            self.to_var[(a, k)] = [1.0 / size for _ in range(size)]
+        for a, k in self.edges:
+            self.to_factor[(a, k)] = self.variable_message(a, k)
+        self.stats = []
+        self.converged = False
+        start = time.monotonic()
+        if self.schedule == "synchronous":
+            self.run_synchronous(start)
+        else:
+            self.run_residual(start)
+        return self.converged
+
+    def stop(
+        self, iteration: int, max_residual: float, nb_updates: int, start: float
+    ):
+        """!
+        \brief record the statistics of an iteration
+
+        \return whether the run is over
+        """
+        elapsed = time.monotonic() - start
+        self.stats.append(
+            IterationStats(
+                iteration=iteration,
+                max_residual=max_residual,
+                nb_updates=nb_updates,
+                elapsed=elapsed,
+            )
+        )
+        self.converged = max_residual < self.tolerance
+        if self.converged or iteration >= self.max_iterations:
+            return True
+        return self.time_limit is not None and elapsed >= self.time_limit
+
+    def run_synchronous(self, start: float):
+        """!
+        \brief flooding schedule, every message is sent at each iteration
+        """
+        for iteration in range(1, self.max_iterations + 1):
+            messages = {e: self.factor_message(*e) for e in self.edges}
+            max_residual = max(
+                [self.residual(m, self.to_var[e]) for e, m in messages.items()]
+            )
+            self.to_var = messages
+            for a, k in self.edges:
+                self.to_factor[(a, k)] = self.variable_message(a, k)
+            if self.stop(iteration, max_residual, len(messages), start):
+                return
+
+    def run_residual(self, start: float):
+        """!
+        \brief residual schedule, the pending message with the largest change
+        is sent first
+
+        Heap entries hold a version number, entries of messages that were
+        computed again since are skipped.
+        """
+        pending: Dict[Tuple[int, int], List[float]] = {}
+        version: Dict[Tuple[int, int], int] = {}
+        heap: List[Tuple[float, int, Tuple[int, int]]] = []
+
+        def schedule(e: Tuple[int, int]):
+            ""
+            pending[e] = self.factor_message(*e)
+            version[e] = version.get(e, 0) + 1
+            r = self.residual(pending[e], self.to_var[e])
+            heapq.heappush(heap, (-r, version[e], e))
+
+        for e in self.edges:
+            schedule(e)
+        iteration = 0
+        while True:
+            iteration += 1
+            max_residual = 0.0
+            nb_updates = 0
+            while nb_updates < len(self.edges) and len(heap) > 0:
+                r, ver, (a, k) = heapq.heappop(heap)
+                if ver != version[(a, k)]:
+                    continue
+                if -r < self.tolerance:
+                    # every other pending message changes less
+                    heapq.heappush(heap, (r, ver, (a, k)))
+                    break
+                max_residual = max(max_residual, -r)
+                self.to_var[(a, k)] = pending[(a, k)]
+                nb_updates += 1
+                if self.damping > 0:
+                    # a damped message only moves part of the way
+                    schedule((a, k))
+                vid = self.scopes[a][k]
+                for b, j in self.neighbours[vid]:
+                    if b == a:
+                        continue
+                    self.to_factor[(b, j)] = self.variable_message(b, j)
+                    for i in range(len(self.scopes[b])):
+                        if i != j:
+                            schedule((b, i))
+            if self.stop(iteration, max_residual, nb_updates, start):
+                return
+
+    def marginal(self, v: Union[NumCatRVariable, str]) -> TabularFactor:
+        """!
+        \brief approximate normalized marginal of a variable, the product of
+        the messages it receives
+
+        \throws ValueError if the variable is not in the model
+        """
+        vid = v.id() if isinstance(v, NumCatRVariable) else v
+        if vid not in self.variables:
+            raise ValueError("Variable " + str(vid) + " is not in the model")
+        m = self.unit(vid)
+        for e in self.neighbours[vid]:
+            if e in self.to_var:
+                m = [x * y for x, y in zip(m, self.to_var[e])]
+        return TabularFactor(
+            gid="bp_" + vid,
+            scope_vars=[self.variables[vid]],
+            domains=[self.domains[vid]],
+            values=normalize(m),
+        )
+
+    def marginals(self) -> Dict[str, TabularFactor]:
+        """!
+        \brief approximate marginals of every variable of the model
+        """
+        return {vid: self.marginal(vid) for vid in sorted(self.variables)}
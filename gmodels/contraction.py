@@ -0,0 +1,383 @@
+"""!
+\file contraction.py
+
+# Contraction Planner
+
+Multiplying a set of factors and summing out some of their variables is a
+tensor contraction, like the ones described by einsum expressions. The order
+in which the factors are multiplied does not change the result, but it
+determines the size of the intermediate tables. This file contains a planner
+that chooses a pairwise order for such a contraction before any factor is
+evaluated, estimates its cost and then executes it.
+
+A variable that should be summed out is summed out as soon as it does not
+appear in any of the remaining operands, like in variable elimination, see
+Koller, Friedman 2009, p. 298.
+
+Two planning modes are available:
+
+- greedy: at each step multiply the pair whose product table is the smallest.
+
+- optimal: dynamic programming over subsets of factors, which minimizes the
+  peak table size and then the number of operations. Its cost grows as
+  \f[ 3^n \f], so it is meant for a small number of factors.
+"""
+
+from gmodels.factor import Factor
+from gmodels.randomvariable import NumCatRVariable
+
+from typing import Set, List, Tuple, Dict, Optional, FrozenSet
+
+
+class ContractionStep:
+    """!
+    \brief A step of a contraction plan
+
+    The step multiplies the operands left and right, then sums out the
+    variables in sumout. Operands are identified by integers: factors given to
+    the planner have ids 0 to n - 1 and the result of each step gets a new id.
+    A step without right operand only sums out variables.
+    """
+
+    def __init__(
+        self,
+        left: int,
+        right: Optional[int],
+        sumout: List[str],
+        result: int,
+        size: int,
+    ):
+        ""
+        self.left = left
+        self.right = right
+        self.sumout = sumout
+        self.result = result
+        self.size = size
+
+    def __str__(self):
+        ""
+        msg = str(self.result) + " = "
+        if self.right is None:
+            msg += str(self.left)
+        else:
+            msg += str(self.left) + " * " + str(self.right)
+        if len(self.sumout) > 0:
+            msg += " sum over " + ", ".join(self.sumout)
+        return msg + " (" + str(self.size) + " entries)"
+
+
+class ContractionPlan:
+    """!
+    \brief Ordered steps of a contraction with their estimated cost
+    """
+
+    def __init__(
+        self,
+        steps: List[ContractionStep],
+        output: int,
+        output_scope: FrozenSet[str],
+        flops: int,
+        peak_size: int,
+        mode: str,
+    ):
+        """!
+        \param steps steps in execution order
+        \param output id of the operand holding the result
+        \param output_scope ids of variables of the result
+        \param flops estimated number of multiplications and additions
+        \param peak_size number of entries of the largest table that is
+        computed
+        \param mode planning mode that produced the plan
+        """
+        self.steps = steps
+        self.output = output
+        self.output_scope = output_scope
+        self.flops = flops
+        self.peak_size = peak_size
+        self.mode = mode
+
+    def __str__(self):
+        ""
+        lines = [
+            "contraction plan (" + self.mode + "): "
+            + str(self.flops) + " flops, peak "
+            + str(self.peak_size) + " entries"
+        ]
+        lines.extend(["  " + str(s) for s in self.steps])
+        return "\n".join(lines)
+
+
+class ContractionPlanner:
+    """!
+    \brief Plan and execute the product of factors with marginalization
+
+    \code{.py}
+
+    >>> planner = ContractionPlanner(factors=[f1, f2, f3], marginalize=set([B]))
+    >>> plan = planner.plan()
+    >>> plan.flops, plan.peak_size
+    >>> (24, 8)
+    >>> result, accumulated = planner.execute(plan)
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        factors: List[Factor],
+        marginalize: Optional[Set[NumCatRVariable]] = None,
+        mode: str = "auto",
+        optimal_limit: int = 8,
+    ):
+        """!
+        \brief constructor of the planner
+
+        \param factors factors that are going to be multiplied
+        \param marginalize variables that are going to be summed out
+        \param mode one of "greedy", "optimal" or "auto". Auto plans
+        optimally when there are at most optimal_limit factors, greedily
+        otherwise.
+        \param optimal_limit largest number of factors planned optimally in
+        auto mode
+
+        \throws ValueError if there are no factors, if the mode is unknown or
+        if a variable to marginalize is not in the scope of any factor
+        """
+        if len(factors) == 0:
+            raise ValueError("Must have a non empty list of factors")
+        if mode not in ("greedy", "optimal", "auto"):
+            raise ValueError("Unknown planning mode: " + str(mode))
+        self.factors: List[Factor] = list(factors)
+        self.mode = mode
+        self.optimal_limit = optimal_limit
+        self.vars: Dict[str, NumCatRVariable] = {}
+        self.cards: Dict[str, int] = {}
+        self.scopes: List[FrozenSet[str]] = []
+        for f in self.factors:
+            for v in f.scope_vars():
+                vid = v.id()
+                card = len(f.domain_of(v))
+                self.vars[vid] = v
+                self.cards[vid] = min(card, self.cards.get(vid, card))
+            self.scopes.append(frozenset(f.var_of.keys()))
+        if marginalize is None:
+            marginalize = set()
+        self.marginalize: FrozenSet[str] = frozenset([m.id() for m in marginalize])
+        if any(m not in self.vars for m in self.marginalize):
+            raise ValueError("Variables to marginalize must be in scope of factors")
+
+    def size_of(self, scope: FrozenSet[str]) -> int:
+        """!
+        \brief number of entries of a table over the given scope
+        """
+        size = 1
+        for vid in scope:
+            size *= self.cards[vid]
+        return size
+
+    def plan(self) -> ContractionPlan:
+        """!
+        \brief compute a contraction plan according to the planning mode
+        """
+        if self.mode == "optimal" or (
+            self.mode == "auto" and len(self.factors) <= self.optimal_limit
+        ):
+            return self.optimal_plan()
+        return self.greedy_plan()
+
+    def local_sumouts(
+        self, scopes: List[FrozenSet[str]]
+    ) -> Tuple[List[ContractionStep], List[int], List[FrozenSet[str]], int, int]:
+        """!
+        \brief sum out variables that appear in a single factor
+
+        \return steps, operand ids, operand scopes, flops, peak size
+        """
+        steps = []
+        ids = list(range(len(scopes)))
+        new_scopes = list(scopes)
+        flops = 0
+        peak = 0
+        next_id = len(scopes)
+        for i, scope in enumerate(scopes):
+            others = set()
+            for j, s in enumerate(scopes):
+                if j != i:
+                    others |= s
+            local = [v for v in scope if v in self.marginalize and v not in others]
+            if len(local) == 0:
+                continue
+            size = self.size_of(scope)
+            steps.append(
+                ContractionStep(
+                    left=i, right=None, sumout=sorted(local), result=next_id, size=size
+                )
+            )
+            ids[i] = next_id
+            new_scopes[i] = scope - frozenset(local)
+            flops += size
+            peak = max(peak, size)
+            next_id += 1
+        return steps, ids, new_scopes, flops, peak
+
+    def greedy_plan(self) -> ContractionPlan:
+        """!
+        \brief multiply the pair with the smallest product table first
+        """
+        steps, ids, scopes, flops, peak = self.local_sumouts(self.scopes)
+        operands: List[Tuple[int, FrozenSet[str]]] = list(zip(ids, scopes))
+        next_id = len(self.scopes) + len(steps)
+        while len(operands) > 1:
+            best = None
+            for i in range(len(operands)):
+                for j in range(i + 1, len(operands)):
+                    union = operands[i][1] | operands[j][1]
+                    others = set()
+                    for k, (_, s) in enumerate(operands):
+                        if k != i and k != j:
+                            others |= s
+                    removed = frozenset(
+                        [v for v in union if v in self.marginalize and v not in others]
+                    )
+                    key = (self.size_of(union), self.size_of(union - removed), i, j)
+                    if best is None or key < best[0]:
+                        best = (key, i, j, union, removed)
+            key, i, j, union, removed = best
+            size = key[0]
+            steps.append(
+                ContractionStep(
+                    left=operands[i][0],
+                    right=operands[j][0],
+                    sumout=sorted(removed),
+                    result=next_id,
+                    size=size,
+                )
+            )
+            flops += size * 2 if len(removed) > 0 else size
+            peak = max(peak, size)
+            operands = [o for k, o in enumerate(operands) if k != i and k != j]
+            operands.append((next_id, union - removed))
+            next_id += 1
+        output, output_scope = operands[0]
+        return ContractionPlan(
+            steps=steps,
+            output=output,
+            output_scope=output_scope,
+            flops=flops,
+            peak_size=peak,
+            mode="greedy",
+        )
+
+    def optimal_plan(self) -> ContractionPlan:
+        """!
+        \brief minimize the peak table size, then the flops, over all
+        pairwise contraction trees with dynamic programming over subsets
+        """
+        steps, ids, scopes, flops, peak = self.local_sumouts(self.scopes)
+        n = len(scopes)
+        full = (1 << n) - 1
+        unions: Dict[int, FrozenSet[str]] = {0: frozenset()}
+        for S in range(1, full + 1):
+            low = S & (-S)
+            unions[S] = unions[S ^ low] | scopes[low.bit_length() - 1]
+
+        def result_scope(S: int) -> FrozenSet[str]:
+            ""
+            outside = unions[full ^ S]
+            return frozenset(
+                [v for v in unions[S] if v not in self.marginalize or v in outside]
+            )
+
+        results: Dict[int, FrozenSet[str]] = {}
+        # best[S] = (peak, flops, left subset, right subset)
+        best: Dict[int, Tuple[int, int, int, int]] = {}
+        for i in range(n):
+            results[1 << i] = scopes[i]
+            best[1 << i] = (0, 0, 0, 0)
+        for S in range(1, full + 1):
+            if S in best:
+                continue
+            results[S] = result_scope(S)
+            low = S & (-S)
+            rest = S ^ low
+            candidate = None
+            # A always contains the lowest member so that each split is seen once
+            B = rest
+            while True:
+                A = S ^ B
+                if B != 0:
+                    union = results[A] | results[B]
+                    size = self.size_of(union)
+                    cost = size * 2 if union != results[S] else size
+                    key = (
+                        max(best[A][0], best[B][0], size),
+                        best[A][1] + best[B][1] + cost,
+                        A,
+                        B,
+                    )
+                    if candidate is None or key[:2] < candidate[:2]:
+                        candidate = key
+                if B == 0:
+                    break
+                B = (B - 1) & rest
+            best[S] = candidate
+        #
+        next_id = [len(self.scopes) + len(steps)]
+
+        def emit(S: int) -> int:
+            ""
+            if S & (S - 1) == 0:
+                return ids[S.bit_length() - 1]
+            _, _, A, B = best[S]
+            left = emit(A)
+            right = emit(B)
+            union = results[A] | results[B]
+            steps.append(
+                ContractionStep(
+                    left=left,
+                    right=right,
+                    sumout=sorted(union - results[S]),
+                    result=next_id[0],
+                    size=self.size_of(union),
+                )
+            )
+            next_id[0] += 1
+            return next_id[0] - 1
+
+        output = emit(full)
+        return ContractionPlan(
+            steps=steps,
+            output=output,
+            output_scope=results[full],
+            flops=flops + best[full][1],
+            peak_size=max(peak, best[full][0]),
+            mode="optimal",
+        )
+
+    def execute(
+        self,
+        plan: Optional[ContractionPlan] = None,
+        elimination_strategy=lambda x, y: x.sumout_var(y),
+    ) -> Tuple[Factor, Optional[float]]:
+        """!
+        \brief run a contraction plan on the factors of the planner
+
+        \param plan plan to execute, if it is not provided it is computed
+        with ContractionPlanner.plan()
+        \param elimination_strategy how a variable is removed from a factor
+
+        \return resulting factor and the accumulated value of the last
+        product, None if no product was computed
+        """
+        if plan is None:
+            plan = self.plan()
+        operands: Dict[int, Factor] = {i: f for i, f in enumerate(self.factors)}
+        accumulated = None
+        for step in plan.steps:
+            f = operands.pop(step.left)
+            if step.right is not None:
+                f, accumulated = f.product(operands.pop(step.right))
+            for vid in step.sumout:
+                f = elimination_strategy(f, self.vars[vid])
+            operands[step.result] = f
+        return operands[plan.output], accumulated
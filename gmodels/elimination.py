@@ -0,0 +1,150 @@
+"""!
+\file elimination.py
+
+# Compiled Elimination Plans
+
+Variable elimination spends part of its time on choices that only depend on
+the shape of a query: which variables are queried, which variables are
+observed, and the scopes of the factors. The values of the evidence do not
+matter. This file compiles these choices once into an immutable plan:
+
+- the elimination ordering, computed with the min fill heuristic on a copy
+  of the interaction graph of the factors, so the model graph is not
+  modified, see ordering.py,
+
+- the bucket of each factor: a factor goes to the bucket of the first
+  eliminated variable of its scope, see Dechter 1999, bucket elimination,
+
+- the scope of the intermediate factor of each bucket and the bucket that
+  receives it.
+
+Observed variables have a single value once factors are reduced, so they are
+summed out of each reduced factor on its own, before any product, and they
+do not take part in the ordering.
+"""
+
+from gmodels.ordering import elimination_order
+from gmodels.factor import Factor
+
+from collections import namedtuple
+from typing import Set, List, Dict, Tuple, Optional
+
+
+EliminationPlan = namedtuple(
+    "EliminationPlan",
+    [
+        "queries",
+        "evidence",
+        "signature",
+        "order",
+        "buckets",
+        "scopes",
+        "targets",
+        "final",
+    ],
+)
+EliminationPlan.__doc__ = """!
+\\brief immutable plan of a sum product variable elimination
+
+- queries: identifiers of query variables
+- evidence: identifiers of observed variables that are not queried
+- signature: (identifier, scope) of each factor, in the order used by indices
+- order: identifiers of eliminated variables in elimination order
+- buckets: for each eliminated variable, indices of the factors placed in
+  its bucket
+- scopes: for each eliminated variable, scope of the factor that its bucket
+  sends, an empty scope means the bucket result goes unsummed to the final
+  product
+- targets: for each eliminated variable, step that receives the result of
+  its bucket, None for the final product
+- final: indices of factors that only involve query variables
+"""
+
+
+def factor_signature(factors: List[Factor]) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    """!
+    \brief identifiers and scopes of factors, used for ordering factors in a
+    plan and for checking that a plan fits the factors of a model
+    """
+    return tuple([(f.id(), tuple(sorted(f.var_of))) for f in factors])
+
+
+def compile_elimination(
+    factors: List[Factor],
+    variables: Set[str],
+    queries: Set[str],
+    evidence: Set[str],
+    relevant: Optional[Set[int]] = None,
+) -> EliminationPlan:
+    """!
+    \brief compile the plan of a sum product variable elimination
+
+    \param factors factors in the order used by the indices of the plan
+    \param variables identifiers of all variables of the model
+    \param queries identifiers of query variables
+    \param evidence identifiers of observed variables
+    \param relevant indices of the factors that take part in the plan, every
+    factor if it is not provided. Other factors are left out of buckets and
+    of the final product, and variables that only appear in them are not
+    eliminated.
+
+    Observed query variables are not summed out, they keep their observed
+    value in the result.
+
+    \throws ValueError if queries or evidence are not variables of the model
+    """
+    queries = frozenset(queries)
+    evidence = frozenset(evidence)
+    if not queries.issubset(variables) or not evidence.issubset(variables):
+        raise ValueError("Query and evidence variables must be variables of the model")
+    evidence = evidence - queries
+    if relevant is None:
+        relevant = set(range(len(factors)))
+    scopes = [
+        frozenset(f.var_of) - evidence if i in relevant else None
+        for i, f in enumerate(factors)
+    ]
+    Zs = set(variables) - queries - evidence
+    if len(relevant) < len(factors):
+        Zs = set([v for scope in scopes if scope is not None for v in scope]) - queries
+    adjacency: Dict[str, Set[str]] = {v: set() for v in set(variables) - evidence}
+    for scope in [scope for scope in scopes if scope is not None]:
+        for a in scope:
+            adjacency[a].update([b for b in scope if b != a])
+    order = elimination_order(adjacency, "min-fill", Zs).order
+    position = {z: k for k, z in enumerate(order)}
+    buckets: List[List[int]] = [[] for _ in order]
+    bucket_scopes: List[Set[str]] = [set() for _ in order]
+    final = []
+    for i, scope in enumerate(scopes):
+        if scope is None:
+            continue
+        steps = [position[v] for v in scope if v in position]
+        if len(steps) == 0:
+            final.append(i)
+            continue
+        k = min(steps)
+        buckets[k].append(i)
+        bucket_scopes[k].update(scope)
+    message_scopes = []
+    targets: List[Optional[int]] = []
+    for k, z in enumerate(order):
+        scope = frozenset(bucket_scopes[k] - set([z]))
+        message_scopes.append(scope)
+        steps = [position[v] for v in scope if v in position]
+        if len(steps) == 0:
+            targets.append(None)
+            continue
+        target = min(steps)
+        targets.append(target)
+        bucket_scopes[target].update(scope)
+    return EliminationPlan(
+        queries=queries,
+        evidence=evidence,
+        signature=factor_signature(factors),
+        order=tuple(order),
+        buckets=tuple([tuple(b) for b in buckets]),
+        scopes=tuple(message_scopes),
+        targets=tuple(targets),
+        final=tuple(final),
+    )
@@ -6,11 +6,59 @@ Defining a factor from Koller and Friedman 2009, p. 106-107
 
 from gmodels.gtypes.graphobj import GraphObject
 from gmodels.randomvariable import NumCatRVariable, NumericValue
+from gmodels.assignmentcodec import AssignmentCodec, strides_of
 
-from typing import Set, Callable, Optional, List, Union, Tuple
-from itertools import product, combinations
+from typing import Set, Callable, Optional, List, Union, Tuple, Dict
+from itertools import product, combinations, count
 from uuid import uuid4
 from pprint import pprint
+import math
+
+
+# serial numbers and versions of factors, never reused unlike id()
+factor_serials = count()
+
+
+def broadcast_offsets(contributions: List[List[int]]) -> List[int]:
+    """!
+    \brief table offsets of an operand when it is walked in a target order
+
+    Each element of contributions corresponds to an axis of the target domain.
+    It holds, for each index of that axis, the offset it adds to the operand's
+    table. An axis that is not in the scope of the operand contributes 0 for
+    every index, which broadcasts the operand along that axis.
+
+    \param contributions per axis offset contributions in target axis order
+
+    \return offsets of operand's table in the row major order of the target
+    domain
+    """
+    offsets = [0]
+    for contribution in contributions:
+        offsets = [o + c for o in offsets for c in contribution]
+    return offsets
+
+
+def safe_log(value: float) -> float:
+    """!
+    \brief natural logarithm that maps 0 to negative infinity
+    """
+    if value == 0:
+        return float("-inf")
+    return math.log(value)
+
+
+def safe_divide(x: float, y: float) -> float:
+    """!
+    \brief division where a zero denominator gives 0
+
+    Koller, Friedman 2009, p. 365 defines 0 / 0 = 0 for factor division. In
+    belief update messages a zero denominator only meets a zero numerator,
+    so any division by zero gives 0.
+    """
+    if y == 0:
+        return 0.0
+    return x / y
 
 
 class Factor(GraphObject):
@@ -25,6 +73,7 @@ class Factor(GraphObject):
         scope_vars: Set[NumCatRVariable],
         factor_fn: Optional[Callable[[Set[Tuple[str, NumCatRVariable]]], float]] = None,
         data={},
+        value_domains: Optional[Dict[str, List[NumericValue]]] = None,
     ):
         """!
         \brief Constructor for a factor \f[ \phi(A,B) \f]
@@ -37,6 +86,10 @@ class Factor(GraphObject):
 
         \param scope_vars variables that constitue scope of factor.
         \param factor_fn a real valued function
+        \param value_domains values that the factor takes into account for
+        some of its scope variables, keyed by variable id. Other variables
+        range over all of their values. Reduced factors use it to restrict
+        their domain without modifying the random variables.
         """
         # check all values are positive
         super().__init__(oid=gid, odata=data)
@@ -48,14 +101,114 @@ class Factor(GraphObject):
                 raise ValueError(msg)
 
         self.svars = scope_vars
+        self.index_scope(scope_vars)
+        if value_domains is None:
+            value_domains = {}
+        self.value_domains: Dict[str, List[NumericValue]] = {
+            k: list(v) for k, v in value_domains.items() if k in self.var_of
+        }
         if factor_fn is None:
             self.factor_fn = self.marginal_joint
         else:
             self.factor_fn = factor_fn
 
-        self.scope_products: List[Set[Tuple[str, NumericValue]]] = []
+        # the domain and the partition function are computed on first access
+        self.serial = next(factor_serials)
+        self.invalidate_partition()
+
+    @property
+    def Z(self) -> float:
+        """!
+        \brief value of the partition function
+
+        It is computed with Factor.zval() when it is first accessed and kept
+        until Factor.invalidate_partition() is called.
+        """
+        if self._Z is None:
+            self._Z = self.zval()
+        return self._Z
 
-        self.Z = self.zval()
+    @Z.setter
+    def Z(self, value: float):
+        ""
+        self._Z = value
+
+    @property
+    def scope_products(self) -> List[Tuple[Tuple[str, NumericValue], ...]]:
+        """!
+        \brief members of the factor domain, computed on first access
+
+        \see Factor.factor_domain()
+        """
+        if self._scope_products is None:
+            self._scope_products = self.factor_domain()
+        return self._scope_products
+
+    @scope_products.setter
+    def scope_products(self, value: List[Tuple[Tuple[str, NumericValue], ...]]):
+        ""
+        self._scope_products = value
+
+    def invalidate_partition(self):
+        """!
+        \brief drop the cached domain and partition function value
+
+        They are recomputed on next access. This is needed when the domain of
+        scope variables changes, for example after Factor.reduced(context).
+        The version of the factor changes.
+        """
+        self._version = next(factor_serials)
+        self._Z: Optional[float] = None
+        self._scope_products: Optional[List[Tuple[Tuple[str, NumericValue], ...]]] = None
+
+    def version(self) -> int:
+        """!
+        \brief number that changes each time the values of this factor are
+        invalidated
+
+        Versions are drawn from the counter of serial numbers, so no two
+        factors, and no two states of a factor, share a version.
+
+        \see Factor.invalidate_partition()
+        """
+        return self._version
+
+    def index_scope(self, scope_vars: Set[NumCatRVariable]):
+        """!
+        \brief build the maps from variable ids to scope variables and axes
+
+        var_of maps an id to its variable and axis_of maps an id to the
+        position of the variable in Factor.ordered_scope(). Lookups by id do
+        not depend on the hash of variables, which changes when their data is
+        modified.
+
+        \throws ValueError if two scope variables have the same id
+        """
+        self.var_of: Dict[str, NumCatRVariable] = {s.id(): s for s in scope_vars}
+        if len(self.var_of) != len(scope_vars):
+            raise ValueError("more than one variable matches the id string")
+        self.axis_of: Dict[str, int] = {
+            vid: i for i, vid in enumerate(sorted(self.var_of))
+        }
+
+    def domain_of(self, v: NumCatRVariable) -> List[NumericValue]:
+        """!
+        \brief values of a scope variable that this factor ranges over
+
+        \param v scope variable
+        """
+        domain = self.value_domains.get(v.id())
+        if domain is None:
+            return v.values()
+        return domain
+
+    def is_sparse(self) -> bool:
+        """!
+        \brief whether the factor only stores its non zero values
+
+        \see SparseFactor
+        """
+        return False
 
     def scope_vars(self, f=lambda x: x) -> Set[NumCatRVariable]:
         """!
@@ -76,6 +229,23 @@ class Factor(GraphObject):
         """
         return f(self.svars)
 
+    @classmethod
+    def from_factor(cls, f):
+        """!
+        \brief Make factor that evaluates the factor function of given factor
+
+        \param f factor whose scope and function are used
+        """
+        if type(f) is cls:
+            return f
+        return Factor(
+            gid=f.id(),
+            scope_vars=f.scope_vars(),
+            factor_fn=f.factor_fn,
+            data=f.data(),
+            value_domains={s.id(): f.domain_of(s) for s in f.scope_vars()},
+        )
+
     @classmethod
     def from_joint_vars(cls, svars: Set[NumCatRVariable]):
         """!
@@ -238,12 +408,24 @@ class Factor(GraphObject):
         \brief Get factor domain
         \see Factor.fdomain(D, rvar_filter, value_filter, value_transform)
         """
-        return self.fdomain(
-            D=self.scope_vars(),
-            rvar_filter=rvar_filter,
-            value_filter=value_filter,
-            value_transform=value_transform,
-        )
+        if len(self.value_domains) == 0:
+            return self.fdomain(
+                D=self.scope_vars(),
+                rvar_filter=rvar_filter,
+                value_filter=value_filter,
+                value_transform=value_transform,
+            )
+        return [
+            set(
+                [
+                    (s.id(), value_transform(v))
+                    for v in self.domain_of(s)
+                    if value_filter(v) is True
+                ]
+            )
+            for s in self.scope_vars()
+            if rvar_filter(s) is True
+        ]
 
     def domain_scope(
         self, domain: List[Set[Tuple[str, NumericValue]]]
@@ -255,22 +437,17 @@ class Factor(GraphObject):
         From these identifiers, we obtain set of random variables attested in
         factor domain.
         """
-        sids = {}
+        sids = set()
         for vs in domain:
             for vtpl in vs:
-                sids[vtpl[0]] = vtpl[1]
+                sids.add(vtpl[0])
         # check for values out of domain of this factor
-        scope_ids = set([s.id() for s in self.scope_vars()])
-        if set(sids.keys()).issubset(scope_ids) is False:
+        if any(sid not in self.var_of for sid in sids):
             msg = (
                 "Given argument domain include values out of the domain of this factor"
             )
             raise ValueError(msg)
-        svars = set()
-        for s in self.scope_vars():
-            if s.id() in sids:
-                svars.add(s)
-        return svars
+        return set([self.var_of[sid] for sid in sids])
 
     def has_var(self, ids: str) -> Tuple[bool, Optional[NumCatRVariable]]:
         """!
@@ -279,19 +456,15 @@ class Factor(GraphObject):
 
         \param ids identifier of random variable
         """
-        vs = [s for s in self.svars if s.id() == ids]
-        if len(vs) == 0:
-            return False, None
-        elif len(vs) == 1:
-            return True, vs[0]
-        else:
-            raise ValueError("more than one variable matches the id string")
+        var = self.var_of.get(ids)
+        return var is not None, var
 
-    def phi(self, scope_product: Set[Tuple[str, NumericValue]]) -> float:
+    def phi(self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]) -> float:
         """!
         \brief obtain a factor value for given scope random variables
 
-        Obtain factor value for given argument
+        Obtain factor value for given argument. The argument can also be an
+        integer encoded by Factor.assignment_codec().
 
         \code
         >>> A = NumCatRVariable("A",
@@ -305,12 +478,30 @@ class Factor(GraphObject):
         >>> fac = Factor.from_joint_vars(svars=set([A, B]))
         >>> fac.phi(scope_product=set([("A", True), ("B", True)]))
         >>> 0.25
+        >>> fac.phi(0)
+        >>> 0.25
 
         \endcode
         """
+        if isinstance(scope_product, int):
+            scope_product = self.assignment_codec().decode(scope_product)
         return self.factor_fn(scope_product)
 
-    def __call__(self, scope_product: Set[Tuple[str, NumericValue]]) -> float:
+    def assignment_codec(self) -> AssignmentCodec:
+        """!
+        \brief codec that encodes the assignments of this factor as integers
+
+        The axes follow Factor.ordered_scope() and their values are given by
+        Factor.domain_of(v).
+
+        \see AssignmentCodec
+        """
+        svars = self.ordered_scope()
+        return AssignmentCodec(
+            var_ids=[s.id() for s in svars], domains=[self.domain_of(s) for s in svars]
+        )
+
+    def __call__(self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]) -> float:
         """!
         \brief Make a factor callable to reproduce more function like behavior
 
@@ -331,6 +522,52 @@ class Factor(GraphObject):
         """
         return self.normalize(self.phi(scope_product))
 
+    def phi_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief evaluate the factor for a batch of assignments
+
+        \param rows N x |scope| value indices. Columns follow the axes of
+        Factor.assignment_codec(), and an index refers to the position of a
+        value among the values of its variable.
+
+        The factor function is called once per distinct assignment of the
+        batch.
+
+        \throws ValueError if an index is out of the range of its axis
+
+        \code
+        >>> fac = Factor.from_joint_vars(svars=set([A, B]))
+        >>> fac.phi_batch([[0, 0], [1, 0]])
+        >>> [0.25, 0.25]
+
+        \endcode
+
+        \return N factor values
+        """
+        codec = self.assignment_codec()
+        codes = codec.encode_batch(rows)
+        values = {c: self.factor_fn(codec.decode(c)) for c in set(codes)}
+        return [values[c] for c in codes]
+
+    def phi_normal_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief normalized factor values for a batch of assignments
+
+        \see Factor.phi_batch(rows)
+        """
+        Z = self.Z
+        return [v / Z for v in self.phi_batch(rows)]
+
+    def log_phi_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief natural logarithm of factor values for a batch of assignments
+
+        Zero values are mapped to negative infinity.
+
+        \see Factor.phi_batch(rows)
+        """
+        return [safe_log(v) for v in self.phi_batch(rows)]
+
     def max_value(self):
         """!
         \brief maximum factor value for this factor
@@ -357,9 +594,8 @@ class Factor(GraphObject):
         """!
         \brief compute value of partition function for this factor
         """
-        svars = self.vars_domain()
-        self.scope_products = list(product(*svars))
-        return sum([self.factor_fn(scope_product=sv) for sv in self.factor_domain()])
+        self.scope_products = self.factor_domain()
+        return sum([self.factor_fn(scope_product=sv) for sv in self.scope_products])
 
     def marginal_joint(self, scope_product: Set[Tuple[str, NumericValue]]) -> float:
         """!
@@ -367,11 +603,10 @@ class Factor(GraphObject):
         Default factor function when none is provided.
         """
         p = 1.0
-        for sv in scope_product:
-            var_id = sv[0]
-            var_value = sv[1]
-            hasv, var = self.has_var(var_id)
-            if hasv is False:
+        var_of = self.var_of
+        for var_id, var_value in scope_product:
+            var = var_of.get(var_id)
+            if var is None:
                 raise ValueError("Unknown variable id among arguments: " + var_id)
             p *= var.marginal(var_value)
         return p
@@ -381,10 +616,9 @@ class Factor(GraphObject):
         Check if given parameter is in scope of this factor
         """
         if isinstance(v, NumCatRVariable):
-            return v in self.svars
+            return v.id() in self.var_of
         elif isinstance(v, str):
-            isin, val = self.has_var(v)
-            return isin
+            return v in self.var_of
         else:
             raise TypeError("argument must be NumCatRVariable or its id")
 
@@ -410,37 +644,124 @@ class Factor(GraphObject):
         if not isinstance(other, Factor):
             raise TypeError("other needs to be a factor")
         #
-        svar = self.scope_vars()
-        ovar = other.scope_vars()
-        var_inter = svar.intersection(ovar)
-        var_inter = list(var_inter)
-        vsets = [v.value_set() for v in var_inter]
-        inter_products = list(product(*vsets))
-        smatch = self.factor_domain()
-        omatch = other.factor_domain()
+        svars = self.ordered_scope()
+        ovars = other.ordered_scope()
+        stable = self.tabulate(svars)
+        otable = other.tabulate(ovars)
+        sdomains = [self.domain_of(s) for s in svars]
+        odomains = [other.domain_of(o) for o in ovars]
+        ovalues = {o.id(): set(d) for o, d in zip(ovars, odomains)}
+        uvars = list(svars)
+        udomains = [
+            [v for v in d if v in ovalues[s.id()]] if s.id() in ovalues else list(d)
+            for s, d in zip(svars, sdomains)
+        ]
+        for o, d in zip(ovars, odomains):
+            if o.id() not in self.var_of:
+                uvars.append(o)
+                udomains.append(list(d))
+        soffsets = self.aligned_offsets(svars, uvars, udomains, sdomains)
+        ooffsets = self.aligned_offsets(ovars, uvars, udomains, odomains)
+        multis = [product_fn(stable[s], otable[o]) for s, o in zip(soffsets, ooffsets)]
         prod = 1.0
-        common_match = set()
-        for iproduct in inter_products:
-            for o in omatch:
-                for s in smatch:
-                    ss = set(s)
-                    ost = set(o)
-                    prod_s = set(iproduct)
-                    if prod_s.issubset(ss) and prod_s.issubset(ost):
-                        common = ss.union(ost)
-                        multi = product_fn(self.factor_fn(ss), other.factor_fn(ost))
-                        common_match.add((multi, tuple(common)))
-                        prod = accumulator(multi, prod)
+        for multi in multis:
+            prod = accumulator(multi, prod)
+        #
+        codec = AssignmentCodec(var_ids=[u.id() for u in uvars], domains=udomains)
 
         def fx(scope_product: Set[Tuple[str, NumericValue]]):
             ""
-            for multip, match in common_match:
-                if set(match) == set(scope_product):
-                    return multip
+            try:
+                return multis[codec.encode(scope_product)]
+            except ValueError:
+                return None
 
-        f = Factor(gid=str(uuid4()), scope_vars=svar.union(ovar), factor_fn=fx)
+        f = Factor(
+            gid=str(uuid4()),
+            scope_vars=set(uvars),
+            factor_fn=fx,
+            value_domains={u.id(): d for u, d in zip(uvars, udomains)},
+        )
         return f, prod
 
+    def divide(self, other, division_fn=safe_divide):
+        """!
+        \brief Factor division from Koller, Friedman 2009, p. 365
+        \f[ \psi(X,Y) = \frac{\phi_1(X,Y)}{\phi_2(Y)} \f]
+
+        Entries are aligned as in Factor.product(other, product_fn,
+        accumulator) and 0 / 0 is 0.
+
+        \param other factor whose scope is usually a subset of this scope
+        \param division_fn function that divides two factor values
+
+        \return Factor
+        """
+        if not isinstance(other, Factor):
+            raise TypeError("other needs to be a factor")
+        f, _ = self.product(other, product_fn=division_fn)
+        return f
+
+    def ordered_scope(self) -> List[NumCatRVariable]:
+        """!
+        \brief scope variables ordered by their identifiers
+
+        This order is used as the axis order whenever the factor values are
+        laid out in a table.
+        """
+        return sorted(self.var_of.values(), key=lambda s: s.id())
+
+    def tabulate(self, svars: List[NumCatRVariable]) -> List[float]:
+        """!
+        \brief evaluate factor function over the domain of ordered scope
+        variables
+
+        \param svars scope variables in axis order
+
+        \return factor values in row major order
+        """
+        domains = [[(s.id(), v) for v in self.domain_of(s)] for s in svars]
+        return [self.factor_fn(set(sp)) for sp in product(*domains)]
+
+    @classmethod
+    def aligned_offsets(
+        cls,
+        svars: List[NumCatRVariable],
+        uvars: List[NumCatRVariable],
+        udomains: List[List[NumericValue]],
+        sdomains: Optional[List[List[NumericValue]]] = None,
+    ) -> List[int]:
+        """!
+        \brief positions of a table in the row major order of a larger domain
+
+        Aligns the axes of a table laid out by Factor.tabulate(svars) with the
+        axes of a domain that contains its scope, so that the table can be
+        broadcasted over the domain.
+
+        \param svars variables of the table in axis order
+        \param uvars variables of the domain in axis order
+        \param udomains values of each axis of the domain
+        \param sdomains values of each axis of the table. If it is not
+        provided, all values of the variables are used.
+
+        \return offsets in the table for each member of the domain
+        """
+        if sdomains is None:
+            sdomains = [s.values() for s in svars]
+        cards = [len(d) for d in sdomains]
+        strides = {s.id(): st for s, st in zip(svars, strides_of(cards))}
+        indices = {
+            s.id(): {v: i for i, v in enumerate(d)} for s, d in zip(svars, sdomains)
+        }
+        contributions = []
+        for u, domain in zip(uvars, udomains):
+            uid = u.id()
+            if uid in strides:
+                contributions.append([indices[uid][v] * strides[uid] for v in domain])
+            else:
+                contributions.append([0] * len(domain))
+        return broadcast_offsets(contributions)
+
     def reduced(self, context: Set[Tuple[str, NumericValue]]):
         """!
         \brief reduce factor using given context
@@ -465,15 +786,22 @@ class Factor(GraphObject):
            a1  |  b1  |  c1
            a2  |  b1  |  c1
 
+        The reduced factor restricts its own domain, see
+        Factor.domain_of(v), so the random variables are left untouched and
+        the same variables can be reduced with other contexts.
+
+        \return Factor
         """
-        svars = set()
-        for sv in self.scope_vars():
-            for kval in context:
-                k, value = kval
-                if sv.id() == k:
-                    sv.reduce_to_value(value)
-            svars.add(sv)
-        return Factor(gid=str(uuid4()), scope_vars=svars, factor_fn=self.phi)
+        value_domains = {s.id(): self.domain_of(s) for s in self.scope_vars()}
+        for k, value in context:
+            if k in value_domains:
+                value_domains[k] = [v for v in value_domains[k] if v == value]
+        return Factor(
+            gid=str(uuid4()),
+            scope_vars=self.scope_vars(),
+            factor_fn=self.phi,
+            value_domains=value_domains,
+        )
 
     def reduced_by_value(self, context: Set[Tuple[str, NumericValue]]):
         """!
@@ -484,17 +812,22 @@ class Factor(GraphObject):
         return self.reduced(context)
 
     def filter_assignments(
-        self, assignments: Set[Tuple[str, NumericValue]], context: Set[NumCatRVariable]
+        self,
+        assignments: Set[Tuple[str, NumericValue]],
+        context: Optional[Set[NumCatRVariable]] = None,
     ):
         """!
         filter out assignments that do not belong to context domain
+
+        \param context variables whose assignments are kept. If it is not
+        provided, the scope of this factor is used.
         """
+        if context is None:
+            context_ids = self.var_of
+        else:
+            context_ids = set([c.id() for c in context])
         assignment_d = {a[0]: a[1] for a in assignments}
-        context_ids = set([c.id() for c in context])
-        for a in assignment_d.copy().keys():
-            if a not in context_ids:
-                assignment_d.pop(a)
-        return set([(k, v) for k, v in assignment_d.items()])
+        return set([(k, v) for k, v in assignment_d.items() if k in context_ids])
 
     def reduced_by_vars(
         self,
@@ -513,30 +846,97 @@ class Factor(GraphObject):
         """
         return self.reduced(context=assignments)
 
-    def maxout_var(self, Y: NumCatRVariable):
+    def aggregate_var(
+        self,
+        Y: NumCatRVariable,
+        fn: Callable[[float, float], float],
+        with_argmax: bool = False,
+    ):
         """!
-        max the variable out of factor as per Koller, Friedman 2009, p. 555
+        \brief aggregate the values of a variable out of the factor
 
-        \return Factor
+        The factor function is evaluated once over the domain of the factor.
+        Values that only differ in their assignment to Y are then aggregated
+        into a table over the remaining scope. The resulting factor looks up
+        this table, so its cost does not depend on how many variables had been
+        aggregated before.
+
+        \param Y variable that is going to be aggregated out
+        \param fn binary aggregation function such as sum or max
+        \param with_argmax keep the value of Y that is chosen by fn for each
+        assignment of the remaining scope. It is meaningful for selective
+        aggregations like max.
+
+        \throws ValueError if Y is not in scope of this factor
+
+        \return Factor or (Factor, argmax function) if with_argmax is True.
+        The argmax function takes an assignment that covers the remaining
+        scope and returns (Y id, value of Y).
         """
-        if Y not in self.scope_vars():
-            raise ValueError("argument is not in scope of this factor")
+        if Y.id() not in self.var_of:
+            msg = "Argument " + str(Y)
+            msg += " is not in scope of this factor: "
+            msg += " ".join([s.id() for s in self.scope_vars()])
+            raise ValueError(msg)
 
-        Y_vals = Y.value_set()
-        products = self.factor_domain()
-        fn = self.factor_fn
+        svars = self.ordered_scope()
+        sdomains = [self.domain_of(s) for s in svars]
+        axis = [s.id() for s in svars].index(Y.id())
+        table = self.tabulate(svars)
+        rvars = [s for s in svars if s.id() != Y.id()]
+        rdomains = [list(d) for s, d in zip(svars, sdomains) if s.id() != Y.id()]
+        offsets = self.aligned_offsets(svars, rvars, rdomains, sdomains)
+        stride = strides_of([len(d) for d in sdomains])[axis]
+        values = [table[o] for o in offsets]
+        argmax = [0] * len(offsets)
+        for k in range(1, len(sdomains[axis])):
+            shift = k * stride
+            nvalues = [fn(v, table[o + shift]) for v, o in zip(values, offsets)]
+            if with_argmax is True:
+                argmax = [
+                    k if n != v else a for n, v, a in zip(nvalues, values, argmax)
+                ]
+            values = nvalues
+        #
+        codec = AssignmentCodec(var_ids=[r.id() for r in rvars], domains=rdomains)
 
         def psi(scope_product: Set[Tuple[str, NumericValue]]):
             ""
-            s = set(scope_product)
-            diffs = set([p for p in products if s.issubset(p) is True])
-            return max([fn(d) for d in diffs])
+            try:
+                return values[codec.encode(scope_product)]
+            except ValueError:
+                return None
 
-        return Factor(
+        f = Factor(
             gid=str(uuid4()),
-            scope_vars=self.scope_vars().difference({Y}),
+            scope_vars=set(rvars),
             factor_fn=psi,
+            value_domains={r.id(): d for r, d in zip(rvars, rdomains)},
         )
+        if with_argmax is False:
+            return f
+
+        Y_id = Y.id()
+        Y_values = sdomains[axis]
+        argmax_values = [Y_values[a] for a in argmax]
+
+        def argmax_fn(scope_product: Set[Tuple[str, NumericValue]]):
+            ""
+            return (Y_id, argmax_values[codec.encode(scope_product)])
+
+        return f, argmax_fn
+
+    def maxout_var(self, Y: NumCatRVariable, with_argmax: bool = False):
+        """!
+        max the variable out of factor as per Koller, Friedman 2009, p. 555
+
+        \param with_argmax keep maximizing values of Y for traceback, see
+        Koller, Friedman 2009, p. 557 \see Factor.aggregate_var(Y, fn,
+        with_argmax)
+
+        \return Factor or (Factor, argmax function)
+        """
+        return self.aggregate_var(Y, fn=max, with_argmax=with_argmax)
 
     def sumout_var(self, Y: NumCatRVariable):
         """!
@@ -544,27 +944,7 @@ class Factor(GraphObject):
 
         \return Factor
         """
-        if Y not in self.scope_vars():
-            msg = "Argument " + str(Y)
-            msg += " is not in scope of this factor: "
-            msg += " ".join(self.scope_vars())
-            raise ValueError(msg)
-
-        Y_vals = Y.value_set()
-        products = self.factor_domain()
-        fn = self.factor_fn
-
-        def psi(scope_product: Set[Tuple[str, NumericValue]]):
-            ""
-            s = set(scope_product)
-            diffs = set([p for p in products if s.issubset(p) is True])
-            return sum([fn(d) for d in diffs])
-
-        return Factor(
-            gid=str(uuid4()),
-            scope_vars=self.scope_vars().difference({Y}),
-            factor_fn=psi,
-        )
+        return self.aggregate_var(Y, fn=lambda x, y: x + y)
 
     def sumout_vars(self, Ys: Set[NumCatRVariable]):
         """!
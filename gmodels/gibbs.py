@@ -0,0 +1,525 @@
+"""!
+\file gibbs.py
+
+# Gibbs Sampling
+
+Gibbs sampling, Koller, Friedman 2009, p. 505, draws samples of a model by
+resampling each unobserved variable from its distribution given the current
+values of the other variables. This distribution only depends on the
+factors that contain the variable, and so on the values of its Markov
+blanket:
+
+\f[ P(x_v \mid x_{-v}) \propto \prod_{a \ni v} \phi_a(x_a) \f]
+
+Factors are read once into tables, and the blanket factors of each variable
+are found once. Conditional distributions are cached by the values of the
+blanket, which makes sampling faster on models whose blankets have few
+assignments, as in grids.
+
+Variables are colored so that two variables of the same color never share a
+factor. Variables of a color are independent given the other variables, so
+they form a block whose conditionals are computed from the same state and
+drawn at once. On a grid, the colors are the two colors of a checkerboard.
+
+Several independent chains can run in worker processes. A chain keeps one
+sample every thinning sweeps after burn_in sweeps. Convergence is checked
+with the split potential scale reduction, Gelman et al. 2013, and the
+effective sample size, with the initial positive sequence of
+autocorrelations of Geyer 1992.
+"""
+
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+from gmodels.tabularfactor import TabularFactor
+from gmodels.sampling import cumulative, typecode_of
+
+from array import array
+from bisect import bisect_right
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+from typing import Set, List, Dict, Tuple, Optional, Union
+import math
+
+
+GibbsTables = namedtuple(
+    "GibbsTables",
+    ["ids", "sizes", "factors", "factors_of", "blankets", "blocks", "evidence"],
+)
+GibbsTables.__doc__ = """!
+\\brief model of a Gibbs sampler made of plain data, sent to worker processes
+
+Variables are numbered by the position of their identifier in ids.
+
+- ids: identifiers of the variables
+- sizes: number of values of each variable
+- factors: (variables, strides, positions, table) of each factor, where
+  positions maps the value indices of each variable to indices of the axis
+  of the factor, -1 for values outside of the domain of the factor
+- factors_of: (factor, axis) of each factor that contains a variable
+- blankets: variables that share a factor with a variable
+- blocks: unobserved variables grouped by color
+- evidence: value index of each observed variable
+"""
+
+
+def color_blocks(blankets: List[List[int]], variables: List[int]) -> List[List[int]]:
+    """!
+    \brief greedy coloring of variables, largest blankets first, so that two
+    variables of the same color do not share a factor
+
+    \return variables of each color
+    """
+    colors: Dict[int, int] = {}
+    for v in sorted(variables, key=lambda v: (-len(blankets[v]), v)):
+        used = set([colors[u] for u in blankets[v] if u in colors])
+        color = 0
+        while color in used:
+            color += 1
+        colors[v] = color
+    blocks: List[List[int]] = [[] for _ in set(colors.values())]
+    for v in sorted(colors):
+        blocks[colors[v]].append(v)
+    return blocks
+
+
+def factor_weights(tables: GibbsTables, v: int, state: List[int]) -> List[float]:
+    """!
+    \brief product of the factors of a variable for each of its values,
+    given the values of the other variables in a state
+
+    Factors with a variable that has no value yet, -1 in the state, are left
+    out.
+    """
+    probs = [1.0 for _ in range(tables.sizes[v])]
+    for a, k in tables.factors_of[v]:
+        scope, strides, positions, table = tables.factors[a]
+        base = 0
+        for j, u in enumerate(scope):
+            if j == k:
+                continue
+            if state[u] < 0:
+                base = -1
+                break
+            i = positions[j][state[u]]
+            if i < 0:
+                # a blanket value is outside of the domain of the factor
+                return [0.0 for _ in probs]
+            base += strides[j] * i
+        if base < 0:
+            continue
+        s = strides[k]
+        probs = [
+            p * table[base + s * i] if i >= 0 else 0.0
+            for p, i in zip(probs, positions[k])
+        ]
+    return probs
+
+
+def conditional(tables: GibbsTables, v: int, state: List[int]) -> List[float]:
+    """!
+    \brief cumulative distribution of a variable given the state of the
+    others
+
+    \throws ValueError if the distribution is zero everywhere
+    """
+    probs = factor_weights(tables, v, state)
+    total = sum(probs)
+    if total <= 0:
+        raise ValueError("Distribution of " + tables.ids[v] + " is zero")
+    return cumulative([p / total for p in probs])
+
+
+def initial_state(tables: GibbsTables, rng: Random, attempts: int = 100) -> List[int]:
+    """!
+    \brief random state with positive probability
+
+    Variables get values one at a time, in breadth first order of their
+    blankets from observed variables, each from its distribution given the
+    variables that already have a value. A uniformly random state can have
+    zero probability when factors have zero entries, as deterministic
+    factors do, and Gibbs sampling could not leave it.
+
+    \throws ValueError if every attempt reaches a variable whose values all
+    have zero probability
+    """
+    order = []
+    seen: Set[int] = set()
+    for root in sorted(tables.evidence) + list(range(len(tables.ids))):
+        if root in seen:
+            continue
+        seen.add(root)
+        queue = deque([root])
+        while len(queue) > 0:
+            v = queue.popleft()
+            if v not in tables.evidence:
+                order.append(v)
+            for u in tables.blankets[v]:
+                if u not in seen:
+                    seen.add(u)
+                    queue.append(u)
+    for _ in range(attempts):
+        state = [tables.evidence.get(v, -1) for v in range(len(tables.ids))]
+        for v in order:
+            probs = factor_weights(tables, v, state)
+            total = sum(probs)
+            if total <= 0:
+                break
+            cdf = cumulative([p / total for p in probs])
+            state[v] = bisect_right(cdf, rng.random())
+        else:
+            return state
+    msg = "No state with positive probability was found in " + str(attempts)
+    msg += " attempts, evidence may have zero probability"
+    raise ValueError(msg)
+
+
+def run_chain(
+    tables: GibbsTables,
+    nb_samples: int,
+    burn_in: int,
+    thinning: int,
+    seed: int,
+    cache_size: int,
+) -> Dict[str, array]:
+    """!
+    \brief run a chain from a random state with positive probability
+
+    \return columns of value indices of the unobserved variables
+    """
+    rng = Random(seed)
+    rand = rng.random
+    state = initial_state(tables, rng)
+    caches: List[Dict[Tuple[int, ...], List[float]]] = [{} for _ in tables.ids]
+    kept = sorted([v for block in tables.blocks for v in block])
+    columns = {v: array(typecode_of(tables.sizes[v])) for v in kept}
+    for sweep in range(burn_in + nb_samples * thinning):
+        for block in tables.blocks:
+            cdfs = []
+            for v in block:
+                key = tuple([state[u] for u in tables.blankets[v]])
+                cdf = caches[v].get(key)
+                if cdf is None:
+                    cdf = conditional(tables, v, state)
+                    if len(caches[v]) < cache_size:
+                        caches[v][key] = cdf
+                cdfs.append(cdf)
+            for v, x in zip(block, [bisect_right(cdf, rand()) for cdf in cdfs]):
+                state[v] = x
+        if sweep >= burn_in and (sweep - burn_in + 1) % thinning == 0:
+            for v in kept:
+                columns[v].append(state[v])
+    return {tables.ids[v]: column for v, column in columns.items()}
+
+
+def split_r_hat(chains: List[List[float]]) -> float:
+    """!
+    \brief potential scale reduction of chains split in halves, Gelman et al.
+    2013, p. 284. Values close to 1 indicate that chains mix.
+
+    \throws ValueError if chains have less than 4 samples
+    """
+    n = min([len(c) for c in chains]) // 2
+    if n < 2:
+        raise ValueError("Chains must have at least 4 samples")
+    halves = []
+    for c in chains:
+        halves.extend([c[:n], c[len(c) - n :]])
+    m = len(halves)
+    means = [sum(h) / n for h in halves]
+    mean = sum(means) / m
+    between = n * sum([(x - mean) ** 2 for x in means]) / (m - 1)
+    variances = [
+        sum([(x - mu) ** 2 for x in h]) / (n - 1) for h, mu in zip(halves, means)
+    ]
+    within = sum(variances) / m
+    if within == 0:
+        return 1.0 if between == 0 else math.inf
+    return math.sqrt(((n - 1) / n * within + between / n) / within)
+
+
+def effective_sample_size(chain: List[float]) -> float:
+    """!
+    \brief number of independent samples with the same variance of the mean
+    as a chain, Geyer 1992
+
+    Autocorrelations are summed by pairs of lags until a pair is not
+    positive. The result is at most n log10(n), as in Stan.
+    """
+    n = len(chain)
+    if n < 2:
+        return float(n)
+    mean = sum(chain) / n
+    d = [x - mean for x in chain]
+    variance = sum([x * x for x in d])
+    if variance == 0:
+        return float(n)
+
+    def rho(t: int) -> float:
+        ""
+        return sum([x * y for x, y in zip(d, d[t:])]) / variance
+
+    tau = -1.0
+    t = 0
+    while t + 1 < n:
+        pair = rho(t) + rho(t + 1)
+        if pair <= 0:
+            break
+        tau += 2 * pair
+        t += 2
+    return min(n / tau, n * max(1.0, math.log10(n)))
+
+
+class GibbsResult:
+    """!
+    \brief samples of the chains of a Gibbs sampler and their diagnostics
+    """
+
+    def __init__(
+        self,
+        chains: List[Dict[str, array]],
+        variables: Dict[str, NumCatRVariable],
+        domains: Dict[str, List[NumericValue]],
+        evidence: Dict[str, int],
+    ):
+        """!
+        \param chains columns of value indices of unobserved variables of
+        each chain
+        """
+        self.chains = chains
+        self.variables = variables
+        self.domains = domains
+        self.evidence = evidence
+
+    def check(self, vid: str, sampled: bool = False):
+        """!
+        \throws ValueError if the variable is unknown, or observed when
+        sampled is set
+        """
+        if vid not in self.domains:
+            raise ValueError("Variable " + str(vid) + " is not in the model")
+        if sampled and vid in self.evidence:
+            raise ValueError("Variable " + vid + " is observed")
+
+    def indicators(self, vid: str, i: int) -> List[List[float]]:
+        """!
+        \brief for each chain, whether each sample of a variable has its i-th
+        value
+        """
+        return [[1.0 if x == i else 0.0 for x in c[vid]] for c in self.chains]
+
+    def marginal(self, v: Union[NumCatRVariable, str]) -> TabularFactor:
+        """!
+        \brief normalized marginal of a variable estimated from every chain
+
+        \throws ValueError if the variable is not in the model
+        """
+        vid = v.id() if isinstance(v, NumCatRVariable) else v
+        self.check(vid)
+        counts = [0.0 for _ in self.domains[vid]]
+        if vid in self.evidence:
+            counts[self.evidence[vid]] = 1.0
+        else:
+            for c in self.chains:
+                for x in c[vid]:
+                    counts[x] += 1
+        total = sum(counts)
+        return TabularFactor(
+            gid="gibbs_" + vid,
+            scope_vars=[self.variables[vid]],
+            domains=[self.domains[vid]],
+            values=[x / total for x in counts],
+        )
+
+    def marginals(self) -> Dict[str, TabularFactor]:
+        """!
+        \brief estimated marginals of every variable of the model
+        """
+        return {vid: self.marginal(vid) for vid in sorted(self.domains)}
+
+    def r_hat(self, vid: str) -> float:
+        """!
+        \brief largest split potential scale reduction of the indicators of
+        the values of an unobserved variable
+        """
+        self.check(vid, sampled=True)
+        return max(
+            [
+                split_r_hat(self.indicators(vid, i))
+                for i in range(len(self.domains[vid]))
+            ]
+        )
+
+    def ess(self, vid: str) -> float:
+        """!
+        \brief smallest effective sample size of the indicators of the values
+        of an unobserved variable, summed over chains
+        """
+        self.check(vid, sampled=True)
+        return min(
+            [
+                sum([effective_sample_size(c) for c in self.indicators(vid, i)])
+                for i in range(len(self.domains[vid]))
+            ]
+        )
+
+    def diagnostics(self) -> Dict[str, Tuple[float, float]]:
+        """!
+        \brief (r_hat, ess) of each unobserved variable
+        """
+        return {
+            vid: (self.r_hat(vid), self.ess(vid))
+            for vid in sorted(self.domains)
+            if vid not in self.evidence
+        }
+
+
+class GibbsSampler:
+    """!
+    \brief block Gibbs sampler of a model with independent chains
+
+    \code{.py}
+
+    >>> gibbs = GibbsSampler(mrf, evidences=set([("11", False)]), burn_in=200)
+    >>> result = gibbs.run(nb_samples=2000, nb_chains=4, max_workers=4)
+    >>> result.marginal("00").phi(set([("00", True)]))
+    >>> result.r_hat("00")
+    >>> 1.002
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        model,
+        evidences: Optional[Set[Tuple[str, NumericValue]]] = None,
+        burn_in: int = 100,
+        thinning: int = 1,
+        seed: Optional[int] = None,
+        cache_size: int = 4096,
+    ):
+        """!
+        \param model a PGModel, its factors are read once and are not modified
+        \param evidences set of (id, value) pairs. Values given by the
+        "evidence" data of nodes are used for variables that are not in
+        evidences.
+        \param burn_in number of sweeps of a chain before samples are kept
+        \param thinning a sample is kept every thinning sweeps
+        \param seed seed of the seeds of the chains
+        \param cache_size maximum number of conditional distributions cached
+        per variable in a chain
+
+        \throws ValueError if a parameter is out of range, the model has no
+        factors or an observed value is not in the domain of its variable
+        """
+        if burn_in < 0 or thinning < 1:
+            raise ValueError("burn_in must not be negative and thinning positive")
+        factors = sorted(model.factors(), key=lambda f: f.id())
+        if len(factors) == 0:
+            raise ValueError("Model must have factors")
+        self.burn_in = burn_in
+        self.thinning = thinning
+        self.cache_size = cache_size
+        self.rng = Random(seed)
+        self.variables: Dict[str, NumCatRVariable] = {n.id(): n for n in model.nodes()}
+        for f in factors:
+            for v in f.scope_vars():
+                self.variables.setdefault(v.id(), v)
+        ids = sorted(self.variables)
+        number = {vid: i for i, vid in enumerate(ids)}
+        self.domains: Dict[str, List[NumericValue]] = {
+            vid: list(v.values()) for vid, v in self.variables.items()
+        }
+        observed: Dict[str, NumericValue] = {}
+        for vid, v in self.variables.items():
+            if "evidence" in v.data():
+                observed[vid] = v.data()["evidence"]
+        for vid, value in evidences if evidences is not None else set():
+            observed[vid] = value
+        self.evidence: Dict[str, int] = {}
+        for vid, value in observed.items():
+            if vid not in self.domains:
+                raise ValueError("Variable " + str(vid) + " is not in the model")
+            if value not in self.domains[vid]:
+                msg = "Value " + str(value) + " is not in domain of " + vid
+                raise ValueError(msg)
+            self.evidence[vid] = self.domains[vid].index(value)
+        tables = []
+        factors_of: List[List[Tuple[int, int]]] = [[] for _ in ids]
+        for a, f in enumerate(factors):
+            t = TabularFactor.from_factor(f)
+            strides = []
+            size = 1
+            for domain in reversed(t.domains):
+                strides.append(size)
+                size *= len(domain)
+            strides.reverse()
+            positions = []
+            for vid, domain in zip(t.var_ids, t.domains):
+                index = {x: i for i, x in enumerate(domain)}
+                positions.append([index.get(x, -1) for x in self.domains[vid]])
+            scope = [number[vid] for vid in t.var_ids]
+            tables.append((scope, strides, positions, t.table_values()))
+            for k, v in enumerate(scope):
+                factors_of[v].append((a, k))
+        # Markov blankets from the factors, the neighbours of a variable in
+        # the interaction graph of the model
+        adjacency = model.interaction_graph()
+        blankets = [sorted([number[u] for u in adjacency[vid]]) for vid in ids]
+        unobserved = [v for v, vid in enumerate(ids) if vid not in self.evidence]
+        self.tables = GibbsTables(
+            ids=ids,
+            sizes=[len(self.domains[vid]) for vid in ids],
+            factors=tables,
+            factors_of=factors_of,
+            blankets=blankets,
+            blocks=color_blocks(blankets, unobserved),
+            evidence={number[vid]: i for vid, i in self.evidence.items()},
+        )
+
+    def blocks(self) -> List[List[str]]:
+        """!
+        \brief identifiers of the variables updated together
+        """
+        return [[self.tables.ids[v] for v in block] for block in self.tables.blocks]
+
+    def run(
+        self,
+        nb_samples: int = 1000,
+        nb_chains: int = 4,
+        max_workers: Optional[int] = None,
+        processes: bool = True,
+    ) -> GibbsResult:
+        """!
+        \brief run independent chains from random states with positive
+        probability, see initial_state()
+
+        \param nb_samples number of samples kept by each chain
+        \param nb_chains number of chains
+        \param max_workers number of worker processes, the number of
+        processors if it is not provided
+        \param processes run chains in worker processes, otherwise one after
+        the other in this process
+
+        \throws ValueError if nb_samples or nb_chains is not positive, or no
+        state with positive probability is found
+        """
+        if nb_samples < 1 or nb_chains < 1:
+            raise ValueError("nb_samples and nb_chains must be positive")
+        args = [
+            (
+                self.tables,
+                nb_samples,
+                self.burn_in,
+                self.thinning,
+                self.rng.getrandbits(32),
+                self.cache_size,
+            )
+            for _ in range(nb_chains)
+        ]
+        if processes and nb_chains > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(run_chain, *a) for a in args]
+                chains = [future.result() for future in futures]
+        else:
+            chains = [run_chain(*a) for a in args]
+        return GibbsResult(chains, self.variables, self.domains, self.evidence)
@@ -0,0 +1,241 @@
+"""!
+\file inferencesession.py
+
+# Inference Session
+
+A session keeps the messages of a junction tree between queries and updates
+them when the evidence changes. Messages are computed with the sum product
+message passing of Koller, Friedman 2009, p. 352:
+
+\f[ \delta_{i \rightarrow j} = \sum_{C_i - S_{i,j}} \psi_i \cdot
+\prod_{k \in N(i) - \{j\}} \delta_{k \rightarrow i} \f]
+
+The evidence on a variable is entered in a single clique that contains it,
+its home clique, by reducing the initial potential of that clique. When the
+evidence of a variable is set or retracted, only the messages that leave the
+home clique, directly or through other cliques, depend on it. These messages
+are flagged as dirty and they are recomputed lazily, when a query needs them.
+Other messages are reused as they are.
+"""
+
+from gmodels.junctiontree import JunctionTree
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+from gmodels.tabularfactor import TabularFactor
+
+from typing import Set, List, Dict, Tuple, Optional, Union
+
+
+class InferenceSession:
+    """!
+    \brief Incremental evidence updates over the clique tree of a model
+
+    \code{.py}
+
+    >>> session = InferenceSession(model)
+    >>> session.set_evidence(a, True)
+    >>> session.marginal(c).phi(set([("c", True)]))
+    >>> 0.32
+    >>> session.retract_evidence(a)
+
+    \endcode
+    """
+
+    def __init__(
+        self, model, factor_type=TabularFactor, tree: Optional[JunctionTree] = None
+    ):
+        """!
+        \brief start a session without evidence
+
+        \param model a PGModel, its factors are not modified
+        \param factor_type TabularFactor or LogTabularFactor
+        \param tree clique tree of the model, built if it is not provided
+        """
+        if tree is None:
+            tree = JunctionTree(model, factor_type=factor_type)
+        self.tree = tree
+        self.potentials: List[TabularFactor] = [
+            tree.initial_potential(i, {}) for i in range(len(tree.cliques))
+        ]
+        self.evidence: Dict[str, NumericValue] = {}
+        self.reduced: Dict[int, TabularFactor] = {}
+        self.messages: Dict[Tuple[int, int], TabularFactor] = {}
+        self.dirty: Set[Tuple[int, int]] = set()
+        for i, ns in tree.neighbours.items():
+            for j in ns:
+                self.dirty.add((i, j))
+        self.cache: Dict[Tuple[str, ...], TabularFactor] = {}
+        self.nb_messages = 0
+
+    def variable_id(self, v: Union[NumCatRVariable, str]) -> str:
+        """!
+        \brief identifier of a model variable
+
+        \throws ValueError if the variable is not in the model
+        """
+        vid = v.id() if isinstance(v, NumCatRVariable) else v
+        if vid not in self.tree.variables:
+            raise ValueError("Variable " + str(vid) + " is not in the model")
+        return vid
+
+    def set_evidence(self, v: Union[NumCatRVariable, str], value: NumericValue):
+        """!
+        \brief observe a variable, or change its observed value
+
+        \throws ValueError if the value is not in the domain of the variable
+        """
+        vid = self.variable_id(v)
+        if value not in self.tree.domains[vid]:
+            msg = "Value " + str(value) + " is not in domain of " + vid
+            raise ValueError(msg)
+        if vid in self.evidence and self.evidence[vid] == value:
+            return
+        self.evidence[vid] = value
+        self.invalidate(self.tree.clique_of[vid])
+
+    def set_evidences(self, evidences: Set[Tuple[str, NumericValue]]):
+        """!
+        \brief observe several variables
+
+        \see InferenceSession.set_evidence(v, value)
+        """
+        for vid, value in evidences:
+            self.set_evidence(vid, value)
+
+    def retract_evidence(self, v: Union[NumCatRVariable, str]):
+        """!
+        \brief remove the observation of a variable
+
+        \throws ValueError if the variable is not observed
+        """
+        vid = self.variable_id(v)
+        if vid not in self.evidence:
+            raise ValueError("Variable " + vid + " is not observed")
+        self.evidence.pop(vid)
+        self.invalidate(self.tree.clique_of[vid])
+
+    def evidences(self) -> Set[Tuple[str, NumericValue]]:
+        """!
+        \brief current evidence as a set of (id, value) pairs
+        """
+        return set(self.evidence.items())
+
+    def invalidate(self, home: int):
+        """!
+        \brief flag the messages that depend on the potential of a clique
+
+        These are the messages directed away from the clique. If a message is
+        already dirty, the messages behind it are dirty too, so the walk stops
+        there.
+        """
+        self.reduced.pop(home, None)
+        self.cache = {}
+        stack = [(home, j) for j in self.tree.neighbours[home]]
+        while len(stack) > 0:
+            i, j = stack.pop()
+            if (i, j) in self.dirty:
+                continue
+            self.dirty.add((i, j))
+            stack.extend([(j, k) for k in self.tree.neighbours[j] if k != i])
+
+    def potential(self, i: int) -> TabularFactor:
+        """!
+        \brief initial potential of a clique reduced by the evidence whose
+        home is the clique
+
+        The reduction is a view of the potential, its table is not copied.
+        """
+        if i in self.reduced:
+            return self.reduced[i]
+        context = set(
+            [
+                (v.id(), self.evidence[v.id()])
+                for v in self.tree.cliques[i]
+                if v.id() in self.evidence and self.tree.clique_of[v.id()] == i
+            ]
+        )
+        psi = self.potentials[i]
+        if len(context) > 0:
+            psi = psi.reduced(context)
+        self.reduced[i] = psi
+        return psi
+
+    def message(self, i: int, j: int) -> TabularFactor:
+        """!
+        \brief message from clique i to its neighbour j, recomputed if it is
+        dirty
+        """
+        if (i, j) not in self.dirty:
+            return self.messages[(i, j)]
+        f = self.potential(i)
+        for k in self.tree.neighbours[i]:
+            if k != j:
+                f, _ = f.product(self.message(k, i))
+        sep = set([v.id() for v in self.tree.separator(i, j)])
+        for v in self.tree.cliques[i]:
+            if v.id() not in sep:
+                f = f.sumout_var(v)
+        self.messages[(i, j)] = f
+        self.dirty.discard((i, j))
+        self.nb_messages += 1
+        return f
+
+    def belief(self, i: int) -> TabularFactor:
+        """!
+        \brief unnormalized marginal of a clique given the evidence
+        """
+        f = self.potential(i)
+        for k in self.tree.neighbours[i]:
+            f, _ = f.product(self.message(k, i))
+        return f
+
+    def probability_of_evidence(self) -> float:
+        """!
+        \brief unnormalized measure of the evidence
+
+        \see JunctionTree.probability_of_evidence()
+        """
+        prob = 1.0
+        for root in self.tree.roots():
+            prob *= self.belief(root).Z
+        return prob
+
+    def joint_marginal(self, vs: Set[Union[NumCatRVariable, str]]) -> TabularFactor:
+        """!
+        \brief normalized marginal over variables of a single clique
+
+        \throws ValueError if no clique contains all the variables or if the
+        evidence has zero probability
+        """
+        vids = tuple(sorted([self.variable_id(v) for v in vs]))
+        if vids in self.cache:
+            return self.cache[vids]
+        cliques = self.tree.cliques
+        candidates = [
+            i
+            for i, c in enumerate(cliques)
+            if set(vids).issubset(set([v.id() for v in c]))
+        ]
+        if len(candidates) == 0:
+            raise ValueError("Variables " + ", ".join(vids) + " are not in a clique")
+        i = min(candidates, key=lambda c: (len(cliques[c]), c))
+        belief = self.belief(i)
+        for v in cliques[i]:
+            if v.id() not in vids:
+                belief = belief.sumout_var(v)
+        if belief.Z == 0:
+            raise ValueError("Evidence has zero probability")
+        marginal = belief.normalized()
+        self.cache[vids] = marginal
+        return marginal
+
+    def marginal(self, v: Union[NumCatRVariable, str]) -> TabularFactor:
+        """!
+        \brief normalized marginal of a single variable given the evidence
+        """
+        return self.joint_marginal(set([self.variable_id(v)]))
+
+    def marginals(self) -> Dict[str, TabularFactor]:
+        """!
+        \brief normalized marginals of every variable of the model
+        """
+        return {vid: self.marginal(vid) for vid in sorted(self.tree.variables)}
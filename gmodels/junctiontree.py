@@ -0,0 +1,392 @@
+"""!
+\file junctiontree.py
+
+# Junction Tree
+
+Clique tree inference from Koller, Friedman 2009, chapter 10. The variables
+that appear together in a factor are connected in an undirected graph, which
+is triangulated by eliminating variables with the min fill heuristic. The
+maximal cliques of the triangulated graph are connected by a maximum weight
+spanning tree over their separators, so that the tree has the running
+intersection property, see Koller, Friedman 2009, p. 372.
+
+Each factor of the model is assigned to a clique that contains its scope.
+Calibration runs belief update (Koller, Friedman 2009, p. 367) from the leaves
+to a root and back, using in place products and divisions of tabular
+factors. After calibration the belief of each clique is its unnormalized
+marginal given the evidence, so every single variable marginal and every
+marginal over variables of a single clique is read from the beliefs without
+running inference again.
+"""
+
+from gmodels.gtypes.edge import Edge, EdgeType
+from gmodels.gtypes.undigraph import UndiGraph
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+from gmodels.factor import Factor
+from gmodels.tabularfactor import TabularFactor
+from gmodels.assignmentcodec import EncodedAssignment
+from gmodels.ordering import elimination_order, triangulate
+
+from typing import Set, List, Dict, Tuple, Optional, Union
+from uuid import uuid4
+
+
+def min_fill_triangulation(
+    adjacency: Dict[str, Set[str]]
+) -> Tuple[List[str], Dict[str, Set[str]]]:
+    """!
+    \brief triangulate a graph by eliminating nodes with the min fill
+    heuristic, Koller, Friedman 2009, p. 314
+
+    The given adjacency is not modified.
+
+    \see elimination_order(adjacency, heuristic)
+
+    \param adjacency map from node identifiers to identifiers of neighbours
+
+    \return elimination order, adjacency of the triangulated graph
+    """
+    order = elimination_order(adjacency, "min-fill").order
+    return order, triangulate(adjacency, order)
+
+
+class JunctionTree:
+    """!
+    \brief Clique tree built from the factors of a model
+
+    \code{.py}
+
+    >>> jt = JunctionTree(model)
+    >>> jt.calibrate(set([("a", True)]))
+    >>> jt.marginal(c).phi(set([("c", True)]))
+    >>> 0.32
+
+    \endcode
+    """
+
+    def __init__(self, model, factor_type=TabularFactor):
+        """!
+        \brief build the clique tree of a model
+
+        \param model a PGModel, its factors are read once and are not modified
+        \param factor_type TabularFactor, LogTabularFactor or SparseFactor,
+        representation of clique beliefs
+
+        \throws ValueError if the model has no factors
+        """
+        factors = list(model.factors())
+        if len(factors) == 0:
+            raise ValueError("Model must have factors")
+        self.factor_type = factor_type
+        self.variables: Dict[str, NumCatRVariable] = {n.id(): n for n in model.nodes()}
+        self.domains: Dict[str, List[NumericValue]] = {}
+        for f in factors:
+            for v in f.scope_vars():
+                self.variables.setdefault(v.id(), v)
+                domain = f.domain_of(v)
+                if v.id() in self.domains:
+                    dset = set(domain)
+                    domain = [d for d in self.domains[v.id()] if d in dset]
+                self.domains[v.id()] = list(domain)
+        for vid, v in self.variables.items():
+            self.domains.setdefault(vid, v.values())
+        self.tables: List[Factor] = [factor_type.from_factor(f) for f in factors]
+        #
+        adjacency: Dict[str, Set[str]] = {vid: set() for vid in self.variables}
+        for f in factors:
+            for a in f.var_of:
+                adjacency[a].update([b for b in f.var_of if b != a])
+        self.order, chordal = min_fill_triangulation(adjacency)
+        self.cliques: List[List[NumCatRVariable]] = self.maximal_cliques(chordal)
+        self.neighbours, self.separators = self.spanning_tree()
+        self.assignment = self.assign_factors()
+        self.clique_of: Dict[str, int] = {}
+        for i, clique in enumerate(self.cliques):
+            for v in clique:
+                j = self.clique_of.get(v.id())
+                if j is None or len(self.cliques[j]) > len(clique):
+                    self.clique_of[v.id()] = i
+        self.beliefs: Optional[List[TabularFactor]] = None
+        self.sepsets: Dict[Tuple[int, int], TabularFactor] = {}
+        self.evidences: Set[Tuple[str, NumericValue]] = set()
+        self.cache: Dict[Tuple[str, ...], TabularFactor] = {}
+
+    def maximal_cliques(
+        self, chordal: Dict[str, Set[str]]
+    ) -> List[List[NumCatRVariable]]:
+        """!
+        \brief maximal cliques of the triangulated graph with
+        UndiGraph.find_maximal_cliques()
+
+        \return cliques as lists of variables ordered by identifier, in the
+        order of their identifiers
+        """
+        edges = set()
+        for a, ns in chordal.items():
+            for b in ns:
+                if a < b:
+                    edges.add(
+                        Edge(
+                            edge_id=a + "--" + b,
+                            start_node=self.variables[a],
+                            end_node=self.variables[b],
+                            edge_type=EdgeType.UNDIRECTED,
+                        )
+                    )
+        g = UndiGraph(
+            gid=str(uuid4()), nodes=set(self.variables.values()), edges=edges
+        )
+        cliques = [
+            sorted([self.variables[n.id()] for n in c], key=lambda v: v.id())
+            for c in g.find_maximal_cliques()
+        ]
+        return sorted(cliques, key=lambda c: [v.id() for v in c])
+
+    def spanning_tree(
+        self,
+    ) -> Tuple[Dict[int, List[int]], Dict[Tuple[int, int], List[NumCatRVariable]]]:
+        """!
+        \brief maximum weight spanning forest of cliques, where the weight of
+        an edge is the size of the separator, Koller, Friedman 2009, p. 372
+
+        Kruskal's algorithm with a union find structure.
+
+        \return neighbours of each clique, separator of each tree edge keyed by
+        (smaller index, larger index)
+        """
+        scopes = [set([v.id() for v in c]) for c in self.cliques]
+        candidates = []
+        for i in range(len(scopes)):
+            for j in range(i + 1, len(scopes)):
+                weight = len(scopes[i] & scopes[j])
+                if weight > 0:
+                    candidates.append((-weight, i, j))
+        candidates.sort()
+        parent = list(range(len(scopes)))
+
+        def find(i: int) -> int:
+            ""
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        neighbours: Dict[int, List[int]] = {i: [] for i in range(len(scopes))}
+        separators: Dict[Tuple[int, int], List[NumCatRVariable]] = {}
+        for _, i, j in candidates:
+            ri, rj = find(i), find(j)
+            if ri == rj:
+                continue
+            parent[ri] = rj
+            neighbours[i].append(j)
+            neighbours[j].append(i)
+            separators[(i, j)] = [v for v in self.cliques[i] if v.id() in scopes[j]]
+        return neighbours, separators
+
+    def assign_factors(self) -> Dict[int, List[Factor]]:
+        """!
+        \brief assign each factor to the smallest clique containing its scope
+
+        \throws ValueError if no clique contains the scope of a factor
+        """
+        assignment: Dict[int, List[Factor]] = {i: [] for i in range(len(self.cliques))}
+        scopes = [set([v.id() for v in c]) for c in self.cliques]
+        for f in self.tables:
+            fscope = set(f.var_of)
+            candidates = [i for i, s in enumerate(scopes) if fscope.issubset(s)]
+            if len(candidates) == 0:
+                raise ValueError("No clique contains the scope of factor " + f.id())
+            i = min(candidates, key=lambda c: (len(scopes[c]), c))
+            assignment[i].append(f)
+        return assignment
+
+    def separator(self, i: int, j: int) -> List[NumCatRVariable]:
+        """!
+        \brief variables shared by two adjacent cliques
+        """
+        return self.separators[(min(i, j), max(i, j))]
+
+    def initial_potential(
+        self, i: int, evidence: Dict[str, NumericValue]
+    ) -> TabularFactor:
+        """!
+        \brief product of the factors assigned to a clique, reduced by evidence
+
+        Observed variables keep only their observed value in the domain of
+        the clique.
+        """
+        vs = self.cliques[i]
+        domains = [
+            [evidence[v.id()]] if v.id() in evidence else self.domains[v.id()]
+            for v in vs
+        ]
+        size = 1
+        for d in domains:
+            size *= len(d)
+        psi = self.factor_type(
+            gid=str(uuid4()),
+            scope_vars=vs,
+            domains=domains,
+            values=self.factor_type.to_table_values([1.0] * size),
+        )
+        for f in self.assignment[i]:
+            psi.multiply_in(f)
+        return psi
+
+    def traversal(self) -> List[Tuple[int, int]]:
+        """!
+        \brief (parent, child) edges of the forest in breadth first order from
+        the root of each tree. Roots are the first cliques of their trees.
+        """
+        edges = []
+        visited = set()
+        for root in range(len(self.cliques)):
+            if root in visited:
+                continue
+            visited.add(root)
+            queue = [root]
+            while len(queue) > 0:
+                i = queue.pop(0)
+                for j in sorted(self.neighbours[i]):
+                    if j not in visited:
+                        visited.add(j)
+                        edges.append((i, j))
+                        queue.append(j)
+        return edges
+
+    def roots(self) -> List[int]:
+        """!
+        \brief root clique of each tree of the forest
+        """
+        children = set([j for _, j in self.traversal()])
+        return [i for i in range(len(self.cliques)) if i not in children]
+
+    def send(self, i: int, j: int):
+        """!
+        \brief belief update message from clique i to clique j, Koller,
+        Friedman 2009, p. 367
+
+        \f[ \sigma_{i \rightarrow j} = \sum_{C_i - S_{i,j}} \beta_i \f]
+        \f[ \beta_j = \beta_j \cdot \frac{\sigma_{i \rightarrow j}}{\mu_{i,j}} \f]
+        """
+        key = (min(i, j), max(i, j))
+        sep = set([v.id() for v in self.separators[key]])
+        message = self.beliefs[i]
+        for v in self.cliques[i]:
+            if v.id() not in sep:
+                message = message.sumout_var(v)
+        mu = self.sepsets.get(key)
+        if mu is None:
+            self.beliefs[j].multiply_in(message)
+        else:
+            self.beliefs[j].multiply_in(message.divide(mu))
+        self.sepsets[key] = message
+
+    def calibrate(self, evidences: Set[Tuple[str, NumericValue]] = frozenset()):
+        """!
+        \brief calibrate clique beliefs for the given evidence
+
+        Beliefs are rebuilt from the factors of the model, so the tree can be
+        calibrated again with another evidence set.
+
+        \param evidences set of (id, value) pairs or an EncodedAssignment
+
+        \throws ValueError if an evidence is not a variable of the model, if
+        its value is out of domain or if the evidence has zero probability
+        """
+        if isinstance(evidences, EncodedAssignment):
+            evidences = evidences.to_set()
+        evidence = {}
+        for vid, value in evidences:
+            if vid not in self.variables:
+                raise ValueError("Evidence " + vid + " is not a variable of the model")
+            if value not in self.domains[vid]:
+                msg = "Value " + str(value) + " is not in domain of " + vid
+                raise ValueError(msg)
+            evidence[vid] = value
+        self.beliefs = [self.initial_potential(i, evidence) for i in range(len(self.cliques))]
+        self.sepsets = {}
+        self.cache = {}
+        edges = self.traversal()
+        for parent, child in reversed(edges):
+            self.send(child, parent)
+        for parent, child in edges:
+            self.send(parent, child)
+        self.evidences = set(evidences)
+        if self.probability_of_evidence() == 0:
+            raise ValueError("Evidence has zero probability")
+
+    def is_calibrated(self) -> bool:
+        """!
+        \brief whether beliefs have been computed
+        """
+        return self.beliefs is not None
+
+    def calibrated_beliefs(self) -> List[TabularFactor]:
+        """!
+        \brief clique beliefs, the tree is calibrated without evidence if
+        calibrate(evidences) was not called
+        """
+        if self.beliefs is None:
+            self.calibrate()
+        return self.beliefs
+
+    def probability_of_evidence(self) -> float:
+        """!
+        \brief unnormalized measure of the evidence
+
+        It is the probability of the evidence for a bayesian network and the
+        partition function of the reduced model for a markov network.
+        """
+        beliefs = self.calibrated_beliefs()
+        prob = 1.0
+        for root in self.roots():
+            prob *= beliefs[root].Z
+        return prob
+
+    def joint_marginal(
+        self, vs: Set[Union[NumCatRVariable, str]]
+    ) -> TabularFactor:
+        """!
+        \brief normalized marginal over variables of a single clique
+
+        \param vs variables or their identifiers
+
+        \throws ValueError if no clique contains all the variables
+        """
+        vids = tuple(sorted([v.id() if isinstance(v, NumCatRVariable) else v for v in vs]))
+        if vids in self.cache:
+            return self.cache[vids]
+        beliefs = self.calibrated_beliefs()
+        candidates = [
+            i
+            for i, c in enumerate(self.cliques)
+            if set(vids).issubset(set([v.id() for v in c]))
+        ]
+        if len(candidates) == 0:
+            raise ValueError("Variables " + ", ".join(vids) + " are not in a clique")
+        i = min(candidates, key=lambda c: (len(self.cliques[c]), c))
+        belief = beliefs[i]
+        for v in self.cliques[i]:
+            if v.id() not in vids:
+                belief = belief.sumout_var(v)
+        marginal = belief.normalized()
+        self.cache[vids] = marginal
+        return marginal
+
+    def marginal(self, v: Union[NumCatRVariable, str]) -> TabularFactor:
+        """!
+        \brief normalized marginal of a single variable
+
+        \param v variable or its identifier
+        """
+        vid = v.id() if isinstance(v, NumCatRVariable) else v
+        if vid not in self.variables:
+            raise ValueError("Variable " + vid + " is not in the model")
+        return self.joint_marginal(set([vid]))
+
+    def marginals(self) -> Dict[str, TabularFactor]:
+        """!
+        \brief normalized marginals of every variable of the model
+        """
+        return {vid: self.marginal(vid) for vid in sorted(self.variables)}
@@ -0,0 +1,439 @@
+"""!
+\file meanfield.py
+
+# Mean Field Variational Inference
+
+Naive mean field, Koller, Friedman 2009, p. 449, approximates the
+distribution of a model by a product of independent marginals
+\f$ Q(X) = \prod_v Q_v(X_v) \f$. Each marginal is updated in turn from the
+expected logarithms of the factors that contain its variable, under the
+marginals of the other variables of these factors:
+
+\f[ Q_v(x) \propto \exp \sum_{a \ni v} E_{Q}[\ln \phi_a \mid x_v = x] \f]
+
+Each update increases the evidence lower bound
+
+\f[ ELBO(Q) = \sum_a E_Q[\ln \phi_a] + \sum_v H(Q_v) \le \ln Z \f]
+
+until marginals stop changing. Unlike sampling, the result is deterministic.
+Factors are read once into tables of logarithms, one row per value of each
+of their variables, so that an update only costs a dot product per row
+between the row and the joint marginal of the other variables of the
+factor.
+"""
+
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+from gmodels.tabularfactor import TabularFactor
+from gmodels.beliefpropagation import IterationStats
+
+from collections import namedtuple, deque
+from itertools import product
+from operator import mul
+from typing import Set, List, Dict, Tuple, Optional, Union
+import math
+import time
+
+
+View = namedtuple("View", ["others", "logs", "zeros"])
+View.__doc__ = """!
+\\brief a factor seen from one of its variables
+
+- others: identifiers of the other variables of the factor
+- logs: for each value of the variable, logarithm of the factor for each
+  assignment of the other variables in row major order, zero for zero
+  entries
+- zeros: for each value of the variable, positions of zero entries in logs,
+  None if the factor has no zero entries
+"""
+
+
+class MeanField:
+    """!
+    \brief approximate marginals by coordinate ascent on the evidence lower
+    bound of a product of independent marginals
+
+    \code{.py}
+
+    >>> mf = MeanField(model, tolerance=1e-8)
+    >>> mf.run(set([("11", False)]))
+    >>> True
+    >>> mf.marginal("00").phi(set([("00", True)]))
+    >>> mf.elbo[-1]
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        model,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100,
+        time_limit: Optional[float] = None,
+    ):
+        """!
+        \param model a PGModel, its factors are read once and are not modified
+        \param tolerance marginals have converged when no marginal changes by
+        more than tolerance in an iteration
+        \param max_iterations maximum number of iterations, each iteration
+        updates every unobserved variable once
+        \param time_limit maximum duration of a run in seconds, checked after
+        each iteration
+
+        \throws ValueError if a parameter is out of range or the model has no
+        factors
+        """
+        if max_iterations < 1:
+            raise ValueError("max_iterations must be positive")
+        factors = sorted(model.factors(), key=lambda f: f.id())
+        if len(factors) == 0:
+            raise ValueError("Model must have factors")
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.variables: Dict[str, NumCatRVariable] = {n.id(): n for n in model.nodes()}
+        for f in factors:
+            for v in f.scope_vars():
+                self.variables.setdefault(v.id(), v)
+        self.domains: Dict[str, List[NumericValue]] = {
+            vid: list(v.values()) for vid, v in self.variables.items()
+        }
+        # factors of a single variable are summed into a bias, other factors
+        # are seen from each of their variables
+        self.bias: Dict[str, List[float]] = {
+            vid: [0.0 for _ in d] for vid, d in self.domains.items()
+        }
+        self.views: Dict[str, List[View]] = {vid: [] for vid in self.variables}
+        self.factor_views: List[Tuple[str, View]] = []
+        for f in factors:
+            t = TabularFactor.from_factor(f)
+            scope = list(t.var_ids)
+            index = [{x: i for i, x in enumerate(self.domains[vid])} for vid in scope]
+            values: Dict[Tuple[int, ...], float] = {}
+            for value, row in zip(
+                t.table_values(), t.codec.decode_batch(range(t.codec.size))
+            ):
+                entry = [index[k][t.domains[k][i]] for k, i in enumerate(row)]
+                values[tuple(entry)] = value
+            if len(scope) == 1:
+                bias = self.bias[scope[0]]
+                for x in range(len(bias)):
+                    value = values.get((x,), 0.0)
+                    bias[x] += math.log(value) if value > 0 else -math.inf
+                continue
+            for k, vid in enumerate(scope):
+                others = [j for j in range(len(scope)) if j != k]
+                assignments = list(
+                    product(*[range(len(self.domains[scope[j]])) for j in others])
+                )
+                logs = []
+                zeros = []
+                for x in range(len(self.domains[vid])):
+                    row = []
+                    zero = []
+                    for c, assignment in enumerate(assignments):
+                        entry = list(assignment)
+                        entry.insert(k, x)
+                        # values outside of the domain of the factor are zero
+                        value = values.get(tuple(entry), 0.0)
+                        row.append(math.log(value) if value > 0 else 0.0)
+                        if value <= 0:
+                            zero.append(c)
+                    logs.append(row)
+                    zeros.append(zero)
+                view = View(
+                    others=[scope[j] for j in others],
+                    logs=logs,
+                    zeros=zeros if any(zeros) else None,
+                )
+                self.views[vid].append(view)
+                if k == 0:
+                    self.factor_views.append((vid, view))
+        self.order: List[str] = sorted(self.variables)
+        self.evidence: Dict[str, int] = {}
+        self.q: Dict[str, List[float]] = {}
+        self.elbo: List[float] = []
+        self.stats: List[IterationStats] = []
+        self.converged = False
+
+    def set_evidences(self, evidences: Set[Tuple[str, NumericValue]]):
+        """!
+        \brief observed values, replacing previous ones
+
+        \throws ValueError if a variable is unknown or a value is not in its
+        domain
+        """
+        evidence = {}
+        for vid, value in evidences:
+            if vid not in self.domains:
+                raise ValueError("Variable " + str(vid) + " is not in the model")
+            if value not in self.domains[vid]:
+                msg = "Value " + str(value) + " is not in domain of " + vid
+                raise ValueError(msg)
+            evidence[vid] = self.domains[vid].index(value)
+        self.evidence = evidence
+
+    def expected_log(self, view: View) -> List[float]:
+        """!
+        \brief expected logarithm of a factor for each value of a variable,
+        -inf for values that the factor excludes
+        """
+        if len(view.others) == 1:
+            weights = self.q[view.others[0]]
+        else:
+            weights = [1.0]
+            for u in view.others:
+                weights = [w * p for w in weights for p in self.q[u]]
+        if view.zeros is None:
+            return [sum(map(mul, weights, row)) for row in view.logs]
+        return [
+            -math.inf
+            if any([weights[c] > 0 for c in zero])
+            else sum(map(mul, weights, row))
+            for row, zero in zip(view.logs, view.zeros)
+        ]
+
+    def expected_logs(self, vid: str) -> List[float]:
+        """!
+        \brief sum of the bias and of the expected logarithms of the factors
+        of a variable for each of its values
+        """
+        logs = list(self.bias[vid])
+        for view in self.views[vid]:
+            for x, e in enumerate(self.expected_log(view)):
+                logs[x] += e
+        return logs
+
+    def update(self, vid: str) -> Optional[float]:
+        """!
+        \brief coordinate update of the marginal of a variable
+
+        \return largest change of a probability of the marginal, None if the
+        marginals of the other variables exclude every value of the variable,
+        in which case the marginal is not changed
+        """
+        logs = self.expected_logs(vid)
+        top = max(logs)
+        if top == -math.inf:
+            return None
+        q = [math.exp(x - top) for x in logs]
+        total = sum(q)
+        q = [x / total for x in q]
+        change = max([abs(x - y) for x, y in zip(q, self.q[vid])])
+        self.q[vid] = q
+        return change
+
+    def candidates(self, vid: str, state: Dict[str, int]) -> List[int]:
+        """!
+        \brief values of a variable with positive probability given the
+        variables that have a value in state, best values first
+        """
+        scores = list(self.bias[vid])
+        for view in self.views[vid]:
+            if any([u not in state for u in view.others]):
+                continue
+            c = 0
+            for u in view.others:
+                c = c * len(self.domains[u]) + state[u]
+            for x in range(len(scores)):
+                if view.zeros is not None and c in view.zeros[x]:
+                    scores[x] = -math.inf
+                else:
+                    scores[x] += view.logs[x][c]
+        values = [x for x in range(len(scores)) if scores[x] > -math.inf]
+        return sorted(values, key=lambda x: -scores[x])
+
+    def feasible_state(self) -> Optional[Dict[str, int]]:
+        """!
+        \brief value index of each variable of an assignment with positive
+        probability that agrees with the evidence, None if there is none
+
+        Variables get values in breadth first order from observed variables,
+        with backtracking when a variable has no value left.
+        """
+        state = dict(self.evidence)
+        for vid, i in self.evidence.items():
+            if i not in self.candidates(vid, state):
+                return None
+        neighbours: Dict[str, Set[str]] = {vid: set() for vid in self.order}
+        for vid in self.order:
+            for view in self.views[vid]:
+                neighbours[vid].update(view.others)
+        order: List[str] = []
+        seen: Set[str] = set()
+        for root in sorted(self.evidence) + self.order:
+            if root in seen:
+                continue
+            seen.add(root)
+            queue = deque([root])
+            while len(queue) > 0:
+                vid = queue.popleft()
+                if vid not in self.evidence:
+                    order.append(vid)
+                for u in sorted(neighbours[vid]):
+                    if u not in seen:
+                        seen.add(u)
+                        queue.append(u)
+        remaining: List[List[int]] = []
+        k = 0
+        while k < len(order):
+            if len(remaining) == k:
+                remaining.append(self.candidates(order[k], state))
+            if len(remaining[k]) > 0:
+                state[order[k]] = remaining[k].pop(0)
+                k += 1
+                continue
+            remaining.pop()
+            k -= 1
+            if k < 0:
+                return None
+            del state[order[k]]
+        return state
+
+    def set_marginals(self, state: Optional[Dict[str, int]] = None):
+        """!
+        \brief uniform marginals, or all the mass of each variable on its
+        value in state, observed variables keep all of their mass on their
+        value
+        """
+        if state is None:
+            state = self.evidence
+        for vid in self.order:
+            size = len(self.domains[vid])
+            if vid in state:
+                self.q[vid] = [0.0 for _ in range(size)]
+                self.q[vid][state[vid]] = 1.0
+            else:
+                self.q[vid] = [1.0 / size for _ in range(size)]
+
+    def lower_bound(self) -> float:
+        """!
+        \brief evidence lower bound of the current marginals
+        """
+        energy = 0.0
+        for vid, view in self.factor_views:
+            for p, x in zip(self.q[vid], self.expected_log(view)):
+                if p > 0:
+                    energy += p * x
+        for vid in self.order:
+            for p, x in zip(self.q[vid], self.bias[vid]):
+                if p > 0:
+                    energy += p * x
+        entropy = -sum(
+            [p * math.log(p) for vid in self.order for p in self.q[vid] if p > 0]
+        )
+        return energy + entropy
+
+    def run(self, evidences: Optional[Set[Tuple[str, NumericValue]]] = None) -> bool:
+        """!
+        \brief update marginals until they converge, the iteration limit or the
+        time limit
+
+        Marginals start from uniform marginals at each run, observed
+        variables keep all of their mass on their value. When factors have
+        zero entries, uniform marginals can exclude every value of a
+        variable, the run then starts again from an assignment with positive
+        probability, see feasible_state(). Marginals of the variables of a
+        factor then never give positive mass to its zero entries together,
+        so updates never exclude every value.
+
+        \param evidences set of (id, value) pairs, previous evidence is kept if
+        it is not provided
+
+        \return whether marginals converged, the lower bound after each
+        iteration is in elbo and statistics of each iteration are in stats
+
+        \throws ValueError if no assignment that agrees with the evidence has
+        positive probability
+        """
+        if evidences is not None:
+            self.set_evidences(evidences)
+        self.set_marginals()
+        unobserved = [vid for vid in self.order if vid not in self.evidence]
+        self.elbo = []
+        self.stats = []
+        self.converged = False
+        start = time.monotonic()
+        restarted = False
+        iteration = 0
+        while iteration < self.max_iterations:
+            max_change: Optional[float] = 0.0
+            for vid in unobserved:
+                change = self.update(vid)
+                if change is None:
+                    max_change = None
+                    break
+                max_change = max(max_change, change)
+            if max_change is None:
+                state = self.feasible_state()
+                if restarted or state is None:
+                    msg = "Evidence has zero probability, no assignment of the"
+                    msg += " variables has a positive probability"
+                    raise ValueError(msg)
+                self.set_marginals(state)
+                restarted = True
+                continue
+            iteration += 1
+            self.elbo.append(self.lower_bound())
+            elapsed = time.monotonic() - start
+            self.stats.append(
+                IterationStats(
+                    iteration=iteration,
+                    max_residual=max_change,
+                    nb_updates=len(unobserved),
+                    elapsed=elapsed,
+                )
+            )
+            self.converged = max_change < self.tolerance
+            if self.converged:
+                break
+            if self.time_limit is not None and elapsed >= self.time_limit:
+                break
+        return self.converged
+
+    def marginal(self, v: Union[NumCatRVariable, str]) -> TabularFactor:
+        """!
+        \brief approximate normalized marginal of a variable
+
+        \throws ValueError if the variable is not in the model or marginals
+        were not computed
+        """
+        vid = v.id() if isinstance(v, NumCatRVariable) else v
+        if vid not in self.variables:
+            raise ValueError("Variable " + str(vid) + " is not in the model")
+        if vid not in self.q:
+            raise ValueError("Marginals are computed by run()")
+        return TabularFactor(
+            gid="mf_" + vid,
+            scope_vars=[self.variables[vid]],
+            domains=[self.domains[vid]],
+            values=list(self.q[vid]),
+        )
+
+    def marginals(self) -> Dict[str, TabularFactor]:
+        """!
+        \brief approximate marginals of every variable of the model
+        """
+        return {vid: self.marginal(vid) for vid in self.order}
+
+    def cond_prod(
+        self,
+        queries: Set[NumCatRVariable],
+        evidences: Set[Tuple[str, NumericValue]],
+    ) -> Tuple[TabularFactor, TabularFactor]:
+        """!
+        \brief approximate distribution of query variables given evidence,
+        with the result shape of PGModel.cond_prod_by_variable_elimination()
+
+        Query variables are independent under mean field, so the distribution
+        is the product of their marginals. It is normalized: the scale of an
+        exact result is approximated by the lower bound exp(elbo[-1]), which
+        easily overflows on large models.
+
+        \return the distribution and its sum over the query variables
+        """
+        self.run(set(evidences))
+        factors = [self.marginal(q) for q in sorted(queries, key=lambda q: q.id())]
+        phi = factors[0]
+        for f in factors[1:]:
+            phi, _ = phi.product(f)
+        return phi, phi.sumout_vars(set(queries))
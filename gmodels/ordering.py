@@ -0,0 +1,293 @@
+"""!
+\file ordering.py
+
+# Elimination Orderings
+
+The cost of variable elimination and the size of junction tree cliques
+depend on the order in which variables are eliminated. This file computes
+orderings with the greedy heuristics of Koller, Friedman 2009, p. 314:
+
+- min-degree: eliminate the variable with the fewest neighbours,
+- min-fill: eliminate the variable that adds the fewest edges between its
+  neighbours,
+- weighted-min-fill: eliminate the variable whose added edges have the
+  lowest total weight, the weight of an edge being the product of the
+  cardinalities of its endpoints,
+- max-cardinality: max cardinality search of Tarjan, Yannakakis 1984, which
+  visits at each step the variable with the most visited neighbours and
+  eliminates variables in the reverse visiting order.
+
+Orderings are computed on a private copy of the interaction graph whose
+nodes are integers. Scores are kept in a priority heap and only the scores of
+nodes around an eliminated node are recomputed, so the given graph is never
+modified. Each ordering reports its induced width, the number of neighbours
+of the largest elimination clique minus one, and the total size of the
+elimination clique tables, which estimate the cost of a query before it is
+run.
+"""
+
+from collections import namedtuple
+from typing import Set, List, Dict, Tuple, Optional
+import heapq
+
+
+HEURISTICS = ("min-degree", "min-fill", "weighted-min-fill", "max-cardinality")
+
+EliminationOrder = namedtuple("EliminationOrder", ["order", "width", "cost"])
+EliminationOrder.__doc__ = """!
+\\brief elimination ordering with its estimated cost
+
+- order: identifiers of eliminated variables in elimination order
+- width: induced width, size of the largest elimination clique minus one,
+  -1 if nothing is eliminated
+- cost: sum of the table sizes of the elimination cliques
+"""
+
+
+class EliminationGraph:
+    """!
+    \brief undirected graph over integer nodes on which variables are
+    eliminated
+
+    Nodes are numbered in the order of their identifiers, so that ties
+    between scores are broken by identifier.
+    """
+
+    def __init__(
+        self,
+        adjacency: Dict[str, Set[str]],
+        cardinalities: Optional[Dict[str, int]] = None,
+    ):
+        """!
+        \param adjacency map from identifiers to identifiers of neighbours
+        \param cardinalities map from identifiers to domain sizes, a missing
+        identifier counts as a binary variable
+        """
+        if cardinalities is None:
+            cardinalities = {}
+        names = set(adjacency)
+        for ns in adjacency.values():
+            names.update(ns)
+        self.ids: List[str] = sorted(names)
+        self.index: Dict[str, int] = {n: i for i, n in enumerate(self.ids)}
+        self.neighbours: List[Set[int]] = [set() for _ in self.ids]
+        for n, ns in adjacency.items():
+            i = self.index[n]
+            for m in ns:
+                if m != n:
+                    self.neighbours[i].add(self.index[m])
+                    self.neighbours[self.index[m]].add(i)
+        self.cards: List[int] = [cardinalities.get(n, 2) for n in self.ids]
+        self.eliminated: List[bool] = [False for _ in self.ids]
+
+    def fill(self, i: int) -> int:
+        """!
+        \brief number of edges added between neighbours of i if it is
+        eliminated
+        """
+        ns = sorted(self.neighbours[i])
+        count = 0
+        for k, a in enumerate(ns):
+            count += len([b for b in ns[k + 1 :] if b not in self.neighbours[a]])
+        return count
+
+    def weighted_fill(self, i: int) -> int:
+        """!
+        \brief total weight of edges added between neighbours of i if it is
+        eliminated
+        """
+        ns = sorted(self.neighbours[i])
+        weight = 0
+        for k, a in enumerate(ns):
+            for b in ns[k + 1 :]:
+                if b not in self.neighbours[a]:
+                    weight += self.cards[a] * self.cards[b]
+        return weight
+
+    def clique_size(self, i: int) -> int:
+        """!
+        \brief size of the table over i and its neighbours
+        """
+        size = self.cards[i]
+        for a in self.neighbours[i]:
+            size *= self.cards[a]
+        return size
+
+    def score(self, i: int, heuristic: str) -> Tuple[int, ...]:
+        """!
+        \brief score of i for a greedy heuristic, lower is eliminated first
+        """
+        if heuristic == "min-degree":
+            return (len(self.neighbours[i]), i)
+        if heuristic == "min-fill":
+            return (self.fill(i), len(self.neighbours[i]), i)
+        return (self.weighted_fill(i), self.clique_size(i), i)
+
+    def eliminate(self, i: int) -> Set[int]:
+        """!
+        \brief remove i and connect its neighbours
+
+        \return neighbours of i
+        """
+        ns = self.neighbours[i]
+        for a in ns:
+            self.neighbours[a].discard(i)
+            self.neighbours[a].update([b for b in ns if b != a])
+        self.neighbours[i] = set()
+        self.eliminated[i] = True
+        return ns
+
+
+def greedy_order(
+    graph: EliminationGraph, variables: Set[int], heuristic: str
+) -> List[int]:
+    """!
+    \brief eliminate variables of the graph one by one, choosing at each step
+    the lowest score of the heuristic
+
+    Stale heap entries are skipped when they are popped instead of being
+    removed when a score changes.
+    """
+    current = {i: graph.score(i, heuristic) for i in variables}
+    heap = list(current.values())
+    heapq.heapify(heap)
+    order = []
+    while len(heap) > 0:
+        score = heapq.heappop(heap)
+        i = score[-1]
+        if graph.eliminated[i] or current[i] != score:
+            continue
+        ns = graph.eliminate(i)
+        order.append(i)
+        changed = set(ns)
+        if heuristic != "min-degree":
+            # added edges change the fill of common neighbours of endpoints
+            for a in ns:
+                changed.update(graph.neighbours[a])
+        for a in changed:
+            if a in current and not graph.eliminated[a]:
+                score = graph.score(a, heuristic)
+                if score != current[a]:
+                    current[a] = score
+                    heapq.heappush(heap, score)
+    return order
+
+
+def max_cardinality_order(graph: EliminationGraph, variables: Set[int]) -> List[int]:
+    """!
+    \brief max cardinality search, Koller, Friedman 2009, p. 312
+
+    Variables that are not eliminated are visited first, since they stay
+    until the end of the elimination.
+    """
+    visited = [False for _ in graph.ids]
+    weight = [0 for _ in graph.ids]
+    for i in range(len(graph.ids)):
+        if i not in variables:
+            visited[i] = True
+            for a in graph.neighbours[i]:
+                weight[a] += 1
+    heap = [(-weight[i], i) for i in variables]
+    heapq.heapify(heap)
+    visits = []
+    while len(heap) > 0:
+        w, i = heapq.heappop(heap)
+        if visited[i] or -w != weight[i]:
+            continue
+        visited[i] = True
+        visits.append(i)
+        for a in graph.neighbours[i]:
+            if not visited[a]:
+                weight[a] += 1
+                heapq.heappush(heap, (-weight[a], a))
+    return list(reversed(visits))
+
+
+def evaluate_order(
+    adjacency: Dict[str, Set[str]],
+    order: List[str],
+    cardinalities: Optional[Dict[str, int]] = None,
+) -> EliminationOrder:
+    """!
+    \brief induced width and cost of eliminating variables in the given order
+
+    \param adjacency map from identifiers to identifiers of neighbours, it is
+    not modified
+    \param order identifiers of eliminated variables
+    \param cardinalities map from identifiers to domain sizes
+    """
+    graph = EliminationGraph(adjacency, cardinalities)
+    width = -1
+    cost = 0
+    for n in order:
+        i = graph.index[n]
+        width = max(width, len(graph.neighbours[i]))
+        cost += graph.clique_size(i)
+        graph.eliminate(i)
+    return EliminationOrder(order=list(order), width=width, cost=cost)
+
+
+def elimination_order(
+    adjacency: Dict[str, Set[str]],
+    heuristic: str = "min-fill",
+    variables: Optional[Set[str]] = None,
+    cardinalities: Optional[Dict[str, int]] = None,
+) -> EliminationOrder:
+    """!
+    \brief order variables for elimination with a greedy heuristic
+
+    \code{.py}
+
+    >>> adjacency = {"a": {"b"}, "b": {"a", "c"}, "c": {"b"}}
+    >>> elimination_order(adjacency, "min-degree")
+    >>> EliminationOrder(order=['a', 'b', 'c'], width=1, cost=10)
+
+    \endcode
+
+    \param adjacency map from identifiers to identifiers of neighbours, it is
+    not modified
+    \param heuristic one of HEURISTICS
+    \param variables identifiers of eliminated variables, every node of the
+    graph if it is not provided. Other nodes stay in the graph and count as
+    neighbours.
+    \param cardinalities map from identifiers to domain sizes, used by
+    weighted-min-fill and for the cost
+
+    \throws ValueError if the heuristic is unknown or a variable is not in
+    the graph
+    """
+    if heuristic not in HEURISTICS:
+        msg = "Unknown heuristic " + str(heuristic) + ", must be one of "
+        msg += ", ".join(HEURISTICS)
+        raise ValueError(msg)
+    graph = EliminationGraph(adjacency, cardinalities)
+    if variables is None:
+        variables = set(graph.ids)
+    unknown = set(variables).difference(graph.index)
+    if len(unknown) > 0:
+        msg = "Variables " + ", ".join(sorted(unknown)) + " are not in the graph"
+        raise ValueError(msg)
+    nodes = set([graph.index[n] for n in variables])
+    if heuristic == "max-cardinality":
+        order = max_cardinality_order(graph, nodes)
+    else:
+        order = greedy_order(graph, nodes, heuristic)
+    return evaluate_order(adjacency, [graph.ids[i] for i in order], cardinalities)
+
+
+def triangulate(
+    adjacency: Dict[str, Set[str]], order: List[str]
+) -> Dict[str, Set[str]]:
+    """!
+    \brief add the fill edges of an elimination order to a copy of a graph
+
+    \return adjacency of the triangulated graph
+    """
+    chordal = {n: set(ns) for n, ns in adjacency.items()}
+    graph = EliminationGraph(adjacency)
+    for n in order:
+        i = graph.index[n]
+        ns = [graph.ids[a] for a in graph.eliminate(i)]
+        for a in ns:
+            chordal.setdefault(a, set()).update([b for b in ns if b != a])
+    return chordal
@@ -0,0 +1,342 @@
+"""!
+\file parallel.py
+
+# Parallel Inference
+
+Inference runs in pure Python, so threads do not run queries at the same
+time. This file runs queries in a pool of worker processes instead.
+
+The model is sent to the workers once, when they start, as a snapshot made
+of plain data: identifiers and domains of variables, edges, and the table of
+each factor. Factors defined by functions are tabulated first, since
+functions cannot be sent to other processes. When the multiprocessing
+shared_memory module is available, Python 3.8 and later, the tables are
+written once in a shared memory block that every worker reads, instead of
+being copied to each worker. Each worker rebuilds a model of the same class
+from the snapshot, so that BayesianNetwork workers keep pruning barren and
+d-separated nodes. Its tabular factors are views over the shared block,
+see TabularFactor.view(), which stays open while the worker runs.
+
+Queries and evidence rows are then sent to the workers in chunks. Results
+come back as tables, which are rebuilt into factors over the variables of the
+original model, in the order of the queries.
+"""
+
+from gmodels.gtypes.edge import Edge
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+from gmodels.factor import Factor
+from gmodels.tabularfactor import TabularFactor
+from gmodels.assignmentcodec import strides_of
+
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Set, List, Dict, Tuple, Optional, Any
+from uuid import uuid4
+import inspect
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+
+ModelSnapshot = namedtuple(
+    "ModelSnapshot",
+    ["model_class", "gid", "variables", "edges", "factors", "tables", "memory"],
+)
+ModelSnapshot.__doc__ = """!
+\\brief model made of plain data that can be sent to worker processes
+
+- model_class: class of the model, or its nearest base class that is built
+  from nodes, edges and factors
+- gid: identifier of the model
+- variables: (identifier, values, marginal of each value) of each variable
+- edges: (identifier, start identifier, end identifier, edge type)
+- factors: (identifier, variable identifiers, domains, start, size), where
+  start and size locate the values of the factor in the tables
+- tables: values of every factor, None if they are in shared memory
+- memory: name of the shared memory block that holds the tables, or None
+"""
+
+# model of a worker process and the shared memory block it reads, set by
+# init_worker
+worker_state: Dict[str, Any] = {}
+
+
+def encode_factor(
+    f: Factor,
+) -> Tuple[List[str], List[List[NumericValue]], List[float]]:
+    """!
+    \brief identifiers, domains and values of a factor in row major order
+    """
+    t = TabularFactor.from_factor(f)
+    return list(t.var_ids), [list(d) for d in t.domains], t.table_values()
+
+
+def model_class_of(model) -> type:
+    """!
+    \brief class of a model, or its nearest base class whose constructor
+    takes nodes, edges and factors, like ConditionalRandomField whose nodes
+    are split in observed and target variables
+    """
+    for cls in type(model).__mro__:
+        parameters = inspect.signature(cls.__init__).parameters
+        if all([p in parameters for p in ["gid", "nodes", "edges", "factors"]]):
+            return cls
+    return type(model)
+
+
+def init_worker(snapshot: ModelSnapshot):
+    """!
+    \brief rebuild the model of a snapshot in a worker process
+
+    Factors are views over the tables of the snapshot, tables in shared
+    memory are not copied.
+    """
+    if snapshot.memory is not None:
+        block = shared_memory.SharedMemory(name=snapshot.memory)
+        worker_state["memory"] = block
+        tables = block.buf.cast("d")
+    else:
+        tables = snapshot.tables
+    variables = {}
+    for vid, values, marginals in snapshot.variables:
+        dist = dict(zip(values, marginals))
+        variables[vid] = NumCatRVariable(
+            node_id=vid,
+            input_data={"outcome-values": list(values)},
+            distribution=lambda x, d=dist: d.get(x, 0.0),
+        )
+    edges = set(
+        [
+            Edge(
+                edge_id=eid,
+                start_node=variables[s],
+                end_node=variables[e],
+                edge_type=etype,
+            )
+            for eid, s, e, etype in snapshot.edges
+        ]
+    )
+    factors = set(
+        [
+            TabularFactor(
+                gid=fid,
+                scope_vars=[variables[v] for v in vids],
+                domains=domains,
+                values=tables,
+                offset=start,
+                table_strides=strides_of([len(d) for d in domains]),
+            )
+            for fid, vids, domains, start, size in snapshot.factors
+        ]
+    )
+    worker_state["model"] = snapshot.model_class(
+        gid=snapshot.gid, nodes=set(variables.values()), edges=edges, factors=factors
+    )
+
+
+def run_queries(tasks: List[Tuple[List[str], List[Tuple[str, NumericValue]]]]):
+    """!
+    \brief answer a chunk of (query identifiers, evidence pairs) in a worker
+    """
+    model = worker_state["model"]
+    results = []
+    for qids, evidences in tasks:
+        phi, _ = model.cond_prod_by_variable_elimination(
+            set([model.V[q] for q in qids]), set(evidences)
+        )
+        results.append(encode_factor(phi))
+    return results
+
+
+def run_batch(qids: List[str], eids: List[str], rows: List[List[NumericValue]]):
+    """!
+    \brief answer a chunk of evidence rows for the same query in a worker
+    """
+    model = worker_state["model"]
+    phis = model.cond_prod_batch(set([model.V[q] for q in qids]), eids, rows)
+    return [encode_factor(phi) for phi in phis]
+
+
+class ParallelInference:
+    """!
+    \brief run variable elimination queries of a model in worker processes
+
+    \code{.py}
+
+    >>> with ParallelInference(model, max_workers=4) as pi:
+    >>>     phis = pi.cond_prod_batch(set([c]), [a], rows)
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        model,
+        max_workers: Optional[int] = None,
+        chunksize: int = 64,
+        use_shared_memory: bool = True,
+    ):
+        """!
+        \param model a PGModel, it is read once and is not modified
+        \param max_workers number of worker processes, the number of
+        processors if it is not provided
+        \param chunksize number of queries or evidence rows sent to a worker
+        at once. Larger chunks send fewer messages between processes, smaller
+        chunks balance work better between workers.
+        \param use_shared_memory place factor tables in shared memory if it is
+        available
+
+        \throws ValueError if chunksize is not positive
+        """
+        if chunksize < 1:
+            raise ValueError("chunksize must be positive")
+        self.model = model
+        self.chunksize = chunksize
+        self.memory = None
+        self.snapshot = self.make_snapshot(use_shared_memory)
+        self.executor: Optional[ProcessPoolExecutor] = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=init_worker, initargs=(self.snapshot,)
+        )
+        self.futures: List[Future] = []
+
+    def make_snapshot(self, use_shared_memory: bool) -> ModelSnapshot:
+        """!
+        \brief plain data copy of the model
+        """
+        variables = []
+        for v in sorted(self.model.nodes(), key=lambda n: n.id()):
+            values = list(v.values())
+            variables.append((v.id(), values, [v.marginal(x) for x in values]))
+        edges = [
+            (e.id(), e.start().id(), e.end().id(), e.type()) for e in self.model.edges()
+        ]
+        factors = []
+        tables = array("d")
+        for f in sorted(self.model.factors(), key=lambda f: f.id()):
+            vids, domains, values = encode_factor(f)
+            factors.append((f.id(), vids, domains, len(tables), len(values)))
+            tables.extend(values)
+        memory = None
+        if use_shared_memory and shared_memory is not None and len(tables) > 0:
+            self.memory = shared_memory.SharedMemory(create=True, size=8 * len(tables))
+            self.memory.buf[: 8 * len(tables)] = tables.tobytes()
+            memory = self.memory.name
+            tables = None
+        return ModelSnapshot(
+            model_class=model_class_of(self.model),
+            gid=self.model.id(),
+            variables=variables,
+            edges=edges,
+            factors=factors,
+            tables=tables,
+            memory=memory,
+        )
+
+    def decode_factor(
+        self, encoded: Tuple[List[str], List[List[NumericValue]], List[float]]
+    ) -> TabularFactor:
+        """!
+        \brief factor over the variables of the model from a worker result
+        """
+        vids, domains, values = encoded
+        return TabularFactor(
+            gid=str(uuid4()),
+            scope_vars=[self.model.V[v] for v in vids],
+            domains=domains,
+            values=values,
+        )
+
+    def gather(self, fn, chunks: List[Tuple]) -> List[TabularFactor]:
+        """!
+        \brief submit one task per chunk and collect results in chunk order
+
+        If a task fails or the inference is cancelled, the tasks that did not
+        start are cancelled.
+
+        \throws ValueError if the executor is closed
+        """
+        if self.executor is None:
+            raise ValueError("Parallel inference is closed")
+        futures = [self.executor.submit(fn, *chunk) for chunk in chunks]
+        self.futures = futures
+        results = []
+        try:
+            for future in futures:
+                results.extend([self.decode_factor(r) for r in future.result()])
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            self.futures = []
+        return results
+
+    def cond_prod_many(
+        self, tasks: List[Tuple[Set[NumCatRVariable], Set[Tuple[str, NumericValue]]]]
+    ) -> List[TabularFactor]:
+        """!
+        \brief answer many (queries, evidences) pairs in parallel
+
+        \return for each pair, the factor returned by
+        PGModel.cond_prod_by_variable_elimination(queries, evidences)
+        """
+        encoded = [
+            (sorted([q.id() for q in queries]), sorted(evidences, key=str))
+            for queries, evidences in tasks
+        ]
+        chunks = [
+            (encoded[i : i + self.chunksize],)
+            for i in range(0, len(encoded), self.chunksize)
+        ]
+        return self.gather(run_queries, chunks)
+
+    def cond_prod_batch(
+        self,
+        queries: Set[NumCatRVariable],
+        evidence_vars: List[NumCatRVariable],
+        rows: List[List[NumericValue]],
+    ) -> List[TabularFactor]:
+        """!
+        \brief PGModel.cond_prod_batch(queries, evidence_vars, rows) with rows
+        split in chunks between workers
+        """
+        qids = sorted([q.id() for q in queries])
+        eids = [v.id() if isinstance(v, NumCatRVariable) else v for v in evidence_vars]
+        chunks = [
+            (qids, eids, [list(r) for r in rows[i : i + self.chunksize]])
+            for i in range(0, len(rows), self.chunksize)
+        ]
+        return self.gather(run_batch, chunks)
+
+    def cancel(self):
+        """!
+        \brief cancel tasks that did not start and close the workers
+
+        Running tasks finish, their results are dropped.
+        """
+        for future in self.futures:
+            future.cancel()
+        self.close(wait=False)
+
+    def close(self, wait: bool = True):
+        """!
+        \brief stop the workers and release the shared memory block
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def __enter__(self):
+        ""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        ""
+        self.close()
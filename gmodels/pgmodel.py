@@ -14,12 +14,27 @@ from gmodels.gtypes.edge import Edge
 from gmodels.gtypes.node import Node
 from gmodels.randomvariable import NumCatRVariable, NumericValue
 from gmodels.factor import Factor
+from gmodels.tabularfactor import TabularFactor
+from gmodels.assignmentcodec import AssignmentCodec, EncodedAssignment
+from gmodels.contraction import ContractionPlanner
+from gmodels.junctiontree import JunctionTree
+from gmodels.inferencesession import InferenceSession
+from gmodels.elimination import EliminationPlan, compile_elimination, factor_signature
+from gmodels.ordering import EliminationOrder, elimination_order
+from gmodels.querycache import QueryCache, CacheInfo
+from gmodels.parallel import ParallelInference
+from gmodels.beliefpropagation import LoopyBeliefPropagation
+from gmodels.gibbs import GibbsSampler
+from gmodels.meanfield import MeanField
 from gmodels.gtypes.graph import Graph
 from typing import Callable, Set, List, Optional, Dict, Tuple
 import math
 from uuid import uuid4
 
 
+QUERY_ENGINES = ("variable-elimination", "mean-field")
+
+
 def min_unmarked_neighbours(g: Graph, nodes: Set[Node], marked: Dict[str, Node]):
     """!
     \brief find an unmarked node with minimum number of neighbours
@@ -70,6 +85,12 @@ class PGModel(Graph):
             self.Fs = fs
         else:
             self.Fs = factors
+        self.elimination_plans: Dict[
+            Tuple[frozenset, frozenset], EliminationPlan
+        ] = {}
+        self.query_cache = QueryCache()
+        self.query_engine = "variable-elimination"
+        self.engine_options: Dict[str, object] = {}
 
     def markov_blanket(self, t: NumCatRVariable) -> Set[NumCatRVariable]:
         """!
@@ -86,6 +107,201 @@ class PGModel(Graph):
         """
         return set([f(ff) for ff in self.Fs])
 
+    def set_factor_representation(self, factor_type=TabularFactor):
+        """!
+        \brief convert factors of the model to the given factor type
+
+        Inference procedures only rely on the operations of factors, so the
+        same model can run on closures (Factor), tables (TabularFactor) or
+        tables in log space (LogTabularFactor) without being rebuilt.
+
+        \param factor_type a factor class providing from_factor(f)
+        """
+        self.Fs = set([factor_type.from_factor(f) for f in self.Fs])
+
+    def assignment_codec(
+        self, variables: Optional[List[NumCatRVariable]] = None
+    ) -> AssignmentCodec:
+        """!
+        \brief codec that encodes assignments to model variables as integers
+
+        Encoded assignments, see AssignmentCodec.assignment(index), can be
+        given as evidence to inference procedures.
+
+        \param variables variables in axis order. If it is not provided, every
+        variable of the model is used in the order of their identifiers.
+        """
+        if variables is None:
+            variables = sorted(self.nodes(), key=lambda n: n.id())
+        return AssignmentCodec.from_vars(variables)
+
+    def set_query_cache(
+        self, maxsize: Optional[int] = 128, maxcost: Optional[int] = None
+    ):
+        """!
+        \brief replace the query cache of the model by an empty cache with the
+        given bounds
+
+        \see QueryCache
+        """
+        self.query_cache = QueryCache(maxsize=maxsize, maxcost=maxcost)
+
+    def set_query_engine(self, engine: str, **options):
+        """!
+        \brief inference procedure used by PGModel.cond_prod()
+
+        \param engine one of QUERY_ENGINES
+        \param options keyword arguments of the engine:
+        cond_prod_by_variable_elimination() for "variable-elimination" and
+        MeanField for "mean-field"
+
+        \throws ValueError if the engine is unknown
+        """
+        if engine not in QUERY_ENGINES:
+            msg = "Unknown query engine " + str(engine) + ", must be one of "
+            msg += ", ".join(QUERY_ENGINES)
+            raise ValueError(msg)
+        self.query_engine = engine
+        self.engine_options = dict(options)
+
+    def cache_info(self) -> CacheInfo:
+        """!
+        \brief hit and miss counters of the query cache
+        """
+        return self.query_cache.cache_info()
+
+    def model_signature(self) -> Tuple[frozenset, frozenset, frozenset]:
+        """!
+        \brief serial number and version of the factors, nodes and edges of the
+        model
+
+        The signature changes when a factor is replaced, for example by
+        PGModel.set_factor_representation(), when a factor is updated in
+        place, for example by TabularFactor.multiply_in(), see
+        Factor.version(), or when nodes or edges are added or removed.
+        """
+        return (
+            frozenset([(f.serial, f.version()) for f in self.Fs]),
+            frozenset(self.V.keys()),
+            frozenset(self.E.keys()),
+        )
+
+    def cached_query(
+        self,
+        operation: str,
+        queries: Set[NumCatRVariable],
+        evidences: Set[Tuple[str, NumericValue]],
+        compute: Callable[[], object],
+    ):
+        """!
+        \brief result of a query from the query cache, computed and cached if
+        it is not there
+
+        \param operation name of the inference procedure, part of the key
+        \param compute function that computes the result on a cache miss
+
+        The cached result itself is returned, so the factors of a result are
+        shared by every call with the same key and must not be updated in
+        place.
+        """
+        if isinstance(evidences, EncodedAssignment):
+            evidences = evidences.to_set()
+        self.query_cache.validate(self.model_signature())
+        key = QueryCache.query_key(operation, queries, evidences)
+        found, result = self.query_cache.get(key)
+        if found:
+            return result
+        result = compute()
+        self.query_cache.put(key, result)
+        return result
+
+    def junction_tree(self, factor_type=TabularFactor) -> JunctionTree:
+        """!
+        \brief clique tree of the model for answering many marginal queries
+        with one calibration per evidence set
+
+        \see JunctionTree
+        """
+        return JunctionTree(self, factor_type=factor_type)
+
+    def inference_session(self, factor_type=TabularFactor) -> InferenceSession:
+        """!
+        \brief session that keeps messages between queries and only
+        recomputes those invalidated by evidence changes
+
+        \see InferenceSession
+        """
+        return InferenceSession(self, factor_type=factor_type)
+
+    def parallel_inference(
+        self, max_workers: Optional[int] = None, chunksize: int = 64
+    ) -> ParallelInference:
+        """!
+        \brief pool of worker processes that answer variable elimination
+        queries of a snapshot of the model
+
+        \see ParallelInference
+        """
+        return ParallelInference(self, max_workers=max_workers, chunksize=chunksize)
+
+    def loopy_belief_propagation(
+        self,
+        damping: float = 0.0,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100,
+        schedule: str = "synchronous",
+    ) -> LoopyBeliefPropagation:
+        """!
+        \brief approximate inference by message passing on the factor graph
+        of the model, for models whose treewidth is too large for exact
+        inference
+
+        \see LoopyBeliefPropagation
+        """
+        return LoopyBeliefPropagation(
+            self,
+            damping=damping,
+            tolerance=tolerance,
+            max_iterations=max_iterations,
+            schedule=schedule,
+        )
+
+    def gibbs_sampler(
+        self,
+        evidences: Optional[Set[Tuple[str, NumericValue]]] = None,
+        burn_in: int = 100,
+        thinning: int = 1,
+        seed: Optional[int] = None,
+    ) -> GibbsSampler:
+        """!
+        \brief approximate inference by block Gibbs sampling with independent
+        chains, for models whose treewidth is too large for exact inference
+
+        \see GibbsSampler
+        """
+        return GibbsSampler(
+            self, evidences=evidences, burn_in=burn_in, thinning=thinning, seed=seed
+        )
+
+    def mean_field(
+        self,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100,
+        time_limit: Optional[float] = None,
+    ) -> MeanField:
+        """!
+        \brief deterministic approximate inference with independent
+        marginals, for large models where sampling is too slow
+
+        \see MeanField
+        """
+        return MeanField(
+            self,
+            tolerance=tolerance,
+            max_iterations=max_iterations,
+            time_limit=time_limit,
+        )
+
     def closure_of(self, t: NumCatRVariable) -> Set[NumCatRVariable]:
         """!
         get closure of node 
@@ -120,24 +336,40 @@ class PGModel(Graph):
         """
         return set([f for f in self.factors() if self.is_scope_subset_of(f, X) is True])
 
-    def get_factor_product(self, fs: Set[Factor]):
+    def contraction_planner(
+        self,
+        fs: Set[Factor],
+        marginalize: Optional[Set[NumCatRVariable]] = None,
+        mode: str = "auto",
+    ) -> ContractionPlanner:
+        """!
+        Planner for the product of given factors where the variables in
+        marginalize are summed out. Its plan reports the estimated flops and
+        peak table size before the factors are evaluated.
+
+        \see ContractionPlanner
+        """
+        return ContractionPlanner(factors=list(fs), marginalize=marginalize, mode=mode)
+
+    def get_factor_product(self, fs: Set[Factor], mode: str = "auto"):
         """!
         Multiply a set of factors.
         \f \prod_{i} \phi_i \f
+
+        Each product uses the arithmetic of the factor representation, so that
+        log space factors are added instead of multiplied. The order of the
+        pairwise products is chosen by a ContractionPlanner so that
+        intermediate tables stay small.
+
+        \param mode planning mode of ContractionPlanner
         """
         factors = list(fs)
         if len(factors) == 0:
             raise ValueError("Must have a non empty list of factors")
         if len(factors) == 1:
             return factors[0], None
-        prod = factors.pop(0)
-        for i in range(0, len(factors)):
-            prod, val = prod.product(
-                factors[i],
-                product_fn=lambda x, y: x * y,
-                accumulator=lambda x, y: x * y,
-            )
-        return prod, val
+        planner = self.contraction_planner(factors, mode=mode)
+        return planner.execute(planner.plan())
 
     def get_factor_product_var(
         self, fs: Set[Factor], Z: NumCatRVariable
@@ -231,38 +463,89 @@ class PGModel(Graph):
     ) -> Dict[str, int]:
         """!
         From Koller and Friedman 2009, p. 314
+
+        Fill edges are added to a copy of the graph, the model graph is not
+        modified. PGModel.elimination_order(nodes, heuristic) computes the
+        same kind of ordering without copying the graph.
         """
+        g = Graph(
+            gid=str(uuid4()), data=self.data(), nodes=self.nodes(), edges=self.edges()
+        )
         marked = {n.id(): False for n in nodes}
         cardinality = {n.id(): -1 for n in nodes}
         for i in range(len(nodes)):
-            X = s(g=self, nodes=nodes, marked=marked)
+            X = s(g=g, nodes=nodes, marked=marked)
             if X is not None:
                 cardinality[X.id()] = i
-                TEMP = self.neighbours_of(X)
+                TEMP = g.neighbours_of(X)
                 while TEMP:
                     n_x = TEMP.pop()
-                    for n in self.neighbours_of(X):
-                        self.added_edge_between_if_none(n_x, n)
+                    for n in g.neighbours_of(X):
+                        g.added_edge_between_if_none(n_x, n)
                 marked[X.id()] = True
         return cardinality
 
+    def interaction_graph(self) -> Dict[str, Set[str]]:
+        """!
+        \brief adjacency of the undirected graph that connects variables
+        appearing together in a factor, Koller, Friedman 2009, p. 306
+        """
+        adjacency: Dict[str, Set[str]] = {n.id(): set() for n in self.nodes()}
+        for f in self.factors():
+            for a in f.var_of:
+                adjacency.setdefault(a, set()).update([b for b in f.var_of if b != a])
+        return adjacency
+
+    def elimination_order(
+        self,
+        nodes: Optional[Set[NumCatRVariable]] = None,
+        heuristic: str = "min-fill",
+    ) -> EliminationOrder:
+        """!
+        \brief elimination ordering of variables computed on the interaction
+        graph of the factors, without modifying the model
+
+        The ordering reports its induced width and the total size of its
+        elimination cliques, which estimate the cost of a query before it is
+        run.
+
+        \param nodes eliminated variables, every variable if it is not
+        provided
+        \param heuristic one of ordering.HEURISTICS
+
+        \see elimination_order(adjacency, heuristic, variables, cardinalities)
+        """
+        if nodes is None:
+            nodes = self.nodes()
+        cardinalities = {n.id(): len(n.values()) for n in self.nodes()}
+        return elimination_order(
+            self.interaction_graph(),
+            heuristic=heuristic,
+            variables=set([n.id() for n in nodes]),
+            cardinalities=cardinalities,
+        )
+
     def reduce_queries_with_evidence(
         self, queries: Set[NumCatRVariable], evidences: Set[Tuple[str, NumericValue]],
     ) -> Set[NumCatRVariable]:
-        ""
-        reduced_queries = set()
-        evs = {e[0]: e[1] for e in evidences}
-        for q in queries:
-            if q.id() in evs:
-                ev = evs[q.id()]
-                q.reduce_to_value(ev)
-            reduced_queries.add(q)
-        return reduced_queries
+        """!
+        \brief queries of an inference with evidence
+
+        Evidence is applied by reducing factors, see
+        PGModel.reduce_factors_with_evidence(evidences), so query variables
+        are left untouched and the model can be queried again with another
+        evidence set.
+        """
+        return set(queries)
 
     def reduce_factors_with_evidence(self, evidences: Set[Tuple[str, NumericValue]]):
         """!
         reduce factors if there is evidence
+
+        \param evidences set of (id, value) pairs or an EncodedAssignment
         """
+        if isinstance(evidences, EncodedAssignment):
+            evidences = evidences.to_set()
         if len(evidences) == 0:
             return self.factors(), set()
         if any(e[0] not in self.V for e in evidences):
@@ -272,28 +555,296 @@ class PGModel(Graph):
         factors = set([f.reduced_by_value(context=evidences) for f in fs])
         return factors, E
 
+    def plan_factors(self) -> List[Factor]:
+        """!
+        \brief factors of the model in the order used by elimination plans
+        """
+        return sorted(self.Fs, key=lambda f: (f.id(), sorted(f.var_of)))
+
+    def relevant_factors(
+        self, factors: List[Factor], queries: Set[str], evidence: Set[str]
+    ) -> Optional[Set[int]]:
+        """!
+        \brief indices of the factors needed by a query with the given
+        observed variables, None when every factor is needed
+
+        Models whose independence structure lets some factors be left out of
+        a query override this method, see BayesianNetwork.relevant_factors().
+
+        \param factors factors in the order of PGModel.plan_factors()
+        \param queries identifiers of query variables
+        \param evidence identifiers of observed variables
+        """
+        return None
+
+    def compile_query(
+        self, queries: Set[NumCatRVariable], evidence_ids: Set[str]
+    ) -> EliminationPlan:
+        """!
+        \brief elimination plan for queries with the given observed variables
+
+        Plans only depend on the identifiers of query and observed variables,
+        so they are cached on the model and reused for any evidence values. A
+        cached plan is compiled again if the factor scopes have changed.
+        Factors that are not relevant to the query, see
+        PGModel.relevant_factors(), are left out of the plan.
+
+        \see compile_elimination(factors, variables, queries, evidence)
+        """
+        qids = frozenset([q.id() for q in queries])
+        key = (qids, frozenset(evidence_ids))
+        factors = self.plan_factors()
+        plan = self.elimination_plans.get(key)
+        if plan is None or plan.signature != factor_signature(factors):
+            plan = compile_elimination(
+                factors=factors,
+                variables=set(self.V.keys()),
+                queries=qids,
+                evidence=key[1],
+                relevant=self.relevant_factors(factors, qids, key[1]),
+            )
+            self.elimination_plans[key] = plan
+        return plan
+
+    def reduce_plan_factor(
+        self,
+        plan: EliminationPlan,
+        f: Factor,
+        evidences: Set[Tuple[str, NumericValue]],
+    ) -> Factor:
+        """!
+        \brief reduce a factor by the evidence before it enters a plan
+
+        Observed variables that are not queried have a single value once the
+        factor is reduced, so they are summed out of the factor unless nothing
+        would be left.
+        """
+        if any(vid in f.var_of for vid, _ in evidences):
+            f = f.reduced_by_value(evidences)
+        observed = [v for v in f.scope_vars() if v.id() in plan.evidence]
+        if 0 < len(observed) < len(f.var_of):
+            for v in observed:
+                f = f.sumout_var(v)
+        return f
+
+    def run_plan_steps(
+        self,
+        plan: EliminationPlan,
+        factors: List[Factor],
+        steps: List[int],
+        pending: Dict[int, List[Factor]],
+        final: List[Factor],
+    ):
+        """!
+        \brief run the given steps of a plan
+
+        The factor sent by each step is appended to the pending factors of
+        its target step, or to the final factors.
+
+        \param factors reduced factors in the order of the plan indices
+        """
+        for k in steps:
+            fs = [factors[i] for i in plan.buckets[k]] + pending.get(k, [])
+            if len(fs) == 0:
+                continue
+            prod, _ = self.get_factor_product(fs)
+            if len(plan.scopes[k]) == 0:
+                final.append(prod)
+                continue
+            message = prod.sumout_var(self.V[plan.order[k]])
+            if plan.targets[k] is None:
+                final.append(message)
+            else:
+                pending.setdefault(plan.targets[k], []).append(message)
+
+    def plan_result(self, plan: EliminationPlan, final: List[Factor]) -> Factor:
+        """!
+        \brief product of the final factors of a plan with non query
+        variables summed out
+        """
+        phi, _ = self.get_factor_product(final)
+        for v in list(phi.scope_vars()):
+            if v.id() not in plan.queries:
+                phi = phi.sumout_var(v)
+        return phi
+
+    def run_elimination_plan(
+        self, plan: EliminationPlan, evidences: Set[Tuple[str, NumericValue]]
+    ) -> Factor:
+        """!
+        \brief sum product variable elimination following a compiled plan
+
+        \param plan plan compiled for the observed variables of evidences
+        \param evidences set of (id, value) pairs
+
+        \return product of the factors with non query variables summed out
+        """
+        factors = [
+            self.reduce_plan_factor(plan, f, evidences) for f in self.plan_factors()
+        ]
+        final = [factors[i] for i in plan.final]
+        self.run_plan_steps(plan, factors, list(range(len(plan.order))), {}, final)
+        return self.plan_result(plan, final)
+
     def cond_prod_by_variable_elimination(
         self,
         queries: Set[NumCatRVariable],
         evidences: Set[Tuple[str, NumericValue]],
-        ordering_fn=min_unmarked_neighbours,
+        ordering_fn=None,
     ):
         """!
         Compute conditional probabilities with variable elimination
         from Koller and Friedman 2009, p. 304
+
+        \param ordering_fn if it is None, the elimination follows a plan
+        compiled for the shape of the query, see PGModel.compile_query(), and
+        the model graph is not modified. Results are cached, see
+        PGModel.cached_query(). Otherwise the ordering is computed for this
+        call with PGModel.order_by_greedy_metric(nodes, s).
         """
         if queries.issubset(self.nodes()) is False:
             raise ValueError("Query variables must be a subset of vertices of graph")
+        if ordering_fn is None:
+            if isinstance(evidences, EncodedAssignment):
+                evidences = evidences.to_set()
+            if any(e[0] not in self.V for e in evidences):
+                raise ValueError(
+                    "evidence set contains variables out of vertices of graph"
+                )
+
+            def compute():
+                ""
+                plan = self.compile_query(queries, set([e[0] for e in evidences]))
+                phi = self.run_elimination_plan(plan, evidences)
+                return phi, phi.sumout_vars(set(queries))
+
+            return self.cached_query("cond_prod", queries, evidences, compute)
         queries = self.reduce_queries_with_evidence(queries, evidences)
         factors, E = self.reduce_factors_with_evidence(evidences)
+        # reduced factors keep evidence variables with a single value, summing
+        # them out removes them from the scope
         Zs = set()
         for z in self.nodes():
-            if z not in E and z not in queries:
+            if z not in queries:
                 Zs.add(z)
         return self.conditional_prod_by_variable_elimination(
             queries=queries, Zs=Zs, factors=factors, ordering_fn=ordering_fn
         )
 
+    def cond_prod(
+        self,
+        queries: Set[NumCatRVariable],
+        evidences: Set[Tuple[str, NumericValue]],
+    ):
+        """!
+        \brief distribution of query variables given evidence computed by the
+        engine set with PGModel.set_query_engine()
+
+        \code{.py}
+
+        >>> pgm.set_query_engine("mean-field", tolerance=1e-8)
+        >>> phi, _ = pgm.cond_prod(set([c]), set([("a", True)]))
+        >>> phi.phi_normal(set([("c", True)]))
+
+        \endcode
+
+        \return the result of cond_prod_by_variable_elimination(), or the
+        normalized result of MeanField.cond_prod()
+        """
+        if self.query_engine == "variable-elimination":
+            return self.cond_prod_by_variable_elimination(
+                queries, evidences, **self.engine_options
+            )
+        if len(queries) == 0 or queries.issubset(self.nodes()) is False:
+            raise ValueError("Query variables must be a subset of vertices of graph")
+        if isinstance(evidences, EncodedAssignment):
+            evidences = evidences.to_set()
+
+        def compute():
+            ""
+            return self.mean_field(**self.engine_options).cond_prod(queries, evidences)
+
+        operation = "mean_field" + str(sorted(self.engine_options.items()))
+        return self.cached_query(operation, queries, evidences, compute)
+
+    def cond_prod_batch(
+        self,
+        queries: Set[NumCatRVariable],
+        evidence_vars: List[NumCatRVariable],
+        rows: List[List[NumericValue]],
+    ) -> List[Factor]:
+        """!
+        \brief variable elimination for many evidence rows over the same
+        observed variables
+
+        \code{.py}
+
+        >>> phis = pgm.cond_prod_batch(set([c]), [a], [[True], [False], [True]])
+        >>> [round(p.phi_normal(set([("c", True)])), 2) for p in phis]
+        >>> [0.32, 0.46, 0.32]
+
+        \endcode
+
+        A single plan is compiled for the query. Buckets that do not depend
+        on evidence values, directly or through the factors they receive, are
+        eliminated once for the whole batch, and only the remaining buckets
+        run for each row. Identical rows share their result.
+
+        \param queries query variables
+        \param evidence_vars observed variables, in the order of row columns
+        \param rows values of the observed variables, one list per row
+
+        \return for each row, the factor returned by
+        PGModel.cond_prod_by_variable_elimination(queries, evidences)
+
+        \throws ValueError if a variable is not in the model, or if a row has
+        the wrong length or a value out of the domain of its variable
+        """
+        if queries.issubset(self.nodes()) is False:
+            raise ValueError("Query variables must be a subset of vertices of graph")
+        eids = [v.id() if isinstance(v, NumCatRVariable) else v for v in evidence_vars]
+        if any(e not in self.V for e in eids):
+            raise ValueError("evidence variables must be vertices of graph")
+        domains = [set(self.V[e].values()) for e in eids]
+        for row in rows:
+            if len(row) != len(eids):
+                raise ValueError(
+                    "Row " + str(row) + " must have " + str(len(eids)) + " values"
+                )
+            for e, value, domain in zip(eids, row, domains):
+                if value not in domain:
+                    msg = "Value " + str(value) + " is not in domain of " + e
+                    raise ValueError(msg)
+        plan = self.compile_query(queries, set(eids))
+        factors = self.plan_factors()
+        touched = set(
+            [i for i, f in enumerate(factors) if any(e in f.var_of for e in eids)]
+        )
+        dependent = [any(i in touched for i in b) for b in plan.buckets]
+        for k, target in enumerate(plan.targets):
+            if dependent[k] and target is not None:
+                dependent[target] = True
+        shared_pending: Dict[int, List[Factor]] = {}
+        shared_final = [factors[i] for i in plan.final if i not in touched]
+        steps = [k for k in range(len(plan.order)) if not dependent[k]]
+        self.run_plan_steps(plan, factors, steps, shared_pending, shared_final)
+        steps = [k for k in range(len(plan.order)) if dependent[k]]
+        results: Dict[Tuple[NumericValue, ...], Factor] = {}
+        batch = []
+        for row in rows:
+            key = tuple(row)
+            if key not in results:
+                evidences = set(zip(eids, row))
+                reduced = list(factors)
+                for i in touched:
+                    reduced[i] = self.reduce_plan_factor(plan, factors[i], evidences)
+                pending = {k: list(fs) for k, fs in shared_pending.items()}
+                final = shared_final + [reduced[i] for i in plan.final if i in touched]
+                self.run_plan_steps(plan, reduced, steps, pending, final)
+                results[key] = self.plan_result(plan, final)
+            batch.append(results[key])
+        return batch
+
     def conditional_prod_by_variable_elimination(
         self,
         queries: Set[NumCatRVariable],
@@ -339,30 +890,38 @@ class PGModel(Graph):
     def max_product_ve(self, evidences: Set[Tuple[str, NumericValue]]):
         """!
         Compute most probable assignments given evidences
+
+        Results are cached, see PGModel.cached_query(). The assignments are a
+        copy of the cached ones and can be modified.
         """
-        factors, E = self.reduce_factors_with_evidence(evidences)
-        Zs = set()
-        for z in self.nodes():
-            if z not in E:
-                Zs.add(z)
-        cardinality = self.order_by_greedy_metric(nodes=Zs, s=min_unmarked_neighbours)
-        ordering = [
-            self.V[n[0]] for n in sorted(list(cardinality.items()), key=lambda x: x[1])
-        ]
-        assignments, factors, z_phi = self.max_product_eliminate_vars(
-            factors=factors, Zs=ordering
+
+        def compute():
+            ""
+            factors, E = self.reduce_factors_with_evidence(evidences)
+            # evidence variables have a single value in reduced factors, so
+            # maxing them out places their observed value in the assignments
+            ordering = [self.V[n] for n in self.elimination_order().order]
+            return self.max_product_eliminate_vars(factors=factors, Zs=ordering)
+
+        assignments, factors, z_phi = self.cached_query(
+            "max_product", set(), evidences, compute
         )
-        return assignments, factors, z_phi
+        return dict(assignments), factors, z_phi
 
     def mpe_prob(self, evidences: Set[Tuple[str, NumericValue]]) -> float:
         """!
         obtain the probability of the most probable instantiation of
         the model
+
+        Once every variable is maxed out, the remaining factors only involve
+        evidence variables, and their product holds the maximum value, see
+        Koller, Friedman 2009, p. 557.
         """
         assignments, factors, z_phi = self.max_product_ve(evidences=evidences)
+        prod, v = self.get_factor_product(factors)
         probs = set()
-        for f in z_phi.factor_domain():
-            probs.add(z_phi.phi(f))
+        for f in prod.factor_domain():
+            probs.add(prod.phi(set(f)))
         return max(probs)
 
     def traceback_map(
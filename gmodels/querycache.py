@@ -0,0 +1,187 @@
+"""!
+\file querycache.py
+
+# Query Cache
+
+Applications often ask a model the same query with the same evidence many
+times. This file contains a bounded cache for the results of such queries.
+Results are keyed by a canonical form of the query: the operation, the
+sorted identifiers of query variables and the sorted evidence pairs, so that
+the order in which sets are iterated does not matter.
+
+The cache evicts its least recently used results when it holds more than
+maxsize results, or when the total size of cached factor tables is above
+maxcost. Each cache stores the signature of the model it was filled from. A
+cache checked against another signature is emptied, so results are never
+served after the factors or the graph of the model have changed.
+"""
+
+from gmodels.factor import Factor
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+
+from collections import OrderedDict, namedtuple
+from typing import Set, Tuple, Optional, Any, Callable, Hashable
+
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "currsize", "maxcost", "currcost"]
+)
+CacheInfo.__doc__ = """!
+\\brief statistics of a QueryCache, in the spirit of functools.lru_cache
+
+- hits, misses: number of lookups that found or did not find a result
+- maxsize, currsize: bound and current number of cached results
+- maxcost, currcost: bound and current total cost of cached results
+"""
+
+
+def result_cost(value: Any) -> int:
+    """!
+    \brief number of table entries of the factors held by a query result
+
+    Factors are searched in tuples, lists, sets and dict values. A result
+    without factors costs 1.
+    """
+    stack = [value]
+    cost = 0
+    while len(stack) > 0:
+        v = stack.pop()
+        if isinstance(v, Factor):
+            size = 1
+            for sv in v.scope_vars():
+                size *= len(v.domain_of(sv))
+            cost += size
+        elif isinstance(v, dict):
+            stack.extend(v.values())
+        elif isinstance(v, (tuple, list, set, frozenset)):
+            stack.extend(v)
+    return max(cost, 1)
+
+
+class QueryCache:
+    """!
+    \brief bounded least recently used cache of query results
+
+    \code{.py}
+
+    >>> cache = QueryCache(maxsize=2)
+    >>> key = QueryCache.query_key("marginal", set([c]), set([("a", True)]))
+    >>> cache.put(key, result)
+    >>> cache.get(key)
+    >>> (True, result)
+    >>> cache.cache_info()
+    >>> CacheInfo(hits=1, misses=0, maxsize=2, currsize=1, maxcost=None, currcost=4)
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = 128,
+        maxcost: Optional[int] = None,
+        cost_fn: Callable[[Any], int] = result_cost,
+    ):
+        """!
+        \param maxsize maximum number of cached results, None for no bound and
+        0 to disable the cache
+        \param maxcost maximum total cost of cached results, None for no bound.
+        A result that costs more than maxcost is not cached.
+        \param cost_fn cost of a result, its number of table entries by default
+
+        \throws ValueError if a bound is negative
+        """
+        if any(b is not None and b < 0 for b in [maxsize, maxcost]):
+            raise ValueError("Cache bounds must be non negative")
+        self.maxsize = maxsize
+        self.maxcost = maxcost
+        self.cost_fn = cost_fn
+        self.entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.cost = 0
+        self.hits = 0
+        self.misses = 0
+        self.signature: Optional[Hashable] = None
+
+    @staticmethod
+    def query_key(
+        operation: str,
+        queries: Set[NumCatRVariable],
+        evidences: Set[Tuple[str, NumericValue]],
+    ) -> Tuple[str, Tuple[str, ...], Tuple[Tuple[str, NumericValue], ...]]:
+        """!
+        \brief canonical key of a query
+
+        \param operation name of the inference procedure
+        \param queries query variables or their identifiers
+        \param evidences set of (id, value) pairs
+        """
+        qids = sorted(
+            [q.id() if isinstance(q, NumCatRVariable) else q for q in queries]
+        )
+        evs = sorted(evidences, key=lambda e: (e[0], str(e[1])))
+        return (operation, tuple(qids), tuple(evs))
+
+    def validate(self, signature: Hashable):
+        """!
+        \brief empty the cache if it was filled for another model signature
+
+        Counters are kept.
+        """
+        if signature != self.signature:
+            self.entries.clear()
+            self.cost = 0
+            self.signature = signature
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """!
+        \brief look up a result and mark it as the most recently used
+
+        \return (True, result) if it is cached, (False, None) otherwise
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return True, self.entries[key][0]
+
+    def put(self, key: Hashable, value: Any):
+        """!
+        \brief cache a result then evict least recently used results until the
+        cache is within its bounds
+        """
+        if self.maxsize == 0:
+            return
+        cost = self.cost_fn(value)
+        if self.maxcost is not None and cost > self.maxcost:
+            return
+        if key in self.entries:
+            self.cost -= self.entries.pop(key)[1]
+        self.entries[key] = (value, cost)
+        self.cost += cost
+        while (self.maxsize is not None and len(self.entries) > self.maxsize) or (
+            self.maxcost is not None and self.cost > self.maxcost
+        ):
+            _, (_, c) = self.entries.popitem(last=False)
+            self.cost -= c
+
+    def clear(self):
+        """!
+        \brief remove cached results and reset counters
+        """
+        self.entries.clear()
+        self.cost = 0
+        self.hits = 0
+        self.misses = 0
+
+    def cache_info(self) -> CacheInfo:
+        """!
+        \brief hit and miss counters with current sizes
+        """
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            maxsize=self.maxsize,
+            currsize=len(self.entries),
+            maxcost=self.maxcost,
+            currcost=self.cost,
+        )
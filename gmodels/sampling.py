@@ -0,0 +1,563 @@
+"""!
+\file sampling.py
+
+# Sampling from Bayesian Networks
+
+Forward sampling, Koller, Friedman 2009, p. 489, draws joint samples of a
+Bayesian network by sampling each variable from its conditional probability
+distribution given the values already drawn for its parents, in a
+topological order of the network.
+
+Conditional distributions are read once into tables of cumulative
+distributions, one row per assignment of the parents, so that drawing a
+value is a binary search in a row. Samples are drawn column by column: the
+column of a variable is filled for every sample at once from the columns of
+its parents. Columns hold value indices in compact integer arrays, the
+values of a variable are in CPT.domain.
+
+Likelihood weighting, Koller, Friedman 2009, p. 493, clamps observed
+variables to their values and weights each sample by the likelihood of the
+evidence given the sampled parents. It is importance sampling whose
+proposal is the network in which observed variables no longer depend on
+their parents. Other proposals can be given for unobserved variables, as
+conditional tables over the same parents, in which case samples are also
+weighted by the ratio of the network and proposal probabilities, p. 498.
+
+Weighted estimates are streamed: marginals, effective sample size and
+standard errors are updated after every chunk of samples, so that callers
+can stop at a target precision or at a deadline.
+"""
+
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+from gmodels.tabularfactor import TabularFactor
+
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from random import Random
+from typing import Set, List, Dict, Tuple, Optional, Iterator, Union
+import math
+import time
+
+
+CPT = namedtuple(
+    "CPT", ["var_id", "domain", "parents", "strides", "values", "pmfs", "cdfs"]
+)
+CPT.__doc__ = """!
+\\brief conditional probability table of a variable in cumulative form
+
+- var_id: identifier of the variable
+- domain: values of the variable, NumCatRVariable.values()
+- parents: identifiers of the parents
+- strides: stride of each parent in the index of a parent assignment, the
+  row of an assignment is the sum of parent value indices times strides
+- values: for each parent assignment, the entries of the conditional
+  distribution over the domain of the variable, zero for values outside of
+  the domain of the factor, e.g. after it was reduced by evidence
+- pmfs: for each parent assignment, the normalized distribution of the
+  variable, None if the distribution is zero everywhere
+- cdfs: cumulative distributions of pmfs
+"""
+
+
+def typecode_of(size: int) -> str:
+    """!
+    \brief smallest unsigned array type code that holds indices below size
+    """
+    if size <= 256:
+        return "B"
+    if size <= 65536:
+        return "H"
+    return "L"
+
+
+def cumulative(pmf: List[float]) -> List[float]:
+    """!
+    \brief cumulative distribution of a normalized distribution, whose last
+    value is exactly one so that every draw in [0, 1) falls in it
+    """
+    cdf = []
+    acc = 0.0
+    for p in pmf:
+        acc += p
+        cdf.append(acc)
+    cdf[-1] = 1.0
+    return cdf
+
+
+def topological_order(parents: Dict[str, Set[str]]) -> List[str]:
+    """!
+    \brief order nodes so that parents come before their children, ties are
+    broken by identifier
+
+    \throws ValueError if the graph has a directed cycle
+    """
+    children: Dict[str, List[str]] = {n: [] for n in parents}
+    nb_parents = {n: len(ps) for n, ps in parents.items()}
+    for n, ps in parents.items():
+        for p in ps:
+            children[p].append(n)
+    ready = sorted([n for n, k in nb_parents.items() if k == 0], reverse=True)
+    order = []
+    while len(ready) > 0:
+        n = ready.pop()
+        order.append(n)
+        for c in children[n]:
+            nb_parents[c] -= 1
+            if nb_parents[c] == 0:
+                ready.append(c)
+        ready.sort(reverse=True)
+    if len(order) != len(parents):
+        raise ValueError("Graph has a directed cycle")
+    return order
+
+
+def conditional_tables(network) -> Tuple[List[str], Dict[str, CPT]]:
+    """!
+    \brief topological order and cumulative conditional tables of a Bayesian
+    network
+
+    \throws ValueError if the factors of the network are not one conditional
+    distribution per node
+    """
+    factors = network.plan_factors()
+    cpd = network.family_factors(factors)
+    if cpd is None:
+        raise ValueError(
+            "Sampling needs one conditional distribution per node of the network"
+        )
+    parents = network.parent_ids()
+    order = topological_order(parents)
+    tables = [TabularFactor.from_factor(factors[cpd[n]]) for n in order]
+    # conditional distributions reduced by evidence range over the observed
+    # value only, tables range over every value of their variable
+    domains = {n.id(): list(n.values()) for n in network.nodes()}
+    cpts: Dict[str, CPT] = {}
+    for n, t in zip(order, tables):
+        ps = sorted(parents[n])
+        strides = []
+        nb_rows = 1
+        for p in reversed(ps):
+            strides.append(nb_rows)
+            nb_rows *= len(domains[p])
+        strides.reverse()
+        inside = {vid: set(d) for vid, d in zip(t.var_ids, t.domains)}
+        values: List[List[float]] = []
+        pmfs: List[Optional[List[float]]] = []
+        cdfs: List[Optional[List[float]]] = []
+        for row in range(nb_rows):
+            assignment = [
+                (p, domains[p][(row // s) % len(domains[p])])
+                for p, s in zip(ps, strides)
+            ]
+            probs = []
+            for x in domains[n]:
+                context = set(assignment + [(n, x)])
+                # parent values outside the domain of the table have no mass
+                if all([v in inside[vid] for vid, v in context]):
+                    probs.append(t.phi(context))
+                else:
+                    probs.append(0.0)
+            values.append(probs)
+            total = sum(probs)
+            if total <= 0:
+                pmfs.append(None)
+                cdfs.append(None)
+                continue
+            pmfs.append([p / total for p in probs])
+            cdfs.append(cumulative(pmfs[-1]))
+        cpts[n] = CPT(
+            var_id=n,
+            domain=domains[n],
+            parents=ps,
+            strides=strides,
+            values=values,
+            pmfs=pmfs,
+            cdfs=cdfs,
+        )
+    return order, cpts
+
+
+Estimate = namedtuple(
+    "Estimate",
+    [
+        "nb_samples",
+        "marginals",
+        "ess",
+        "stderr",
+        "evidence_probability",
+        "elapsed",
+    ],
+)
+Estimate.__doc__ = """!
+\\brief weighted estimates after a number of samples
+
+- nb_samples: number of samples drawn so far
+- marginals: normalized estimated marginal of each query variable, empty if
+  every sample has zero weight
+- ess: effective sample size, Koller, Friedman 2009, p. 498,
+  \\f$ (\\sum w)^2 / \\sum w^2 \\f$
+- stderr: largest standard error of a marginal probability, estimated from
+  the effective sample size
+- evidence_probability: mean weight, an estimate of the probability of the
+  evidence when the proposal is the network itself
+- elapsed: seconds since the start of the stream
+"""
+
+
+class ForwardSampler:
+    """!
+    \brief draws joint samples of a Bayesian network
+
+    \code{.py}
+
+    >>> sampler = ForwardSampler(bn, seed=42)
+    >>> columns = sampler.sample(100000)
+    >>> columns["E"][:5]
+    >>> array('B', [0, 0, 1, 0, 0])
+    >>> sampler.frequencies(columns, "E")
+    >>> {True: 0.8608, False: 0.1392}
+
+    \endcode
+    """
+
+    def __init__(self, network, seed: Optional[int] = None):
+        """!
+        \param network a BayesianNetwork, its factors are read once
+        \param seed seed of the random number generator, samples are the same
+        for the same seed
+
+        \throws ValueError if the factors of the network are not one
+        conditional distribution per node
+        """
+        self.order, self.cpts = conditional_tables(network)
+        self.variables: Dict[str, NumCatRVariable] = {
+            n.id(): n for n in network.nodes()
+        }
+        self.rng = Random(seed)
+
+    def parent_rows(self, n: str, columns: Dict[str, array], size: int) -> List[int]:
+        """!
+        \brief row of the conditional table of a variable for every sample,
+        given the columns of its parents
+        """
+        cpt = self.cpts[n]
+        rows = [0] * size
+        for p, s in zip(cpt.parents, cpt.strides):
+            rows = [r + s * i for r, i in zip(rows, columns[p])]
+        return rows
+
+    def draw(
+        self, n: str, cdfs: List[Optional[List[float]]], rows: List[int]
+    ) -> array:
+        """!
+        \brief value indices drawn from the cumulative distribution of each
+        row
+
+        \throws ValueError if a row has no distribution
+        """
+        rand = self.rng.random
+        try:
+            values = [bisect_right(cdfs[r], rand()) for r in rows]
+        except TypeError:
+            raise ValueError("Distribution of " + n + " is zero for a sample")
+        return array(typecode_of(len(self.cpts[n].domain)), values)
+
+    def sample_column(self, n: str, columns: Dict[str, array], size: int) -> array:
+        """!
+        \brief value indices of a variable for every sample, given the
+        columns of its parents
+
+        \throws ValueError if a sample reaches a parent assignment whose
+        distribution is zero
+        """
+        rows = self.parent_rows(n, columns, size)
+        return self.draw(n, self.cpts[n].cdfs, rows)
+
+    def sample(self, size: int) -> Dict[str, array]:
+        """!
+        \brief draw samples as one column of value indices per variable
+
+        \param size number of samples
+        """
+        columns: Dict[str, array] = {}
+        for n in self.order:
+            columns[n] = self.sample_column(n, columns, size)
+        return columns
+
+    def chunks(
+        self, size: int, chunksize: int = 65536
+    ) -> Iterator[Dict[str, array]]:
+        """!
+        \brief draw samples in chunks of at most chunksize samples, so that
+        large sample sizes do not have to fit in memory
+        """
+        while size > 0:
+            k = min(size, chunksize)
+            yield self.sample(k)
+            size -= k
+
+    def assignments(
+        self, columns: Dict[str, array]
+    ) -> Iterator[Set[Tuple[str, NumericValue]]]:
+        """!
+        \brief decode sample columns into sets of (id, value) pairs
+        """
+        ids = list(columns)
+        domains = [self.cpts[n].domain for n in ids]
+        for row in zip(*[columns[n] for n in ids]):
+            yield set([(n, d[i]) for n, d, i in zip(ids, domains, row)])
+
+    def frequencies(
+        self, columns: Dict[str, array], n: str
+    ) -> Dict[NumericValue, float]:
+        """!
+        \brief relative frequency of each value of a variable in samples
+        """
+        counts = [0] * len(self.cpts[n].domain)
+        for i in columns[n]:
+            counts[i] += 1
+        size = max(len(columns[n]), 1)
+        return {x: c / size for x, c in zip(self.cpts[n].domain, counts)}
+
+
+class LikelihoodWeighting(ForwardSampler):
+    """!
+    \brief weighted samples and streaming estimates of a Bayesian network
+    given evidence
+
+    \code{.py}
+
+    >>> lw = LikelihoodWeighting(bn, evidences=set([("F", True)]), seed=1)
+    >>> for estimate in lw.estimates(set(["E"]), chunksize=10000):
+    >>>     if estimate.stderr < 0.005:
+    >>>         break
+    >>> estimate.marginals["E"].phi(set([("E", True)]))
+    >>> 0.9171
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        network,
+        evidences: Optional[Set[Tuple[str, NumericValue]]] = None,
+        proposal: Optional[Dict[str, List[List[float]]]] = None,
+        seed: Optional[int] = None,
+    ):
+        """!
+        \param network a BayesianNetwork, its factors are read once
+        \param evidences set of (id, value) pairs. Values given by the
+        "evidence" data of nodes, see NumCatRVariable.add_evidence(), are
+        used for variables that are not in evidences.
+        \param proposal for unobserved variables, a distribution over the
+        values of the variable for each row of its conditional table, see
+        CPT. A single distribution is used for every row. Variables without
+        a proposal are drawn from the network.
+        \param seed seed of the random number generator
+
+        \throws ValueError if an observed value or a proposal does not fit
+        its variable
+        """
+        super().__init__(network, seed=seed)
+        observed: Dict[str, NumericValue] = {}
+        for vid, v in self.variables.items():
+            if "evidence" in v.data():
+                observed[vid] = v.data()["evidence"]
+        for vid, value in evidences if evidences is not None else set():
+            observed[vid] = value
+        self.evidence: Dict[str, int] = {}
+        for vid, value in observed.items():
+            if vid not in self.cpts:
+                raise ValueError("Variable " + str(vid) + " is not in the network")
+            if value not in self.cpts[vid].domain:
+                msg = "Value " + str(value) + " is not in domain of " + vid
+                raise ValueError(msg)
+            self.evidence[vid] = self.cpts[vid].domain.index(value)
+        self.proposal: Dict[str, List[List[float]]] = {}
+        self.ratios: Dict[str, List[List[float]]] = {}
+        for vid, rows in (proposal if proposal is not None else {}).items():
+            self.set_proposal(vid, rows)
+
+    def set_proposal(self, vid: str, rows: List):
+        """!
+        \brief cumulative proposal of a variable and the ratio of network to
+        proposal probabilities of each of its entries
+
+        \throws ValueError if the variable is unknown or observed, or rows do
+        not have the shape of its conditional table
+        """
+        if vid not in self.cpts or vid in self.evidence:
+            raise ValueError("Proposal of " + str(vid) + " must be unobserved")
+        cpt = self.cpts[vid]
+        if len(rows) > 0 and not isinstance(rows[0], (list, tuple)):
+            rows = [rows for _ in cpt.pmfs]
+        if len(rows) != len(cpt.pmfs) or any(
+            [len(q) != len(cpt.domain) or sum(q) <= 0 for q in rows]
+        ):
+            msg = "Proposal of " + vid + " must have " + str(len(cpt.pmfs))
+            msg += " rows of " + str(len(cpt.domain)) + " values"
+            raise ValueError(msg)
+        qs = [[x / sum(q) for x in q] for q in rows]
+        self.proposal[vid] = [cumulative(q) for q in qs]
+        # values with a zero proposal are never drawn
+        self.ratios[vid] = [
+            [0.0 if qi == 0 else pi / qi for pi, qi in zip(p, q)]
+            for p, q in zip(cpt.values, qs)
+        ]
+
+    def weighted_sample(self, size: int) -> Tuple[Dict[str, array], List[float]]:
+        """!
+        \brief draw samples with observed variables clamped to their values
+
+        \return columns of value indices, see ForwardSampler.sample(), and
+        the weight of each sample
+        """
+        columns: Dict[str, array] = {}
+        weights = [1.0] * size
+        for n in self.order:
+            cpt = self.cpts[n]
+            rows = self.parent_rows(n, columns, size)
+            if n in self.evidence:
+                i = self.evidence[n]
+                # entries of the distribution, normalizing a row reduced to
+                # the observed value would give every sample weight one
+                likelihood = [p[i] for p in cpt.values]
+                weights = [w * likelihood[r] for w, r in zip(weights, rows)]
+                columns[n] = array(typecode_of(len(cpt.domain)), [i]) * size
+            elif n in self.proposal:
+                columns[n] = self.draw(n, self.proposal[n], rows)
+                ratios = self.ratios[n]
+                weights = [
+                    w * ratios[r][i] for w, r, i in zip(weights, rows, columns[n])
+                ]
+            else:
+                columns[n] = self.draw(n, cpt.cdfs, rows)
+        return columns, weights
+
+    def estimates(
+        self,
+        queries: Optional[Set[Union[NumCatRVariable, str]]] = None,
+        chunksize: int = 10000,
+        max_samples: Optional[int] = None,
+        time_limit: Optional[float] = None,
+    ) -> Iterator[Estimate]:
+        """!
+        \brief estimates of query marginals updated after every chunk of
+        samples
+
+        The stream ends after max_samples samples or time_limit seconds,
+        otherwise it ends when the caller stops reading it.
+
+        \param queries query variables or their identifiers, every
+        unobserved variable if not provided
+        \param chunksize number of samples drawn between two estimates
+
+        \throws ValueError if a query is not in the network or chunksize is
+        not positive, or if every sample of the first chunks has zero weight,
+        which happens when the evidence has zero probability
+        """
+        if chunksize < 1:
+            raise ValueError("chunksize must be positive")
+        if queries is None:
+            qids = [n for n in self.order if n not in self.evidence]
+        else:
+            qids = sorted(
+                [q.id() if isinstance(q, NumCatRVariable) else q for q in queries]
+            )
+        for q in qids:
+            if q not in self.cpts:
+                raise ValueError("Variable " + str(q) + " is not in the network")
+        sums = {q: [0.0 for _ in self.cpts[q].domain] for q in qids}
+        total = 0.0
+        total_sq = 0.0
+        nb_samples = 0
+        start = time.monotonic()
+        while max_samples is None or nb_samples < max_samples:
+            size = chunksize
+            if max_samples is not None:
+                size = min(size, max_samples - nb_samples)
+            columns, weights = self.weighted_sample(size)
+            nb_samples += size
+            total += sum(weights)
+            total_sq += sum([w * w for w in weights])
+            if total == 0:
+                msg = "No sample out of " + str(nb_samples)
+                msg += " has a positive weight, evidence may have zero probability"
+                raise ValueError(msg)
+            for q in qids:
+                acc = sums[q]
+                for i, w in zip(columns[q], weights):
+                    acc[i] += w
+            elapsed = time.monotonic() - start
+            yield self.estimate(qids, sums, total, total_sq, nb_samples, elapsed)
+            if time_limit is not None and elapsed >= time_limit:
+                return
+
+    def estimate(
+        self,
+        qids: List[str],
+        sums: Dict[str, List[float]],
+        total: float,
+        total_sq: float,
+        nb_samples: int,
+        elapsed: float,
+    ) -> Estimate:
+        """!
+        \brief estimate from the weighted counts of query values
+        """
+        marginals: Dict[str, TabularFactor] = {}
+        ess = 0.0
+        stderr = math.inf
+        if total > 0:
+            ess = total * total / total_sq
+            stderr = 0.0
+            for q in qids:
+                values = [x / total for x in sums[q]]
+                marginals[q] = TabularFactor(
+                    gid="lw_" + q,
+                    scope_vars=[self.variables[q]],
+                    domains=[self.cpts[q].domain],
+                    values=values,
+                )
+                for p in values:
+                    stderr = max(stderr, math.sqrt(p * (1 - p) / ess))
+        return Estimate(
+            nb_samples=nb_samples,
+            marginals=marginals,
+            ess=ess,
+            stderr=stderr,
+            evidence_probability=total / nb_samples,
+            elapsed=elapsed,
+        )
+
+    def run(
+        self,
+        queries: Optional[Set[Union[NumCatRVariable, str]]] = None,
+        tolerance: float = 0.01,
+        chunksize: int = 10000,
+        max_samples: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        min_ess: float = 100.0,
+    ) -> Estimate:
+        """!
+        \brief read estimates until the standard error of every marginal
+        probability is below tolerance, or a limit is reached
+
+        \param min_ess effective sample size needed before the standard error
+        is compared to tolerance. The standard error is estimated from the
+        marginals themselves, so a few heavy samples that agree on every
+        query value give a standard error of 0.
+
+        If neither max_samples nor time_limit is given, at most 1000 chunks are
+        drawn.
+
+        \see LikelihoodWeighting.estimates()
+        """
+        if max_samples is None and time_limit is None:
+            max_samples = 1000 * chunksize
+        estimate = None
+        for estimate in self.estimates(queries, chunksize, max_samples, time_limit):
+            if estimate.ess >= min_ess and estimate.stderr < tolerance:
+                break
+        return estimate
@@ -0,0 +1,480 @@
+"""!
+\file sparsefactor.py
+
+# Sparse Factor
+
+Deterministic conditional distributions, logical constraints and factors
+reduced by evidence are mostly made of zeros. A sparse factor lays out its
+axes like a tabular factor, but it only stores the non zero entries of the
+table as a map from the code of an assignment, see AssignmentCodec, to its
+value. Missing codes have the value 0.
+
+Product, sum out, max out and reduction walk the stored entries only, so the
+cost of an operation depends on the number of non zero entries rather than on
+the size of the domain. Products assume that a zero operand gives a zero
+product, which holds for the default multiplication.
+"""
+
+from gmodels.factor import Factor, broadcast_offsets
+from gmodels.assignmentcodec import AssignmentCodec
+from gmodels.tabularfactor import TabularFactor
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+
+from typing import Set, Callable, Optional, List, Union, Tuple, Dict
+from itertools import product
+from uuid import uuid4
+
+
+class SparseFactor(TabularFactor):
+    """!
+    \brief Tabular factor that only stores its non zero entries
+
+    \see TabularFactor for the layout of the axes
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        scope_vars: Union[Set[NumCatRVariable], List[NumCatRVariable]],
+        factor_fn: Optional[Callable[[Set[Tuple[str, NumericValue]]], float]] = None,
+        data={},
+        entries: Optional[Dict[int, float]] = None,
+        domains: Optional[List[List[NumericValue]]] = None,
+        values: Optional[List[float]] = None,
+    ):
+        """!
+        \brief Constructor for a sparse factor
+
+        \param entries map from assignment codes to non zero values. Zero
+        values are dropped.
+
+        \param values dense table in row major order, used for the entries if
+        they are not given, as in TabularFactor
+
+        \param factor_fn real valued function used for filling the entries if
+        neither entries nor values are given. It is evaluated once over the
+        domain.
+
+        \see TabularFactor.__init__ for the other arguments
+
+        \throws ValueError if a code is out of the range of the domain or if
+        the table size does not match the domain size
+        """
+        ordered = self.set_axes(scope_vars, domains)
+        size = self.codec.size
+        if entries is None:
+            if values is None:
+                if factor_fn is None:
+                    values = self.marginal_table()
+                else:
+                    values = [
+                        factor_fn(set(sp)) for sp in product(*self.axis_domains())
+                    ]
+            if len(values) != size:
+                msg = "Table size " + str(len(values))
+                msg += " does not match domain size " + str(size)
+                raise ValueError(msg)
+            entries = {i: v for i, v in enumerate(values) if v != 0}
+        if any(c < 0 or c >= size for c in entries):
+            raise ValueError("Entry codes must be in the range of the domain")
+        self.entries: Dict[int, float] = {c: v for c, v in entries.items() if v != 0}
+        self.table_version: List[int] = [0]
+        Factor.__init__(
+            self, gid=gid, scope_vars=set(ordered), factor_fn=self.table_value, data=data
+        )
+
+    @classmethod
+    def from_factor(cls, f: Factor):
+        """!
+        \brief make a sparse factor from a given factor
+
+        Entries of sparse and tabular factors are copied, other factors are
+        evaluated once over their domain.
+
+        \param f factor that is going to be converted
+        """
+        if type(f) is cls:
+            return f
+        if isinstance(f, TabularFactor):
+            entries = {i: v for i, v in enumerate(f.linear_table()) if v != 0}
+            return cls(
+                gid=f.id(),
+                scope_vars=list(f.ordered_vars),
+                domains=f.domains,
+                entries=entries,
+                data=f.data(),
+            )
+        svars = f.ordered_scope()
+        return cls(
+            gid=f.id(),
+            scope_vars=svars,
+            domains=[f.domain_of(s) for s in svars],
+            factor_fn=f.factor_fn,
+            data=f.data(),
+        )
+
+    def is_sparse(self) -> bool:
+        """!
+        \brief sparse factors only store non zero values
+        """
+        return True
+
+    def is_view(self) -> bool:
+        """!
+        \brief sparse factors own their entries, they are never views
+        """
+        return False
+
+    def view(self, domains: List[List[NumericValue]], offset: int):
+        """!
+        \brief make a sparse factor with the entries of a sub domain
+
+        The entries are copied, sparse factors do not share them.
+
+        \see TabularFactor.view(domains, offset)
+        """
+        positions = broadcast_offsets(
+            [[i * s for i in range(len(d))] for d, s in zip(domains, self.strides)]
+        )
+        entries = self.entries
+        return self.from_entries(
+            vs=self.ordered_vars,
+            domains=domains,
+            entries={
+                c: entries[offset + p]
+                for c, p in enumerate(positions)
+                if offset + p in entries
+            },
+        )
+
+    def table_position(self, index: int) -> int:
+        """!
+        \brief position of the entry with the given code in the dense table
+        """
+        return index
+
+    def table_positions(self) -> List[int]:
+        """!
+        \brief positions of all entries in the dense table
+        """
+        return list(range(self.codec.size))
+
+    def nnz(self) -> int:
+        """!
+        \brief number of stored entries
+        """
+        return len(self.entries)
+
+    def density(self) -> float:
+        """!
+        \brief ratio of stored entries to the size of the domain
+        """
+        return len(self.entries) / self.codec.size
+
+    def linear_table(self) -> List[float]:
+        """!
+        \brief dense table of the factor in row major order
+        """
+        table = [0.0] * self.codec.size
+        for c, v in self.entries.items():
+            table[c] = v
+        return table
+
+    def table_values(self) -> List[float]:
+        """!
+        \brief dense entries of the factor in row major order
+        """
+        return self.linear_table()
+
+    def to_dense(self) -> TabularFactor:
+        """!
+        \brief tabular factor with the same axes and values
+        """
+        return TabularFactor(
+            gid=self.id(),
+            scope_vars=list(self.ordered_vars),
+            domains=self.domains,
+            values=self.linear_table(),
+            data=self.data(),
+        )
+
+    def table_value(
+        self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]
+    ) -> float:
+        """!
+        \brief look up the value of given assignment among the entries
+        """
+        return self.entries.get(self.table_index(scope_product), 0.0)
+
+    def phi(self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]) -> float:
+        """!
+        \brief obtain a factor value for given scope random variables
+        \see TabularFactor.phi(scope_product)
+        """
+        return self.entries.get(self.table_index(scope_product), 0.0)
+
+    def table_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief values for a batch of value index rows in axis order
+        """
+        entries = self.entries
+        return [entries.get(c, 0.0) for c in self.codec.encode_batch(rows)]
+
+    def zval(self):
+        """!
+        \brief compute value of partition function from stored entries
+        """
+        return sum(self.entries.values())
+
+    def normalized(self):
+        """!
+        \brief Normalize all entries of this factor by dividing them to Z
+
+        \return SparseFactor
+        """
+        Z = self.Z
+        return self.from_entries(
+            vs=self.ordered_vars,
+            domains=self.domains,
+            entries={c: v / Z for c, v in self.entries.items()},
+        )
+
+    def max_value(self):
+        """!
+        \brief assignment with the maximum factor value
+        """
+        if len(self.entries) == 0:
+            return set(self.assignment_of(0))
+        code = max(sorted(self.entries), key=lambda c: self.entries[c])
+        return set(self.assignment_of(code))
+
+    def from_entries(
+        self,
+        vs: List[NumCatRVariable],
+        domains: List[List[NumericValue]],
+        entries: Dict[int, float],
+    ):
+        """!
+        \brief make a new sparse factor with a random id
+        """
+        return SparseFactor(
+            gid=str(uuid4()), scope_vars=vs, entries=entries, domains=domains
+        )
+
+    def from_table(
+        self,
+        vs: List[NumCatRVariable],
+        domains: List[List[NumericValue]],
+        values: List[float],
+    ):
+        """!
+        \brief make a new sparse factor from a dense table with a random id
+        """
+        return self.from_entries(
+            vs=vs, domains=domains, entries={i: v for i, v in enumerate(values)}
+        )
+
+    def entry_codes(
+        self, codec: AssignmentCodec, common: Set[str]
+    ) -> List[Tuple[int, int, float]]:
+        """!
+        \brief codes of the stored entries in the given codec
+
+        The scope of the codec must contain the scope of this factor. Entries
+        with a value out of the domain of the codec are skipped.
+
+        \param codec target codec
+        \param common ids of axes for computing the partial code
+
+        \return list of (code in codec, partial code of common axes, value)
+        """
+        contributions = []
+        for vid, domain in zip(self.var_ids, self.domains):
+            axis = codec.axis_of[vid]
+            index = codec.value_index[axis]
+            stride = codec.strides[axis]
+            contributions.append(
+                (vid in common, [index[v] * stride if v in index else None for v in domain])
+            )
+        codes = []
+        for c, v in self.entries.items():
+            code = 0
+            partial = 0
+            for (is_common, contribution), stride, card in zip(
+                contributions, self.strides, self.cards
+            ):
+                part = contribution[(c // stride) % card]
+                if part is None:
+                    break
+                code += part
+                if is_common:
+                    partial += part
+            else:
+                codes.append((code, partial, v))
+        return codes
+
+    def product(
+        self,
+        other,
+        product_fn=lambda x, y: x * y,
+        accumulator=lambda added, accumulated: added * accumulated,
+    ):
+        """!
+        \brief Factor product operation from Koller, Friedman 2009, p. 107
+
+        Only pairs of stored entries that agree on the common variables are
+        multiplied. A dense operand is first converted with from_factor(f),
+        which drops its zeros. Axes are laid out as in
+        TabularFactor.product(other, product_fn, accumulator).
+
+        \return SparseFactor, accumulated value
+        """
+        if not isinstance(other, Factor):
+            raise TypeError("other needs to be a factor")
+        if type(other) is not type(self):
+            other = self.__class__.from_factor(other)
+        vs = list(self.ordered_vars)
+        vids = list(self.var_ids)
+        domains = []
+        for vid, domain in zip(self.var_ids, self.domains):
+            oaxis = other.axis_of.get(vid)
+            if oaxis is None or other.domains[oaxis] == domain:
+                domains.append(domain)
+            else:
+                oindex = other.value_index[oaxis]
+                domains.append([v for v in domain if v in oindex])
+        for svar, vid, domain in zip(other.ordered_vars, other.var_ids, other.domains):
+            if vid not in self.axis_of:
+                vs.append(svar)
+                vids.append(vid)
+                domains.append(domain)
+        codec = AssignmentCodec(var_ids=vids, domains=domains)
+        common = set([vid for vid in self.var_ids if vid in other.axis_of])
+        # group entries of the other factor by their assignment to common axes
+        groups: Dict[int, List[Tuple[int, float]]] = {}
+        for code, partial, value in other.entry_codes(codec, common):
+            groups.setdefault(partial, []).append((code - partial, value))
+        entries = {}
+        for code, partial, value in self.entry_codes(codec, common):
+            for extra, ovalue in groups.get(partial, []):
+                multi = product_fn(value, ovalue)
+                if multi != 0:
+                    entries[code + extra] = multi
+        prod = 1.0
+        for multi in entries.values():
+            prod = accumulator(multi, prod)
+        if len(entries) < codec.size:
+            prod = accumulator(0.0, prod)
+        return self.from_entries(vs=vs, domains=domains, entries=entries), prod
+
+    def update_in(self, other, update_fn: Callable[[float, float], float]):
+        """!
+        \brief combine a factor with a smaller scope into the stored entries
+        in place
+
+        Only stored entries are updated, so update_fn(0, y) must be 0, which
+        holds for multiplication and safe division. Entries that become 0 are
+        dropped.
+
+        \see TabularFactor.update_in(other, update_fn)
+
+        \return this factor
+        """
+        self.check_update_scope(other)
+        if type(other) is not type(self):
+            other = self.__class__.from_factor(other)
+        contributions = [
+            other.axis_contribution(other.axis_of.get(vid), domain)
+            for vid, domain in zip(self.var_ids, self.domains)
+        ]
+        oentries = other.entries
+        entries = self.entries
+        for c in list(entries):
+            o = 0
+            for contribution, stride, card in zip(contributions, self.strides, self.cards):
+                o += contribution[(c // stride) % card]
+            value = update_fn(entries[c], oentries.get(o, 0.0))
+            if value == 0:
+                del entries[c]
+            else:
+                entries[c] = value
+        self.invalidate_partition()
+        return self
+
+    def reduced(self, context: Set[Tuple[str, NumericValue]]):
+        """!
+        \brief reduce factor using given context
+
+        Entries that disagree with the context are dropped. Like
+        TabularFactor.reduced(context), the reduced axes keep a single value
+        and the random variables are not modified.
+
+        \throws ValueError if a context value is not in the domain of its axis.
+
+        \return SparseFactor
+        """
+        domains = [d for d in self.domains]
+        for k, value in context:
+            axis = self.axis_of.get(k)
+            if axis is None:
+                continue
+            if value not in self.value_index[axis]:
+                msg = "Value " + str(value) + " is not in domain of " + k
+                raise ValueError(msg)
+            domains[axis] = [value]
+        codec = AssignmentCodec(var_ids=self.var_ids, domains=domains)
+        entries = {code: v for code, _, v in self.entry_codes(codec, set())}
+        return self.from_entries(vs=self.ordered_vars, domains=domains, entries=entries)
+
+    def aggregate_axis(
+        self,
+        Y: NumCatRVariable,
+        fn: Callable[[float, float], float],
+        with_argmax: bool = False,
+    ):
+        """!
+        \brief aggregate stored values along the axis of given variable
+
+        Missing entries are zeros, so fn must treat a missing operand as 0:
+        an assignment of the remaining scope with a single stored value keeps
+        that value. This holds for sum and for max over non negative values.
+
+        \see TabularFactor.aggregate_axis(Y, fn, with_argmax)
+
+        \return SparseFactor or (SparseFactor, argmax function)
+        """
+        axis = self.axis_of.get(Y.id())
+        if axis is None:
+            msg = "Argument " + str(Y)
+            msg += " is not in scope of this factor: "
+            msg += " ".join(self.var_ids)
+            raise ValueError(msg)
+        vs = [s for i, s in enumerate(self.ordered_vars) if i != axis]
+        domains = [d for i, d in enumerate(self.domains) if i != axis]
+        stride = self.strides[axis]
+        card = self.cards[axis]
+        entries: Dict[int, float] = {}
+        argmax: Dict[int, int] = {}
+        for c in sorted(self.entries):
+            v = self.entries[c]
+            # drop the digit of Y from the code
+            code = (c // (stride * card)) * stride + c % stride
+            if code not in entries:
+                entries[code] = v
+                argmax[code] = (c // stride) % card
+                continue
+            nv = fn(entries[code], v)
+            if nv != entries[code]:
+                argmax[code] = (c // stride) % card
+            entries[code] = nv
+        f = self.from_entries(vs=vs, domains=domains, entries=entries)
+        if with_argmax is False:
+            return f
+        Y_id = Y.id()
+        Y_domain = self.domains[axis]
+
+        def argmax_fn(scope_product: Set[Tuple[str, NumericValue]]):
+            ""
+            return (Y_id, Y_domain[argmax.get(f.table_index(scope_product), 0)])
+
+        return f, argmax_fn
@@ -0,0 +1,968 @@
+"""!
+\file tabularfactor.py
+
+# Tabular Factor
+
+A factor whose values are stored in a table instead of being recomputed from
+a factor function at each look up. The table is a contiguous list in row major
+order with one axis per scope variable. Each axis has a fixed position, a list
+of values and a value to index map, so that an assignment is mapped to a
+position in the table using the strides of the axes. The factor operations
+(product, sum out, max out, reduction, normalization) are then computed
+directly on the table.
+
+The layout follows the table representation of factors from Koller and
+Friedman 2009, p. 358-359.
+"""
+
+from gmodels.factor import Factor, broadcast_offsets, safe_log, safe_divide
+from gmodels.assignmentcodec import AssignmentCodec, EncodedAssignment
+from gmodels.randomvariable import NumCatRVariable, NumericValue
+
+from typing import Set, Callable, Optional, List, Union, Tuple, Dict
+from itertools import product
+from uuid import uuid4
+import math
+
+
+class TabularFactor(Factor):
+    """!
+    \brief Factor whose values are held in a row major table
+
+    \see Factor for the semantics of the operations
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        scope_vars: Union[Set[NumCatRVariable], List[NumCatRVariable]],
+        factor_fn: Optional[Callable[[Set[Tuple[str, NumericValue]]], float]] = None,
+        data={},
+        values: Optional[List[float]] = None,
+        domains: Optional[List[List[NumericValue]]] = None,
+        offset: int = 0,
+        table_strides: Optional[List[int]] = None,
+    ):
+        """!
+        \brief Constructor for a tabular factor
+
+        \param scope_vars variables that constitute scope of factor. If it is
+        a list, its order determines the order of the axes, if it is a set the
+        axes are ordered by the identifiers of the variables.
+
+        \param factor_fn real valued function used for filling the table. If
+        neither a function nor values are given, the table is filled with the
+        marginal joint of scope variables like in Factor.
+
+        \param values table values in row major order with respect to axis
+        order.
+
+        \param domains values of each axis. If it is not provided, we use the
+        values of scope variables.
+
+        \param offset position of the first entry in values, for views.
+
+        \param table_strides strides of the axes in values. If they are given
+        the factor is a view: values is the table of another factor, it is
+        shared and not copied, and the entries of this factor are found at
+        offset plus the value indices times table_strides.
+
+        \throws ValueError if the table size does not match the domain size.
+        """
+        ordered = self.set_axes(scope_vars, domains)
+        size = self.codec.size
+        if table_strides is not None:
+            if values is None:
+                raise ValueError("A view needs the table of its parent factor")
+            if len(table_strides) != len(self.cards):
+                raise ValueError("A view needs a stride for each axis")
+            self.table: List[float] = values
+            self.table_version: List[int] = [0]
+            self.offset = offset
+            self.table_strides: List[int] = list(table_strides)
+            self.positions: Optional[List[int]] = None
+            super().__init__(
+                gid=gid, scope_vars=set(ordered), factor_fn=self.table_value, data=data
+            )
+            return
+        if values is None:
+            if factor_fn is None:
+                values = self.marginal_table()
+            else:
+                values = [factor_fn(set(sp)) for sp in product(*self.axis_domains())]
+            values = self.to_table_values(values)
+        if len(values) != size:
+            msg = "Table size " + str(len(values))
+            msg += " does not match domain size " + str(size)
+            raise ValueError(msg)
+        self.table: List[float] = list(values)
+        self.table_version: List[int] = [0]
+        self.offset = 0
+        self.table_strides: List[int] = self.strides
+        self.positions: Optional[List[int]] = None
+        super().__init__(
+            gid=gid, scope_vars=set(ordered), factor_fn=self.table_value, data=data
+        )
+
+    def is_view(self) -> bool:
+        """!
+        \brief whether the entries of this factor are read from the table of
+        another factor
+        """
+        return self.table_strides is not self.strides
+
+    def view(self, domains: List[List[NumericValue]], offset: int):
+        """!
+        \brief make a factor of the same kind that reads this table
+
+        \param domains values of each axis of the view, each a sub list of
+        the domain of the axis in this factor
+        \param offset position of the first entry of the view in the table
+
+        The view shares the version of the table, so that it drops its cached
+        partition function when the table is updated in place.
+        """
+        v = self.__class__(
+            gid=str(uuid4()),
+            scope_vars=self.ordered_vars,
+            values=self.table,
+            domains=domains,
+            offset=offset,
+            table_strides=self.table_strides,
+        )
+        v.table_version = self.table_version
+        v.invalidate_partition()
+        return v
+
+    def table_position(self, index: int) -> int:
+        """!
+        \brief position in the table of the entry with the given code
+        """
+        if self.is_view() is False:
+            return index
+        position = self.offset
+        for stride, card, tstride in zip(self.strides, self.cards, self.table_strides):
+            position += ((index // stride) % card) * tstride
+        return position
+
+    def table_positions(self) -> List[int]:
+        """!
+        \brief positions in the table of all entries in row major order
+
+        They are computed once for views.
+        """
+        if self.is_view() is False:
+            return list(range(len(self.table)))
+        if self.positions is None:
+            positions = broadcast_offsets(
+                [
+                    [i * tstride for i in range(card)]
+                    for card, tstride in zip(self.cards, self.table_strides)
+                ]
+            )
+            self.positions = [self.offset + p for p in positions]
+        return self.positions
+
+    def table_values(self) -> List[float]:
+        """!
+        \brief entries of this factor in row major order, in the
+        representation of the table
+
+        Views copy their entries, other factors return their table.
+        """
+        if self.is_view() is False:
+            return self.table
+        table = self.table
+        return [table[p] for p in self.table_positions()]
+
+    def domain_of(self, v: NumCatRVariable) -> List[NumericValue]:
+        """!
+        \brief values of the axis of a scope variable
+        """
+        return self.domains[self.axis_of[v.id()]]
+
+    def set_axes(
+        self,
+        scope_vars: Union[Set[NumCatRVariable], List[NumCatRVariable]],
+        domains: Optional[List[List[NumericValue]]] = None,
+    ) -> List[NumCatRVariable]:
+        """!
+        \brief lay out the axes of the table
+
+        \see TabularFactor.__init__ for the arguments
+
+        \throws ValueError if the number of domains does not match the scope
+
+        \return scope variables in axis order
+        """
+        if isinstance(scope_vars, list):
+            ordered = list(scope_vars)
+        else:
+            ordered = sorted(scope_vars, key=lambda s: s.id())
+        self.ordered_vars: List[NumCatRVariable] = ordered
+        if domains is None:
+            domains = [list(s.values()) for s in ordered]
+        if len(domains) != len(ordered):
+            raise ValueError("number of domains must match number of scope variables")
+        self.codec = AssignmentCodec(var_ids=[s.id() for s in ordered], domains=domains)
+        self.var_ids: List[str] = self.codec.var_ids
+        self.domains: List[List[NumericValue]] = self.codec.domains
+        self.value_index: List[Dict[NumericValue, int]] = self.codec.value_index
+        self.cards: List[int] = self.codec.cards
+        self.strides: List[int] = self.codec.strides
+        return ordered
+
+    def index_scope(self, scope_vars: Set[NumCatRVariable]):
+        """!
+        \brief build the id maps of the scope using the axes of the table
+
+        axis_of is shared with the codec of the table, so it gives table axes
+        rather than positions in Factor.ordered_scope().
+
+        \see Factor.index_scope(scope_vars)
+        """
+        super().index_scope(scope_vars)
+        self.axis_of: Dict[str, int] = self.codec.axis_of
+
+    @classmethod
+    def from_factor(cls, f: Factor):
+        """!
+        \brief tabulate a given factor
+
+        We evaluate the factor function of the given factor over its domain
+        once, and keep the identifier and the data of the given factor.
+
+        \param f factor that is going to be tabulated
+        """
+        if type(f) is cls:
+            return f
+        if isinstance(f, TabularFactor):
+            return cls(
+                gid=f.id(),
+                scope_vars=list(f.ordered_vars),
+                domains=f.domains,
+                values=cls.to_table_values(f.linear_table()),
+                data=f.data(),
+            )
+        svars = f.ordered_scope()
+        return cls(
+            gid=f.id(),
+            scope_vars=svars,
+            domains=[f.domain_of(s) for s in svars],
+            factor_fn=f.factor_fn,
+            data=f.data(),
+        )
+
+    @staticmethod
+    def to_table_values(values: List[float]) -> List[float]:
+        """!
+        \brief convert factor values into the representation of the table
+
+        Tables of TabularFactor hold the factor values as they are.
+        """
+        return values
+
+    def linear_table(self) -> List[float]:
+        """!
+        \brief factor values of the table in row major order
+        """
+        return self.table_values()
+
+    def marginal_table(self) -> List[float]:
+        """!
+        \brief Table of marginal joint function of scope variables
+
+        \see Factor.marginal_joint(scope_product)
+        """
+        table = [1.0]
+        for svar, domain in zip(self.ordered_vars, self.domains):
+            marginals = [svar.marginal(v) for v in domain]
+            table = [t * m for t in table for m in marginals]
+        return table
+
+    def axis_domains(self) -> List[List[Tuple[str, NumericValue]]]:
+        """!
+        \brief domain of each axis as (id, value) pairs in axis order
+        """
+        return [
+            [(vid, v) for v in domain] for vid, domain in zip(self.var_ids, self.domains)
+        ]
+
+    def vars_domain(
+        self,
+        rvar_filter=lambda x: True,
+        value_filter=lambda x: True,
+        value_transform=lambda x: x,
+    ) -> List[List[Tuple[str, NumericValue]]]:
+        """!
+        \brief Get factor domain in axis order
+
+        Unlike Factor.vars_domain() the values are taken from the axes of the
+        table, so that the domain matches the table.
+        \see Factor.fdomain(D, rvar_filter, value_filter, value_transform)
+        """
+        return [
+            [(vid, value_transform(v)) for v in domain if value_filter(v) is True]
+            for svar, vid, domain in zip(self.ordered_vars, self.var_ids, self.domains)
+            if rvar_filter(svar) is True
+        ]
+
+    def assignment_codec(self) -> AssignmentCodec:
+        """!
+        \brief codec that maps assignments to table positions
+        """
+        return self.codec
+
+    def table_index(
+        self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]
+    ) -> int:
+        """!
+        \brief position of the given assignment in the table
+
+        Assignments to variables that are out of scope are ignored. An integer
+        is taken as an assignment encoded by the codec of this factor, that is
+        as a table position.
+
+        \throws ValueError if the assignment does not cover the scope or if a
+        value is not in the domain of its axis.
+        """
+        if isinstance(scope_product, int):
+            if scope_product < 0 or scope_product >= self.codec.size:
+                raise ValueError("Index " + str(scope_product) + " is out of table")
+            return scope_product
+        if (
+            isinstance(scope_product, EncodedAssignment)
+            and scope_product.codec is self.codec
+        ):
+            return scope_product.index
+        return self.codec.encode(scope_product)
+
+    def table_value(
+        self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]
+    ) -> float:
+        """!
+        \brief look up the value of given assignment in the table
+        """
+        return self.table[self.table_position(self.table_index(scope_product))]
+
+    def phi(self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]) -> float:
+        """!
+        \brief obtain a factor value for given scope random variables
+
+        The assignment can also be given as a table position or as an
+        EncodedAssignment of the codec of this factor.
+        \see Factor.phi(scope_product)
+        """
+        return self.table[self.table_position(self.table_index(scope_product))]
+
+    def table_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief table values for a batch of value index rows in axis order
+        """
+        table = self.table
+        codes = self.codec.encode_batch(rows)
+        if self.is_view() is False:
+            return [table[c] for c in codes]
+        positions = self.table_positions()
+        return [table[positions[c]] for c in codes]
+
+    def phi_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief evaluate the factor for a batch of assignments
+
+        Columns of rows follow the axis order of this factor.
+
+        \see Factor.phi_batch(rows)
+        """
+        return self.table_batch(rows)
+
+    def zval(self):
+        """!
+        \brief compute value of partition function for this factor
+        """
+        return sum(self.table_values())
+
+    def normalized(self):
+        """!
+        \brief Normalize all values of this factor by dividing them to Z
+
+        \return TabularFactor
+        """
+        Z = self.Z
+        return self.from_table(
+            vs=self.ordered_vars,
+            domains=self.domains,
+            values=[v / Z for v in self.table_values()],
+        )
+
+    def max_value(self):
+        """!
+        \brief assignment with the maximum factor value
+        """
+        table = self.table_values()
+        return set(self.assignment_of(table.index(max(table))))
+
+    def assignment_of(self, index: int) -> List[Tuple[str, NumericValue]]:
+        """!
+        \brief decode a table position into an assignment
+        """
+        return self.codec.decode_pairs(index)
+
+    def from_table(
+        self,
+        vs: List[NumCatRVariable],
+        domains: List[List[NumericValue]],
+        values: List[float],
+    ):
+        """!
+        \brief make a new tabular factor of the same kind with a random id
+        """
+        return self.__class__(
+            gid=str(uuid4()), scope_vars=vs, values=values, domains=domains
+        )
+
+    def axis_contribution(
+        self, axis: Optional[int], domain: List[NumericValue]
+    ) -> List[int]:
+        """!
+        \brief offsets that the values of a target axis add to this table
+
+        \param axis axis of this factor that corresponds to target axis. None
+        if target axis is not in the scope of this factor.
+        \param domain values of the target axis
+        """
+        if axis is None:
+            return [0] * len(domain)
+        index = self.value_index[axis]
+        stride = self.strides[axis]
+        return [index[v] * stride for v in domain]
+
+    def offsets_in(
+        self, vids: List[str], domains: List[List[NumericValue]]
+    ) -> List[int]:
+        """!
+        \brief table offsets of this factor for a target domain
+
+        \see broadcast_offsets(contributions)
+        """
+        return broadcast_offsets(
+            [
+                self.axis_contribution(self.axis_of.get(vid), domain)
+                for vid, domain in zip(vids, domains)
+            ]
+        )
+
+    def product(
+        self,
+        other,
+        product_fn=lambda x, y: x * y,
+        accumulator=lambda added, accumulated: added * accumulated,
+    ):
+        """!
+        \brief Factor product operation from Koller, Friedman 2009, p. 107
+
+        Both tables are aligned on the union of scopes, where the axes of this
+        factor come first, and multiplied in a single pass. If the two factors
+        do not share the same values for a common variable, the product is
+        defined over the common values.
+
+        The product and accumulator functions are applied to table values.
+        If the other factor is not of the same kind, it is first converted
+        with from_factor(f). A sparse factor is not converted, the product is
+        computed by the sparse factor instead.
+
+        \see Factor.product(other, product_fn, accumulator)
+
+        \return TabularFactor, accumulated value
+        """
+        if not isinstance(other, Factor):
+            raise TypeError("other needs to be a factor")
+        if other.is_sparse() is True and type(self) is TabularFactor:
+            return other.product(self, product_fn=product_fn, accumulator=accumulator)
+        if type(other) is not type(self):
+            other = self.__class__.from_factor(other)
+        vs = list(self.ordered_vars)
+        vids = list(self.var_ids)
+        domains = []
+        for vid, domain in zip(self.var_ids, self.domains):
+            oaxis = other.axis_of.get(vid)
+            if oaxis is None or other.domains[oaxis] == domain:
+                domains.append(domain)
+            else:
+                oindex = other.value_index[oaxis]
+                domains.append([v for v in domain if v in oindex])
+        for svar, vid, domain in zip(other.ordered_vars, other.var_ids, other.domains):
+            if vid not in self.axis_of:
+                vs.append(svar)
+                vids.append(vid)
+                domains.append(domain)
+        soffsets = self.offsets_in(vids, domains)
+        ooffsets = other.offsets_in(vids, domains)
+        stable = self.table_values()
+        otable = other.table_values()
+        values = [product_fn(stable[s], otable[o]) for s, o in zip(soffsets, ooffsets)]
+        prod = self.to_table_values([1.0])[0]
+        for v in values:
+            prod = accumulator(v, prod)
+        return self.from_table(vs=vs, domains=domains, values=values), prod
+
+    def divide(self, other, division_fn=safe_divide):
+        """!
+        \brief Factor division from Koller, Friedman 2009, p. 365
+
+        A sparse divisor is made dense first, since the division is not
+        commutative and can not be left to the sparse factor.
+
+        \see Factor.divide(other, division_fn)
+
+        \return TabularFactor
+        """
+        if isinstance(other, Factor) and other.is_sparse() is True:
+            if type(self) is TabularFactor:
+                other = other.to_dense()
+        return super().divide(other, division_fn=division_fn)
+
+    @property
+    def Z(self) -> float:
+        """!
+        \brief value of the partition function
+
+        \see Factor.Z, the value is recomputed if the table was updated in
+        place since it was computed, possibly through another factor that
+        shares the table.
+        """
+        self.check_table_version()
+        return Factor.Z.fget(self)
+
+    @Z.setter
+    def Z(self, value: float):
+        ""
+        Factor.Z.fset(self, value)
+
+    def invalidate_partition(self):
+        """!
+        \brief drop the cached domain and partition function value
+
+        \see Factor.invalidate_partition()
+        """
+        super().invalidate_partition()
+        self.partition_version = self.table_version[0]
+
+    def version(self) -> int:
+        """!
+        \brief number that changes each time the values of this factor are
+        invalidated, including updates of a table shared with other factors
+
+        \see Factor.version()
+        """
+        self.check_table_version()
+        return super().version()
+
+    def check_table_version(self):
+        """!
+        \brief drop the cached partition function if the table was updated
+        since it was computed
+        """
+        if self.partition_version != self.table_version[0]:
+            self.invalidate_partition()
+
+    def materialize(self):
+        """!
+        \brief copy the entries of a view into a table of its own
+
+        Nothing is done if the factor is not a view. Afterwards writing to the
+        table does not change the factor the view was made from.
+        """
+        if self.is_view() is False:
+            return
+        self.table = self.table_values()
+        self.table_version = [0]
+        self.offset = 0
+        self.table_strides = self.strides
+        self.positions = None
+
+    def check_update_scope(self, other):
+        """!
+        \brief check that other can be combined into this table in place
+
+        \throws TypeError if other is not a factor
+        \throws ValueError if the scope of other is not a subset of this scope
+        or if a value of a common axis is missing from the domain of other
+        """
+        if not isinstance(other, Factor):
+            raise TypeError("other needs to be a factor")
+        for vid in other.var_of:
+            if vid not in self.axis_of:
+                msg = "Variable " + vid + " of other factor"
+                msg += " is not in scope of this factor: "
+                msg += " ".join(self.var_ids)
+                raise ValueError(msg)
+        for v in other.scope_vars():
+            odomain = set(other.domain_of(v))
+            if any(d not in odomain for d in self.domain_of(v)):
+                msg = "Domain of " + v.id()
+                msg += " in other factor does not cover this domain"
+                raise ValueError(msg)
+
+    def update_in(self, other, update_fn: Callable[[float, float], float]):
+        """!
+        \brief combine a factor with a smaller scope into this table in place
+
+        Each entry of this table is replaced by update_fn(entry, value of
+        other), where other is broadcasted over the axes it does not have.
+        No new table is allocated, unless this factor is a view, in which case
+        its entries are first copied with materialize(). Views made from this
+        factor with reduced(context) read the same table and see the update:
+        the version of the table is increased, so that they drop their cached
+        partition function.
+
+        \param other factor whose scope is a subset of this scope
+        \param update_fn function applied to table values
+
+        \see TabularFactor.check_update_scope(other)
+
+        \return this factor
+        """
+        self.check_update_scope(other)
+        if type(other) is not type(self):
+            other = self.__class__.from_factor(other)
+        self.materialize()
+        offsets = other.offsets_in(self.var_ids, self.domains)
+        otable = other.table_values()
+        table = self.table
+        for i, o in enumerate(offsets):
+            table[i] = update_fn(table[i], otable[o])
+        self.table_version[0] += 1
+        self.invalidate_partition()
+        return self
+
+    def multiply_in(self, other, product_fn=lambda x, y: x * y):
+        """!
+        \brief multiply a factor with a smaller scope into this table in place
+
+        \see TabularFactor.update_in(other, update_fn)
+
+        \return this factor
+        """
+        return self.update_in(other, product_fn)
+
+    def divide_in(self, other, division_fn=safe_divide):
+        """!
+        \brief divide this table by a factor with a smaller scope in place
+
+        This is the message update of belief update, see Koller, Friedman
+        2009, p. 366, where 0 / 0 is 0.
+
+        \see TabularFactor.update_in(other, update_fn)
+
+        \return this factor
+        """
+        return self.update_in(other, division_fn)
+
+    def reduced(self, context: Set[Tuple[str, NumericValue]]):
+        """!
+        \brief reduce factor using given context
+
+        The reduced axes keep a single value, so the scope of the factor stays
+        the same. The result is a view that reads the table of this factor
+        without copying it, and the random variables are not modified.
+
+        \see Factor.reduced(context)
+
+        \throws ValueError if a context value is not in the domain of its axis.
+
+        \return TabularFactor
+        """
+        fixed: Dict[int, NumericValue] = {}
+        for k, value in context:
+            axis = self.axis_of.get(k)
+            if axis is None:
+                continue
+            if value not in self.value_index[axis]:
+                msg = "Value " + str(value) + " is not in domain of " + k
+                raise ValueError(msg)
+            fixed[axis] = value
+        domains = [d for d in self.domains]
+        offset = self.offset
+        for axis, value in fixed.items():
+            domains[axis] = [value]
+            offset += self.value_index[axis][value] * self.table_strides[axis]
+        return self.view(domains=domains, offset=offset)
+
+    def aggregate_axis(
+        self,
+        Y: NumCatRVariable,
+        fn: Callable[[float, float], float],
+        with_argmax: bool = False,
+    ):
+        """!
+        \brief aggregate values along the axis of given variable
+
+        \param Y variable whose axis is aggregated
+        \param fn binary aggregation function such as sum or max
+        \param with_argmax keep the value of Y chosen by fn for each entry of
+        the resulting table
+
+        \throws ValueError if the variable is not in scope of this factor
+
+        \return TabularFactor or (TabularFactor, argmax function)
+        \see Factor.aggregate_var(Y, fn, with_argmax)
+        """
+        axis = self.axis_of.get(Y.id())
+        if axis is None:
+            msg = "Argument " + str(Y)
+            msg += " is not in scope of this factor: "
+            msg += " ".join(self.var_ids)
+            raise ValueError(msg)
+        vs = [s for i, s in enumerate(self.ordered_vars) if i != axis]
+        vids = [s for i, s in enumerate(self.var_ids) if i != axis]
+        domains = [d for i, d in enumerate(self.domains) if i != axis]
+        offsets = self.offsets_in(vids, domains)
+        stride = self.strides[axis]
+        table = self.table_values()
+        values = [table[o] for o in offsets]
+        argmax = [0] * len(offsets)
+        for k in range(1, self.cards[axis]):
+            shift = k * stride
+            nvalues = [fn(v, table[o + shift]) for v, o in zip(values, offsets)]
+            if with_argmax is True:
+                argmax = [
+                    k if n != v else a for n, v, a in zip(nvalues, values, argmax)
+                ]
+            values = nvalues
+        f = self.from_table(vs=vs, domains=domains, values=values)
+        if with_argmax is False:
+            return f
+        Y_id = Y.id()
+        argmax_values = [self.domains[axis][a] for a in argmax]
+
+        def argmax_fn(scope_product: Set[Tuple[str, NumericValue]]):
+            ""
+            return (Y_id, argmax_values[f.table_index(scope_product)])
+
+        return f, argmax_fn
+
+    def sumout_var(self, Y: NumCatRVariable):
+        """!
+        \brief Sum the variable out of factor as per Koller, Friedman 2009, p. 297
+
+        \return TabularFactor
+        """
+        return self.aggregate_axis(Y, fn=lambda x, y: x + y)
+
+    def maxout_var(self, Y: NumCatRVariable, with_argmax: bool = False):
+        """!
+        \brief max the variable out of factor as per Koller, Friedman 2009, p. 555
+
+        \return TabularFactor or (TabularFactor, argmax function)
+        """
+        return self.aggregate_axis(Y, fn=max, with_argmax=with_argmax)
+
+
+def logaddexp(x: float, y: float) -> float:
+    """!
+    \brief compute \f[ \log(e^x + e^y) \f] without leaving log space
+    """
+    if x == float("-inf"):
+        return y
+    if y == float("-inf"):
+        return x
+    if x > y:
+        return x + math.log1p(math.exp(y - x))
+    return y + math.log1p(math.exp(x - y))
+
+
+def logsumexp(values: List[float]) -> float:
+    """!
+    \brief compute \f[ \log \sum_i e^{x_i} \f] by factoring out the maximum
+    """
+    mx = max(values)
+    if mx == float("-inf"):
+        return mx
+    return mx + math.log(sum([math.exp(v - mx) for v in values]))
+
+
+def log_divide(x: float, y: float) -> float:
+    """!
+    \brief division of factor values in log space where a zero denominator
+    gives 0
+
+    \see safe_divide(x, y)
+    """
+    if y == float("-inf"):
+        return float("-inf")
+    return x - y
+
+
+class LogTabularFactor(TabularFactor):
+    """!
+    \brief Tabular factor whose table holds the logarithm of factor values
+
+    Products become sums, sum out becomes log-sum-exp and max out becomes
+    max-sum, see Koller, Friedman 2009, p. 360 and p. 563. Large products do
+    not underflow since intermediate values stay in log space. Factor values
+    returned by phi() and factor_fn are in linear space, so the factor can
+    be used wherever a Factor is expected. log_phi() gives the value in log
+    space.
+    """
+
+    @staticmethod
+    def to_table_values(values: List[float]) -> List[float]:
+        """!
+        \brief move factor values to log space
+        """
+        return [safe_log(v) for v in values]
+
+    def linear_table(self) -> List[float]:
+        """!
+        \brief factor values of the table in linear space
+        """
+        return [math.exp(v) for v in self.table_values()]
+
+    def table_value(
+        self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]
+    ) -> float:
+        """!
+        \brief look up the value of given assignment in linear space
+        """
+        position = self.table_position(self.table_index(scope_product))
+        return math.exp(self.table[position])
+
+    def phi(
+        self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]
+    ) -> float:
+        """!
+        \brief factor value of the given assignment in linear space
+        """
+        position = self.table_position(self.table_index(scope_product))
+        return math.exp(self.table[position])
+
+    def log_phi(
+        self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]
+    ) -> float:
+        """!
+        \brief factor value of the given assignment in log space
+        """
+        return self.table[self.table_position(self.table_index(scope_product))]
+
+    def phi_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief factor values of a batch of assignments in linear space
+        """
+        return [math.exp(v) for v in self.table_batch(rows)]
+
+    def log_phi_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief factor values of a batch of assignments in log space
+        """
+        return self.table_batch(rows)
+
+    def phi_normal_batch(self, rows: List[List[int]]) -> List[float]:
+        """!
+        \brief normalized factor values of a batch of assignments
+        """
+        logZ = self.logZ
+        return [math.exp(v - logZ) for v in self.table_batch(rows)]
+
+    def zval(self):
+        """!
+        \brief compute value of partition function for this factor
+
+        \see LogTabularFactor.logZ
+        """
+        return math.exp(self.logZ)
+
+    @property
+    def logZ(self) -> float:
+        """!
+        \brief logarithm of the partition function, computed on first access
+        """
+        self.check_table_version()
+        if self._logZ is None:
+            self._logZ = logsumexp(self.table_values())
+        return self._logZ
+
+    def invalidate_partition(self):
+        """!
+        \brief drop cached partition function values in both spaces
+        """
+        super().invalidate_partition()
+        self._logZ: Optional[float] = None
+
+    def normalize(self, phi_result: float) -> float:
+        """!
+        \brief Normalize a linear factor value using the partition function
+        computed in log space
+        """
+        return math.exp(safe_log(phi_result) - self.logZ)
+
+    def phi_normal(
+        self, scope_product: Union[int, Set[Tuple[str, NumericValue]]]
+    ) -> float:
+        """!
+        \brief normalized factor value of the given assignment
+        """
+        return math.exp(self.log_phi(scope_product) - self.logZ)
+
+    def normalized(self):
+        """!
+        \brief Normalize all values of this factor by subtracting log Z
+
+        \return LogTabularFactor
+        """
+        logZ = self.logZ
+        return self.from_table(
+            vs=self.ordered_vars,
+            domains=self.domains,
+            values=[v - logZ for v in self.table_values()],
+        )
+
+    def product(
+        self,
+        other,
+        product_fn=lambda x, y: x + y,
+        accumulator=lambda added, accumulated: added + accumulated,
+    ):
+        """!
+        \brief Factor product computed as a sum of logarithms
+
+        \see TabularFactor.product(other, product_fn, accumulator)
+
+        \return LogTabularFactor, accumulated value in log space
+        """
+        return super().product(other, product_fn=product_fn, accumulator=accumulator)
+
+    def divide(self, other, division_fn=log_divide):
+        """!
+        \brief Factor division computed as a difference of logarithms
+
+        \see TabularFactor.divide(other, division_fn)
+
+        \return LogTabularFactor
+        """
+        return super().divide(other, division_fn=division_fn)
+
+    def multiply_in(self, other, product_fn=lambda x, y: x + y):
+        """!
+        \brief add the logarithms of a factor with a smaller scope in place
+
+        \see TabularFactor.multiply_in(other, product_fn)
+        """
+        return self.update_in(other, product_fn)
+
+    def divide_in(self, other, division_fn=log_divide):
+        """!
+        \brief subtract the logarithms of a factor with a smaller scope in
+        place
+
+        \see TabularFactor.divide_in(other, division_fn)
+        """
+        return self.update_in(other, division_fn)
+
+    def sumout_var(self, Y: NumCatRVariable):
+        """!
+        \brief Sum the variable out of factor with log-sum-exp
+
+        \return LogTabularFactor
+        """
+        return self.aggregate_axis(Y, fn=logaddexp)
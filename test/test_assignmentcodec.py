@@ -0,0 +1,112 @@
+"""!
+test for assignmentcodec.py
+"""
+from gmodels.assignmentcodec import AssignmentCodec, EncodedAssignment, strides_of
+from gmodels.randomvariable import NumCatRVariable
+import unittest
+
+
+class TestAssignmentCodec(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        ""
+        self.a = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.b = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [True, False]},
+            distribution=lambda x: 0.5,
+        )
+        self.codec = AssignmentCodec(
+            var_ids=["A", "B"], domains=[[10, 50, 20], [True, False]]
+        )
+
+    def test_strides_of(self):
+        ""
+        self.assertEqual(strides_of([3, 2]), [2, 1])
+
+    def test_domain_mismatch(self):
+        ""
+        with self.assertRaises(ValueError):
+            AssignmentCodec(var_ids=["A", "B"], domains=[[1, 2]])
+
+    def test_from_vars(self):
+        ""
+        codec = AssignmentCodec.from_vars([self.a, self.b])
+        self.assertEqual(codec, self.codec)
+        self.assertEqual(hash(codec), hash(self.codec))
+        self.assertEqual(codec.size, 6)
+
+    def test_encode(self):
+        ""
+        self.assertEqual(self.codec.encode(set([("A", 50), ("B", False)])), 3)
+        self.assertEqual(self.codec.encode(set([("A", 20), ("B", True)])), 4)
+
+    def test_encode_ignores_out_of_scope(self):
+        ""
+        index = self.codec.encode(set([("A", 50), ("B", False), ("C", 1)]))
+        self.assertEqual(index, 3)
+
+    def test_encode_partial(self):
+        ""
+        self.assertEqual(self.codec.encode(set([("A", 20)]), partial=True), 4)
+        with self.assertRaises(ValueError):
+            self.codec.encode(set([("A", 20)]))
+
+    def test_encode_out_of_domain(self):
+        ""
+        with self.assertRaises(ValueError):
+            self.codec.encode(set([("A", 30), ("B", True)]))
+
+    def test_decode(self):
+        ""
+        self.assertEqual(self.codec.decode(3), set([("A", 50), ("B", False)]))
+        with self.assertRaises(ValueError):
+            self.codec.decode(6)
+
+    def test_round_trip(self):
+        ""
+        for i in range(self.codec.size):
+            self.assertEqual(self.codec.encode(self.codec.decode(i)), i)
+
+    def test_indices(self):
+        ""
+        self.assertEqual(self.codec.encode_indices([2, 1]), 5)
+        self.assertEqual(self.codec.decode_indices(5), [2, 1])
+
+    def test_batch(self):
+        ""
+        rows = [[0, 0], [1, 1], [2, 0]]
+        codes = self.codec.encode_batch(rows)
+        self.assertEqual(codes, [0, 3, 4])
+        self.assertEqual(self.codec.decode_batch(codes), rows)
+
+    def test_value_batch(self):
+        ""
+        codes = self.codec.encode_value_batch([[10, True], [20, False]])
+        self.assertEqual(codes, [0, 5])
+
+    def test_project(self):
+        ""
+        other = AssignmentCodec(var_ids=["B"], domains=[[True, False]])
+        self.assertEqual(self.codec.project(other, 3), 1)
+        self.assertEqual(self.codec.project(other, 4), 0)
+
+    def test_encoded_assignment(self):
+        ""
+        e = self.codec.assignment(3)
+        self.assertTrue(isinstance(e, EncodedAssignment))
+        self.assertEqual(len(e), 2)
+        self.assertTrue(("A", 50) in e)
+        self.assertEqual(e, set([("A", 50), ("B", False)]))
+        self.assertEqual(e.to_set(), set([("A", 50), ("B", False)]))
+        self.assertEqual(self.codec.encode(e), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@ Test Bayesian Network
 """
 
 from gmodels.bayesian import BayesianNetwork
+from gmodels.pgmodel import min_unmarked_neighbours
 from gmodels.gtypes.edge import Edge, EdgeType
 from gmodels.factor import Factor
 from gmodels.randomvariable import NumCatRVariable
@@ -223,5 +224,40 @@ class BayesianNetworkTest(unittest.TestCase):
                 self.assertEqual(ff, 0.774)
 
 
+    def test_barren_nodes_are_pruned(self):
+        "D is a barren node for a query on E given F"
+        factors = self.bayes_n.plan_factors()
+        relevant = self.bayes_n.relevant_factors(factors, set(["E"]), set(["F"]))
+        self.assertEqual(
+            sorted([factors[i].id() for i in relevant]), ["CE_f", "C_f", "FE_f"]
+        )
+        plan = self.bayes_n.compile_query(set([self.E]), set(["F"]))
+        self.assertEqual(plan.order, ("C",))
+
+    def test_d_separated_nodes_are_pruned(self):
+        "C is d-separated from F given E"
+        factors = self.bayes_n.plan_factors()
+        relevant = self.bayes_n.relevant_factors(factors, set(["F"]), set(["E"]))
+        self.assertEqual([factors[i].id() for i in relevant], ["FE_f"])
+        probs, alpha = self.bayes_n.cond_prod_by_variable_elimination(
+            set([self.F]), evidences=set([("E", True)])
+        )
+        self.assertEqual(set(probs.var_of), set(["F"]))
+        self.bayes_n.set_query_cache(maxsize=0)
+        expected, _ = self.bayes_n.cond_prod_by_variable_elimination(
+            set([self.F]), set([("E", True)]), ordering_fn=min_unmarked_neighbours
+        )
+        for ps in expected.scope_products:
+            self.assertAlmostEqual(
+                probs.phi_normal(set(ps)), expected.phi_normal(set(ps))
+            )
+
+    def test_pruning_needs_one_distribution_per_node(self):
+        ""
+        factors = self.bayes_n.plan_factors()
+        self.assertIsNone(
+            self.bayes_n.relevant_factors(factors[1:], set(["F"]), set(["E"]))
+        )
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,165 @@
+"""!
+test for beliefpropagation.py
+"""
+from gmodels.beliefpropagation import LoopyBeliefPropagation
+from gmodels.tabularfactor import TabularFactor
+from gmodels.markov import MarkovNetwork
+from gmodels.pgmodel import PGModel
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+import unittest
+
+
+class TestLoopyBeliefPropagation(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        "a chain from Darwiche 2009, p. 132 and a 3 x 3 grid"
+        idata = {"outcome-values": [True, False]}
+        self.a, self.b, self.c = [
+            NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["a", "b", "c"]
+        ]
+        self.chain = PGModel(
+            gid="chain",
+            nodes=set([self.a, self.b, self.c]),
+            edges=set(
+                [
+                    Edge(
+                        edge_id="ab",
+                        edge_type=EdgeType.UNDIRECTED,
+                        start_node=self.a,
+                        end_node=self.b,
+                    ),
+                    Edge(
+                        edge_id="bc",
+                        edge_type=EdgeType.UNDIRECTED,
+                        start_node=self.b,
+                        end_node=self.c,
+                    ),
+                ]
+            ),
+            factors=set(
+                [
+                    TabularFactor(gid="a", scope_vars=[self.a], values=[0.6, 0.4]),
+                    TabularFactor(
+                        gid="ab",
+                        scope_vars=[self.a, self.b],
+                        values=[0.9, 0.1, 0.2, 0.8],
+                    ),
+                    TabularFactor(
+                        gid="bc",
+                        scope_vars=[self.b, self.c],
+                        values=[0.3, 0.7, 0.5, 0.5],
+                    ),
+                ]
+            ),
+        )
+        #
+        cells = {}
+        for i in range(3):
+            for j in range(3):
+                cells[(i, j)] = NumCatRVariable(
+                    node_id=str(i) + str(j),
+                    input_data=idata,
+                    distribution=lambda x: 0.5,
+                )
+        edges = set()
+        factors = set()
+        for (i, j), x in cells.items():
+            factors.add(
+                TabularFactor(
+                    gid="u" + x.id(),
+                    scope_vars=[x],
+                    values=[1.0 + 0.1 * i, 1.0 + 0.1 * j],
+                )
+            )
+            for y in [cells.get((i + 1, j)), cells.get((i, j + 1))]:
+                if y is None:
+                    continue
+                edges.add(
+                    Edge(
+                        edge_id=x.id() + y.id(),
+                        edge_type=EdgeType.UNDIRECTED,
+                        start_node=x,
+                        end_node=y,
+                    )
+                )
+                factors.add(
+                    TabularFactor(
+                        gid=x.id() + y.id(),
+                        scope_vars=[x, y],
+                        values=[1.5, 1.0, 1.0, 1.5],
+                    )
+                )
+        self.grid = MarkovNetwork(
+            gid="grid", nodes=set(cells.values()), edges=edges, factors=factors
+        )
+
+    def test_chain_is_exact(self):
+        "Darwiche 2009, p. 140, belief propagation is exact on trees"
+        for schedule in ["synchronous", "residual"]:
+            bp = self.chain.loopy_belief_propagation(schedule=schedule)
+            self.assertTrue(bp.run(set([("a", True)])))
+            self.assertAlmostEqual(bp.marginal(self.c).phi(set([("c", True)])), 0.32)
+            self.assertEqual(bp.marginal("a").phi(set([("a", True)])), 1.0)
+
+    def test_grid(self):
+        "weak loops give marginals close to the exact ones"
+        jt = self.grid.junction_tree()
+        jt.calibrate(set([("11", False)]))
+        for schedule in ["synchronous", "residual"]:
+            for damping in [0.0, 0.5]:
+                bp = LoopyBeliefPropagation(
+                    self.grid, damping=damping, schedule=schedule, tolerance=1e-8
+                )
+                self.assertTrue(bp.run(set([("11", False)])))
+                marginals = bp.marginals()
+                self.assertEqual(len(marginals), 9)
+                for vid, m in marginals.items():
+                    if vid == "11":
+                        self.assertEqual(m.phi(set([(vid, True)])), 0.0)
+                        continue
+                    self.assertAlmostEqual(
+                        m.phi(set([(vid, True)])),
+                        jt.marginal(vid).phi(set([(vid, True)])),
+                        places=2,
+                    )
+
+    def test_schedules_reach_the_same_fixed_point(self):
+        ""
+        results = []
+        for schedule in ["synchronous", "residual"]:
+            bp = self.grid.loopy_belief_propagation(schedule=schedule, tolerance=1e-10)
+            bp.run()
+            results.append(bp.marginal("00").phi(set([("00", True)])))
+        self.assertAlmostEqual(results[0], results[1], places=6)
+
+    def test_stats(self):
+        ""
+        bp = self.grid.loopy_belief_propagation(max_iterations=2)
+        self.assertFalse(bp.run())
+        self.assertEqual([s.iteration for s in bp.stats], [1, 2])
+        self.assertTrue(all(s.nb_updates == 24 + 9 for s in bp.stats))
+        bp = self.grid.loopy_belief_propagation(tolerance=1e-4, max_iterations=200)
+        self.assertTrue(bp.run())
+        residuals = [s.max_residual for s in bp.stats]
+        self.assertLess(residuals[-1], 1e-4)
+        self.assertLess(residuals[-1], residuals[0])
+
+    def test_errors(self):
+        ""
+        with self.assertRaises(ValueError):
+            LoopyBeliefPropagation(self.chain, damping=1.0)
+        with self.assertRaises(ValueError):
+            LoopyBeliefPropagation(self.chain, schedule="random")
+        bp = LoopyBeliefPropagation(self.chain)
+        with self.assertRaises(ValueError):
+            bp.run(set([("x", True)]))
+        with self.assertRaises(ValueError):
+            bp.marginal("x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""!
+test for contraction.py
+"""
+from gmodels.contraction import ContractionPlanner
+from gmodels.tabularfactor import TabularFactor
+from gmodels.factor import Factor
+from gmodels.randomvariable import NumCatRVariable
+import unittest
+
+
+class TestContractionPlanner(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        ""
+        self.a = NumCatRVariable(
+            node_id="a",
+            input_data={"outcome-values": [0, 1]},
+            distribution=lambda x: 0.5,
+        )
+        self.b = NumCatRVariable(
+            node_id="b",
+            input_data={"outcome-values": [0, 1, 2]},
+            distribution=lambda x: 1 / 3,
+        )
+        self.c = NumCatRVariable(
+            node_id="c",
+            input_data={"outcome-values": [0, 1]},
+            distribution=lambda x: 0.5,
+        )
+        self.d = NumCatRVariable(
+            node_id="d",
+            input_data={"outcome-values": [0, 1, 2, 3]},
+            distribution=lambda x: 0.25,
+        )
+        # chain a - b - c - d
+        self.ab = TabularFactor(
+            gid="ab", scope_vars=[self.a, self.b], values=[1, 2, 3, 4, 5, 6]
+        )
+        self.bc = TabularFactor(
+            gid="bc", scope_vars=[self.b, self.c], values=[1, 2, 3, 4, 5, 6]
+        )
+        self.cd = TabularFactor(
+            gid="cd", scope_vars=[self.c, self.d], values=[1, 2, 3, 4, 5, 6, 7, 8]
+        )
+
+    def naive(self, factors, marginalize):
+        ""
+        prod = factors[0]
+        for f in factors[1:]:
+            prod, _ = prod.product(f)
+        for m in marginalize:
+            prod = prod.sumout_var(m)
+        return prod
+
+    def assertSameValues(self, f, g):
+        ""
+        self.assertEqual(f.var_of.keys(), g.var_of.keys())
+        self.assertEqual(len(f.scope_products), len(g.scope_products))
+        for sp in g.scope_products:
+            self.assertAlmostEqual(f.phi(set(sp)), g.phi(set(sp)))
+
+    def test_no_factors(self):
+        ""
+        with self.assertRaises(ValueError):
+            ContractionPlanner(factors=[])
+
+    def test_unknown_mode(self):
+        ""
+        with self.assertRaises(ValueError):
+            ContractionPlanner(factors=[self.ab], mode="random")
+
+    def test_marginalize_out_of_scope(self):
+        ""
+        with self.assertRaises(ValueError):
+            ContractionPlanner(factors=[self.ab], marginalize=set([self.d]))
+
+    def test_greedy_plan(self):
+        "the outer product of ab and cd is never the smallest table"
+        fs = [self.ab, self.cd, self.bc]
+        plan = ContractionPlanner(factors=fs, mode="greedy").plan()
+        self.assertEqual(plan.mode, "greedy")
+        self.assertEqual(len(plan.steps), 2)
+        self.assertEqual((plan.steps[0].left, plan.steps[0].right), (0, 2))
+        self.assertEqual(plan.steps[0].size, 12)
+        self.assertEqual(plan.peak_size, 48)
+        self.assertEqual(plan.flops, 60)
+        self.assertEqual(plan.output_scope, frozenset(["a", "b", "c", "d"]))
+
+    def test_plan_with_marginalization(self):
+        ""
+        fs = [self.ab, self.cd, self.bc]
+        for mode in ["greedy", "optimal"]:
+            plan = ContractionPlanner(
+                factors=fs, marginalize=set([self.b, self.c]), mode=mode
+            ).plan()
+            self.assertEqual(plan.output_scope, frozenset(["a", "d"]))
+            self.assertEqual(plan.peak_size, 16)
+            # (a, b) x (b, c) summed over b, then (a, c) x (c, d) summed over c
+            self.assertEqual(plan.flops, 2 * 12 + 2 * 16)
+
+    def test_local_sumout(self):
+        "variables of a single factor are summed out before any product"
+        plan = ContractionPlanner(
+            factors=[self.ab, self.bc], marginalize=set([self.a]), mode="greedy"
+        ).plan()
+        self.assertIsNone(plan.steps[0].right)
+        self.assertEqual(plan.steps[0].sumout, ["a"])
+        self.assertEqual(plan.peak_size, 6)
+
+    def test_optimal_not_worse_than_greedy(self):
+        ""
+        fs = [self.ab, self.cd, self.bc]
+        marginalize = set([self.c])
+        greedy = ContractionPlanner(fs, marginalize, mode="greedy").plan()
+        optimal = ContractionPlanner(fs, marginalize, mode="optimal").plan()
+        self.assertLessEqual(optimal.peak_size, greedy.peak_size)
+
+    def test_auto_mode(self):
+        ""
+        fs = [self.ab, self.cd, self.bc]
+        self.assertEqual(ContractionPlanner(fs).plan().mode, "optimal")
+        self.assertEqual(ContractionPlanner(fs, optimal_limit=2).plan().mode, "greedy")
+
+    def test_execute(self):
+        ""
+        fs = [self.ab, self.cd, self.bc]
+        for mode in ["greedy", "optimal"]:
+            for marginalize in [set(), set([self.b]), set([self.b, self.c])]:
+                planner = ContractionPlanner(fs, marginalize, mode=mode)
+                result, _ = planner.execute(planner.plan())
+                self.assertSameValues(result, self.naive(fs, list(marginalize)))
+
+    def test_execute_function_factors(self):
+        ""
+        fs = [
+            Factor(gid="ab", scope_vars=set([self.a, self.b]), factor_fn=self.ab.phi),
+            Factor(gid="bc", scope_vars=set([self.b, self.c]), factor_fn=self.bc.phi),
+        ]
+        result, _ = ContractionPlanner(fs, set([self.b])).execute()
+        self.assertSameValues(result, self.naive([self.ab, self.bc], [self.b]))
+
+    def test_plan_str(self):
+        ""
+        plan = ContractionPlanner([self.ab, self.bc], set([self.b])).plan()
+        self.assertTrue(str(plan).startswith("contraction plan (optimal): "))
+
+
+if __name__ == "__main__":
+    unittest.main()
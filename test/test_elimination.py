@@ -0,0 +1,74 @@
+"""!
+test for elimination.py
+"""
+from gmodels.elimination import compile_elimination
+from gmodels.tabularfactor import TabularFactor
+from gmodels.randomvariable import NumCatRVariable
+import unittest
+
+
+class TestCompileElimination(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        "chain a - b - c - d"
+        idata = {"outcome-values": [True, False]}
+        self.vs = {
+            n: NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["a", "b", "c", "d"]
+        }
+        self.factors = [
+            TabularFactor(gid="a", scope_vars=[self.vs["a"]], values=[0.6, 0.4]),
+            TabularFactor(
+                gid="ab", scope_vars=[self.vs["a"], self.vs["b"]], values=[1, 2, 3, 4]
+            ),
+            TabularFactor(
+                gid="bc", scope_vars=[self.vs["b"], self.vs["c"]], values=[1, 2, 3, 4]
+            ),
+            TabularFactor(
+                gid="cd", scope_vars=[self.vs["c"], self.vs["d"]], values=[1, 2, 3, 4]
+            ),
+        ]
+        self.variables = set(self.vs)
+
+    def test_plan(self):
+        ""
+        plan = compile_elimination(self.factors, self.variables, set(["d"]), set())
+        self.assertEqual(plan.order, ("a", "b", "c"))
+        self.assertEqual(plan.buckets, ((0, 1), (2,), (3,)))
+        self.assertEqual(plan.scopes, (frozenset(["b"]), frozenset(["c"]), frozenset(["d"])))
+        self.assertEqual(plan.targets, (1, 2, None))
+        self.assertEqual(plan.final, ())
+
+    def test_plan_with_evidence(self):
+        "observed variables do not take part in the ordering"
+        plan = compile_elimination(self.factors, self.variables, set(["d"]), set(["b"]))
+        self.assertEqual(plan.order, ("a", "c"))
+        self.assertEqual(plan.buckets, ((0, 1), (2, 3)))
+        self.assertEqual(plan.scopes, (frozenset(), frozenset(["d"])))
+        self.assertEqual(plan.targets, (None, None))
+
+    def test_plan_with_relevant_factors(self):
+        "variables of left out factors are not eliminated"
+        plan = compile_elimination(
+            self.factors, self.variables, set(["b"]), set(), relevant=set([0, 1])
+        )
+        self.assertEqual(plan.order, ("a",))
+        self.assertEqual(plan.buckets, ((0, 1),))
+        self.assertEqual(plan.final, ())
+
+    def test_plan_is_immutable(self):
+        ""
+        plan = compile_elimination(self.factors, self.variables, set(["d"]), set())
+        with self.assertRaises(AttributeError):
+            plan.order = ("c", "b", "a")
+
+    def test_unknown_variables(self):
+        ""
+        with self.assertRaises(ValueError):
+            compile_elimination(self.factors, self.variables, set(["x"]), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 """!
 test for factor.py
 """
-from gmodels.factor import Factor
+from gmodels.factor import Factor, safe_divide
 from gmodels.randomvariable import NumCatRVariable
 from gmodels.gtypes.edge import Edge, EdgeType
 import unittest
@@ -218,6 +218,29 @@ class TestFactor(unittest.TestCase):
     def test_in_scope_f_str(self):
         self.assertFalse(self.f.in_scope("fdsfdsa"))
 
+    def test_in_scope_after_reduction(self):
+        "lookups by id survive changes to the data of scope variables"
+        self.f.reduced(set([("dice", 1)]))
+        self.assertTrue(self.f.in_scope(self.dice))
+
+    def test_has_var(self):
+        self.assertEqual(self.f.has_var("dice"), (True, self.dice))
+        self.assertEqual(self.f.has_var("fdsfdsa"), (False, None))
+
+    def test_index_scope(self):
+        self.assertEqual(self.f.axis_of, {"dice": 0, "grade": 1, "int": 2})
+        self.assertEqual(self.f.var_of["grade"], self.grade)
+
+    def test_filter_assignments(self):
+        assignments = set([("dice", 1), ("fdice", 2), ("grade", 0.2)])
+        self.assertEqual(
+            self.f.filter_assignments(assignments), set([("dice", 1), ("grade", 0.2)])
+        )
+        self.assertEqual(
+            self.f.filter_assignments(assignments, set([self.fdice])),
+            set([("fdice", 2)]),
+        )
+
     def test_scope_vars(self):
         self.assertTrue(
             self.f.scope_vars(), set([self.dice, self.intelligence, self.grade])
@@ -322,6 +345,107 @@ class TestFactor(unittest.TestCase):
                 self.assertEqual(f, 300000)
                 self.assertEqual(ff, 0.041656)
 
+    def test_factor_divide(self):
+        "from Koller, Friedman 2009, p. 365"
+        Ab_Bc, prod = self.AB.product(self.BC)
+        Ab = Ab_Bc.divide(self.BC)
+        for sm in Ab.scope_products:
+            sms = set(sm)
+            ab = set([s for s in sms if s[0] in ("A", "B")])
+            self.assertAlmostEqual(Ab.phi(sms), self.AB.phi(ab))
+        with self.assertRaises(TypeError):
+            Ab_Bc.divide(2)
+
+    def test_safe_divide(self):
+        ""
+        self.assertEqual(safe_divide(0, 0), 0.0)
+        self.assertEqual(safe_divide(1.0, 4.0), 0.25)
+
+    def test_factor_product_evaluations(self):
+        "each factor function is evaluated once per member of its domain"
+        calls = {"AB": 0, "BC": 0}
+
+        def phiAB(scope_product):
+            calls["AB"] += 1
+            return self.AB.phi(scope_product)
+
+        def phiBC(scope_product):
+            calls["BC"] += 1
+            return self.BC.phi(scope_product)
+
+        AB = Factor(gid="AB", scope_vars=set([self.Af, self.Bf]), factor_fn=phiAB)
+        BC = Factor(gid="BC", scope_vars=set([self.Bf, self.Cf]), factor_fn=phiBC)
+        calls["AB"] = 0
+        calls["BC"] = 0
+        ABC, prod = AB.product(BC)
+        self.assertEqual(calls, {"AB": 4, "BC": 4})
+        self.assertEqual(len(ABC.scope_products), 8)
+        self.assertEqual(ABC.phi(set([("A", 10), ("B", 50), ("C", 50)])), 500)
+        self.assertEqual(calls, {"AB": 4, "BC": 4})
+
+    def test_phi_encoded(self):
+        "an integer is decoded with the codec of the factor"
+        codec = self.aB.assignment_codec()
+        self.assertEqual(codec.var_ids, ["A", "B"])
+        for i in range(codec.size):
+            self.assertEqual(self.aB.phi(i), self.aB.phi(codec.decode(i)))
+        aB_c, prod = self.aB.product(self.bc)
+        e = aB_c.assignment_codec().assignment(0)
+        self.assertEqual(aB_c.phi(e), aB_c.phi(e.to_set()))
+
+    def test_phi_batch(self):
+        "each distinct assignment of the batch is evaluated once"
+        calls = {"AB": 0}
+
+        def phiAB(scope_product):
+            calls["AB"] += 1
+            return self.AB.phi(scope_product)
+
+        AB = Factor(gid="AB", scope_vars=set([self.Af, self.Bf]), factor_fn=phiAB)
+        codec = AB.assignment_codec()
+        rows = [[0, 1], [1, 0], [0, 1], [0, 1]]
+        calls["AB"] = 0
+        values = AB.phi_batch(rows)
+        self.assertEqual(calls["AB"], 2)
+        expected = [AB.phi(codec.encode_indices(r)) for r in rows]
+        self.assertEqual(values, expected)
+        normal = AB.phi_normal_batch(rows)
+        expected = [AB.phi_normal(codec.decode(codec.encode_indices(r))) for r in rows]
+        self.assertEqual(normal, expected)
+        logs = AB.log_phi_batch(rows)
+        self.assertEqual(logs, [math.log(v) for v in values])
+
+    def test_lazy_partition(self):
+        "Z is computed on first access and kept"
+        calls = {"AB": 0}
+
+        def phiAB(scope_product):
+            calls["AB"] += 1
+            return self.AB.phi(scope_product)
+
+        AB = Factor(gid="AB", scope_vars=set([self.Af, self.Bf]), factor_fn=phiAB)
+        self.assertEqual(calls["AB"], 0)
+        Z = AB.Z
+        self.assertEqual(calls["AB"], 4)
+        self.assertEqual(AB.Z, Z)
+        self.assertEqual(calls["AB"], 4)
+        AB.invalidate_partition()
+        self.assertEqual(AB.Z, Z)
+        self.assertEqual(calls["AB"], 8)
+
+    def test_reduced_leaves_variables(self):
+        "reduction restricts the domain of the factor, not of its variables"
+        A_10 = self.AB.reduced(set([("A", 10)]))
+        self.assertEqual(self.Af.values(), [10, 50])
+        self.assertEqual(len(self.AB.scope_products), 4)
+        self.assertEqual(len(A_10.scope_products), 2)
+        Z_a = sum([self.AB.phi(set([("A", 10), ("B", b)])) for b in [10, 50]])
+        self.assertEqual(A_10.Z, Z_a)
+        A_50 = self.AB.reduced(set([("A", 50)]))
+        self.assertEqual(A_50.domain_of(self.Af), [50])
+        self.assertEqual(A_10.domain_of(self.Af), [10])
+        self.assertEqual(A_10.assignment_codec().size, 2)
+
     def test_reduced_by_value(self):
         "from Koller, Friedman 2009, p. 111 figure 4.5"
         red = set([("C", 10)])
@@ -428,5 +552,35 @@ class TestFactor(unittest.TestCase):
                 self.assertEqual(f, 0.21)
 
 
+    def test_maxout_var_argmax(self):
+        "from Koller, Friedman 2009, p. 555 figure 13.1"
+        aB_c, prod = self.aB.product(self.bc)
+        a_c, argmax = aB_c.maxout_var(self.Bf, with_argmax=True)
+        self.assertEqual(round(a_c.phi(set([("C", 50), ("A", 10)])), 4), 0.35)
+        self.assertEqual(argmax(set([("C", 50), ("A", 10)])), ("B", 10))
+        self.assertEqual(argmax(set([("C", 10), ("A", 20)])), ("B", 10))
+        a, argmax_a = self.aB.maxout_var(self.Bf, with_argmax=True)
+        self.assertEqual(argmax_a(set([("A", 10)])), ("B", 50))
+        self.assertEqual(argmax_a(set([("A", 50)])), ("B", 10))
+        self.assertEqual(argmax_a(set([("A", 20)])), ("B", 50))
+
+    def test_sumout_vars_evaluations(self):
+        "summed out factors evaluate a table instead of nested closures"
+        calls = {"n": 0}
+
+        def phi(scope_product):
+            calls["n"] += 1
+            return 1.0
+
+        f = Factor(
+            gid="f", scope_vars=set([self.Af, self.Bf, self.Cf]), factor_fn=phi
+        )
+        calls["n"] = 0
+        c = f.sumout_vars(set([self.Af, self.Bf]))
+        self.assertEqual(calls["n"], 8)
+        self.assertEqual(c.phi(set([("C", 10)])), 4.0)
+        self.assertEqual(calls["n"], 8)
+
+
 if __name__ == "__main__":
     unittest.main()
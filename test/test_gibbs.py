@@ -0,0 +1,177 @@
+"""!
+test for gibbs.py
+"""
+from gmodels.gibbs import GibbsSampler, split_r_hat, effective_sample_size
+from gmodels.tabularfactor import TabularFactor
+from gmodels.markov import MarkovNetwork
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+from random import Random
+import unittest
+
+
+class TestGibbsSampler(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        "a 3 x 3 grid"
+        idata = {"outcome-values": [True, False]}
+        cells = {}
+        for i in range(3):
+            for j in range(3):
+                cells[(i, j)] = NumCatRVariable(
+                    node_id=str(i) + str(j),
+                    input_data=idata,
+                    distribution=lambda x: 0.5,
+                )
+        edges = set()
+        factors = set()
+        for (i, j), x in cells.items():
+            factors.add(
+                TabularFactor(
+                    gid="u" + x.id(),
+                    scope_vars=[x],
+                    values=[1.0 + 0.1 * i, 1.0 + 0.1 * j],
+                )
+            )
+            for y in [cells.get((i + 1, j)), cells.get((i, j + 1))]:
+                if y is None:
+                    continue
+                edges.add(
+                    Edge(
+                        edge_id=x.id() + y.id(),
+                        edge_type=EdgeType.UNDIRECTED,
+                        start_node=x,
+                        end_node=y,
+                    )
+                )
+                factors.add(
+                    TabularFactor(
+                        gid=x.id() + y.id(),
+                        scope_vars=[x, y],
+                        values=[1.5, 1.0, 1.0, 1.5],
+                    )
+                )
+        self.cells = cells
+        self.grid = MarkovNetwork(
+            gid="grid", nodes=set(cells.values()), edges=edges, factors=factors
+        )
+
+    def test_checkerboard(self):
+        "variables of a block do not share a factor"
+        gibbs = GibbsSampler(self.grid)
+        self.assertEqual(
+            gibbs.blocks(),
+            [["00", "02", "11", "20", "22"], ["01", "10", "12", "21"]],
+        )
+        gibbs = GibbsSampler(self.grid, evidences=set([("11", False)]))
+        self.assertEqual(
+            sorted([sorted(b) for b in gibbs.blocks()]),
+            [["00", "02", "20", "22"], ["01", "10", "12", "21"]],
+        )
+
+    def test_marginals(self):
+        "marginals are close to the exact ones"
+        jt = self.grid.junction_tree()
+        jt.calibrate(set([("11", False)]))
+        gibbs = self.grid.gibbs_sampler(set([("11", False)]), burn_in=50, seed=3)
+        result = gibbs.run(nb_samples=3000, nb_chains=3, processes=False)
+        self.assertEqual(len(result.chains), 3)
+        self.assertEqual(len(result.chains[0]["00"]), 3000)
+        self.assertNotIn("11", result.chains[0])
+        marginals = result.marginals()
+        self.assertEqual(marginals["11"].phi(set([("11", False)])), 1.0)
+        for vid in ["00", "01", "22"]:
+            self.assertAlmostEqual(
+                marginals[vid].phi(set([(vid, True)])),
+                jt.marginal(vid).phi(set([(vid, True)])),
+                places=1,
+            )
+        diagnostics = result.diagnostics()
+        self.assertEqual(len(diagnostics), 8)
+        for r_hat, ess in diagnostics.values():
+            self.assertLess(r_hat, 1.1)
+            self.assertGreater(ess, 500)
+
+    def test_processes(self):
+        "chains in worker processes give the same samples for the same seed"
+        result = self.grid.gibbs_sampler(seed=5, thinning=2).run(
+            nb_samples=100, nb_chains=2, max_workers=2
+        )
+        expected = self.grid.gibbs_sampler(seed=5, thinning=2).run(
+            nb_samples=100, nb_chains=2, processes=False
+        )
+        self.assertEqual(result.chains, expected.chains)
+
+    def test_deterministic_factors(self):
+        "chains start from a state with positive probability"
+        idata = {"outcome-values": [0, 1]}
+        a, b, c = [
+            NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["A", "B", "C"]
+        ]
+        edges = set()
+        factors = set()
+        for x, y in [(a, b), (b, c)]:
+            edges.add(
+                Edge(
+                    edge_id=x.id() + y.id(),
+                    edge_type=EdgeType.UNDIRECTED,
+                    start_node=x,
+                    end_node=y,
+                )
+            )
+            factors.add(
+                TabularFactor(
+                    gid=x.id() + y.id(), scope_vars=[x, y], values=[1, 0, 0, 1]
+                )
+            )
+        chain = MarkovNetwork(
+            gid="abc", nodes=set([a, b, c]), edges=edges, factors=factors
+        )
+        for seed in range(20):
+            result = chain.gibbs_sampler(burn_in=5, seed=seed).run(
+                nb_samples=10, nb_chains=2, processes=False
+            )
+            for samples in result.chains:
+                self.assertEqual(list(samples["A"]), list(samples["B"]))
+                self.assertEqual(list(samples["B"]), list(samples["C"]))
+        result = chain.gibbs_sampler(set([("C", 1)]), seed=0).run(
+            nb_samples=10, nb_chains=1
+        )
+        self.assertEqual(result.marginal("A").phi(set([("A", 1)])), 1.0)
+        gibbs = GibbsSampler(chain, evidences=set([("A", 0), ("C", 1)]))
+        with self.assertRaises(ValueError):
+            gibbs.run(nb_samples=10, nb_chains=1)
+
+    def test_diagnostics(self):
+        ""
+        rng = Random(0)
+        independent = [[rng.random() for _ in range(1000)] for _ in range(4)]
+        self.assertAlmostEqual(split_r_hat(independent), 1.0, places=1)
+        self.assertGreater(effective_sample_size(independent[0]), 700)
+        # chains stuck at different values have not mixed
+        self.assertGreater(split_r_hat([[0.0, 0.1] * 50, [1.0, 1.1] * 50]), 2)
+        sticky = [float(i // 50) for i in range(1000)]
+        self.assertLess(effective_sample_size(sticky), 100)
+        with self.assertRaises(ValueError):
+            split_r_hat([[1.0, 2.0]])
+
+    def test_errors(self):
+        ""
+        with self.assertRaises(ValueError):
+            GibbsSampler(self.grid, thinning=0)
+        with self.assertRaises(ValueError):
+            GibbsSampler(self.grid, evidences=set([("00", 2)]))
+        result = GibbsSampler(self.grid, set([("11", True)])).run(
+            nb_samples=10, nb_chains=1
+        )
+        with self.assertRaises(ValueError):
+            result.r_hat("11")
+        with self.assertRaises(ValueError):
+            result.marginal("x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""!
+test for inferencesession.py
+"""
+from gmodels.inferencesession import InferenceSession
+from gmodels.tabularfactor import TabularFactor, LogTabularFactor
+from gmodels.pgmodel import PGModel
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+import unittest
+
+
+class TestInferenceSession(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        "a chain a - b - c - d - e of pairwise factors"
+        idata = {"outcome-values": [True, False]}
+        self.vs = [
+            NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["a", "b", "c", "d", "e"]
+        ]
+        edges = set()
+        factors = set([TabularFactor(gid="a", scope_vars=[self.vs[0]], values=[0.6, 0.4])])
+        tables = [[0.9, 0.1, 0.2, 0.8], [0.3, 0.7, 0.5, 0.5], [0.6, 0.4, 0.1, 0.9]]
+        tables.append([0.25, 0.75, 0.5, 0.5])
+        for x, y, values in zip(self.vs, self.vs[1:], tables):
+            edges.add(
+                Edge(
+                    edge_id=x.id() + y.id(),
+                    edge_type=EdgeType.UNDIRECTED,
+                    start_node=x,
+                    end_node=y,
+                )
+            )
+            factors.add(
+                TabularFactor(gid=x.id() + y.id(), scope_vars=[x, y], values=values)
+            )
+        self.model = PGModel(
+            gid="chain", nodes=set(self.vs), edges=edges, factors=factors
+        )
+
+    def assertSameMarginals(self, session, evidences):
+        ""
+        jt = self.model.junction_tree()
+        jt.calibrate(evidences)
+        for v in self.vs:
+            expected = jt.marginal(v)
+            # observed variables keep a single value
+            self.assertEqual(session.marginal(v).domain_of(v), expected.domain_of(v))
+            for sp in expected.scope_products:
+                self.assertAlmostEqual(
+                    session.marginal(v).phi(set(sp)), expected.phi(set(sp))
+                )
+        self.assertAlmostEqual(
+            session.probability_of_evidence(), jt.probability_of_evidence()
+        )
+
+    def test_no_evidence(self):
+        ""
+        session = self.model.inference_session()
+        self.assertSameMarginals(session, set())
+        self.assertAlmostEqual(session.probability_of_evidence(), 1.0)
+
+    def test_set_evidence(self):
+        "Darwiche 2009, p. 140 for the first three variables"
+        session = self.model.inference_session()
+        session.set_evidence(self.vs[0], True)
+        self.assertAlmostEqual(session.marginal("c").phi(set([("c", True)])), 0.32)
+        session.set_evidence("e", False)
+        self.assertEqual(session.evidences(), set([("a", True), ("e", False)]))
+        self.assertSameMarginals(session, set([("a", True), ("e", False)]))
+
+    def test_retract_evidence(self):
+        ""
+        session = self.model.inference_session()
+        session.set_evidences(set([("a", True), ("c", False)]))
+        self.assertSameMarginals(session, set([("a", True), ("c", False)]))
+        session.retract_evidence("a")
+        self.assertSameMarginals(session, set([("c", False)]))
+        with self.assertRaises(ValueError):
+            session.retract_evidence("a")
+
+    def test_only_dirty_messages_are_recomputed(self):
+        ""
+        session = self.model.inference_session()
+        session.marginals()
+        nb_messages = len(session.dirty) + len(session.messages)
+        self.assertEqual(session.nb_messages, nb_messages)
+        self.assertEqual(len(session.dirty), 0)
+        # evidence at an end of the chain only changes messages leaving it
+        session.set_evidence("e", True)
+        self.assertEqual(len(session.dirty), nb_messages // 2)
+        session.nb_messages = 0
+        session.marginal("e")
+        self.assertEqual(session.nb_messages, 0)
+        session.marginal("a")
+        self.assertEqual(session.nb_messages, nb_messages // 2)
+        # setting the same value again changes nothing
+        session.set_evidence("e", True)
+        self.assertEqual(len(session.dirty), 0)
+
+    def test_log_space(self):
+        ""
+        session = self.model.inference_session(factor_type=LogTabularFactor)
+        session.set_evidence("b", False)
+        self.assertSameMarginals(session, set([("b", False)]))
+
+    def test_bad_evidence(self):
+        ""
+        session = self.model.inference_session()
+        with self.assertRaises(ValueError):
+            session.set_evidence("x", True)
+        with self.assertRaises(ValueError):
+            session.set_evidence("a", 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,256 @@
+"""!
+test for junctiontree.py
+"""
+from gmodels.junctiontree import JunctionTree, min_fill_triangulation
+from gmodels.tabularfactor import TabularFactor, LogTabularFactor
+from gmodels.factor import Factor
+from gmodels.pgmodel import PGModel
+from gmodels.bayesian import BayesianNetwork
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+from itertools import product
+import unittest
+
+
+class TestJunctionTree(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        """!
+        Chain from Darwiche 2009, p. 132, figure 6.4 and a loop over four
+        variables that needs a chord
+        """
+        idata = {"outcome-values": [True, False]}
+        self.a = NumCatRVariable(
+            node_id="a", input_data=idata, distribution=lambda x: 0.6 if x else 0.4
+        )
+        self.b = NumCatRVariable(node_id="b", input_data=idata, distribution=lambda x: 0.5)
+        self.c = NumCatRVariable(node_id="c", input_data=idata, distribution=lambda x: 0.5)
+        ab = Edge(
+            edge_id="ab",
+            edge_type=EdgeType.UNDIRECTED,
+            start_node=self.a,
+            end_node=self.b,
+        )
+        bc = Edge(
+            edge_id="bc",
+            edge_type=EdgeType.UNDIRECTED,
+            start_node=self.b,
+            end_node=self.c,
+        )
+        ba_f = TabularFactor(
+            gid="ba", scope_vars=[self.a, self.b], values=[0.9, 0.1, 0.2, 0.8]
+        )
+        cb_f = TabularFactor(
+            gid="cb", scope_vars=[self.b, self.c], values=[0.3, 0.7, 0.5, 0.5]
+        )
+        a_f = TabularFactor(gid="a", scope_vars=[self.a], values=[0.6, 0.4])
+        self.chain = PGModel(
+            gid="chain",
+            nodes=set([self.a, self.b, self.c]),
+            edges=set([ab, bc]),
+            factors=set([ba_f, cb_f, a_f]),
+        )
+        #
+        self.A = NumCatRVariable(node_id="A", input_data=idata, distribution=lambda x: 0.5)
+        self.B = NumCatRVariable(node_id="B", input_data=idata, distribution=lambda x: 0.5)
+        self.C = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [0, 1, 2]},
+            distribution=lambda x: 1 / 3,
+        )
+        self.D = NumCatRVariable(node_id="D", input_data=idata, distribution=lambda x: 0.5)
+        pairs = [(self.A, self.B), (self.B, self.C), (self.C, self.D), (self.D, self.A)]
+        edges = set()
+        factors = set()
+        for k, (x, y) in enumerate(pairs):
+            edges.add(
+                Edge(
+                    edge_id=x.id() + y.id(),
+                    edge_type=EdgeType.UNDIRECTED,
+                    start_node=x,
+                    end_node=y,
+                )
+            )
+            size = len(x.values()) * len(y.values())
+            factors.add(
+                TabularFactor(
+                    gid=x.id() + y.id(),
+                    scope_vars=[x, y],
+                    values=[float((k + 1) * (i % 3 + 1)) for i in range(size)],
+                )
+            )
+        self.loop_vars = [self.A, self.B, self.C, self.D]
+        self.loop_factors = factors
+        self.loop = PGModel(
+            gid="loop", nodes=set(self.loop_vars), edges=edges, factors=factors
+        )
+
+    def brute_force(self, factors, vs, evidence):
+        "marginals from the normalized product of all factors"
+        joint = {}
+        for values in product(*[v.values() for v in vs]):
+            assignment = set(zip([v.id() for v in vs], values))
+            if any(e not in assignment for e in evidence):
+                continue
+            p = 1.0
+            for f in factors:
+                p *= f.phi(set([s for s in assignment if s[0] in f.var_of]))
+            joint[tuple(values)] = p
+        Z = sum(joint.values())
+        marginals = {}
+        for i, v in enumerate(vs):
+            for values, p in joint.items():
+                key = (v.id(), values[i])
+                marginals[key] = marginals.get(key, 0.0) + p / Z
+        return marginals
+
+    def test_min_fill_triangulation(self):
+        ""
+        adjacency = {"A": {"B", "D"}, "B": {"A", "C"}, "C": {"B", "D"}, "D": {"A", "C"}}
+        order, chordal = min_fill_triangulation(adjacency)
+        self.assertEqual(sorted(order), ["A", "B", "C", "D"])
+        self.assertEqual(adjacency["A"], {"B", "D"})
+        nb_edges = sum([len(ns) for ns in chordal.values()]) // 2
+        self.assertEqual(nb_edges, 5)
+
+    def test_cliques(self):
+        ""
+        jt = self.loop.junction_tree()
+        self.assertEqual(len(jt.cliques), 2)
+        self.assertTrue(all(len(c) == 3 for c in jt.cliques))
+        self.assertEqual(len(jt.separators), 1)
+        sep = list(jt.separators.values())[0]
+        self.assertEqual(len(sep), 2)
+
+    def test_chain_marginals(self):
+        "Darwiche 2009, p. 140"
+        jt = self.chain.junction_tree()
+        jt.calibrate(set([("a", True)]))
+        c = jt.marginal(self.c)
+        self.assertAlmostEqual(c.phi(set([("c", True)])), 0.32)
+        self.assertAlmostEqual(c.phi(set([("c", False)])), 0.68)
+        self.assertAlmostEqual(jt.probability_of_evidence(), 0.6)
+        self.assertEqual(jt.marginal("a").phi(set([("a", True)])), 1.0)
+
+    def test_recalibrate(self):
+        ""
+        jt = self.chain.junction_tree()
+        jt.calibrate(set([("a", True)]))
+        first = jt.marginal(self.c)
+        self.assertIs(jt.marginal(self.c), first)
+        jt.calibrate(set([("a", False)]))
+        c = jt.marginal(self.c)
+        self.assertIsNot(c, first)
+        self.assertAlmostEqual(c.phi(set([("c", True)])), 0.2 * 0.3 + 0.8 * 0.5)
+        self.assertAlmostEqual(jt.probability_of_evidence(), 0.4)
+
+    def test_loop_marginals(self):
+        ""
+        evidence = set([("C", 2)])
+        expected = self.brute_force(self.loop_factors, self.loop_vars, evidence)
+        for factor_type in [TabularFactor, LogTabularFactor]:
+            jt = self.loop.junction_tree(factor_type=factor_type)
+            jt.calibrate(evidence)
+            marginals = jt.marginals()
+            self.assertEqual(sorted(marginals), ["A", "B", "C", "D"])
+            for (vid, value), p in expected.items():
+                self.assertAlmostEqual(marginals[vid].phi(set([(vid, value)])), p)
+
+    def test_calibrated_separators(self):
+        "neighbouring beliefs agree on their separator"
+        jt = self.loop.junction_tree()
+        beliefs = jt.calibrated_beliefs()
+        for (i, j), sep in jt.separators.items():
+            sids = set([v.id() for v in sep])
+            mi, mj = beliefs[i], beliefs[j]
+            for v in jt.cliques[i]:
+                if v.id() not in sids:
+                    mi = mi.sumout_var(v)
+            for v in jt.cliques[j]:
+                if v.id() not in sids:
+                    mj = mj.sumout_var(v)
+            for sp in mi.scope_products:
+                self.assertAlmostEqual(mi.phi(set(sp)), mj.phi(set(sp)))
+
+    def test_joint_marginal(self):
+        ""
+        jt = self.chain.junction_tree()
+        ab = jt.joint_marginal(set([self.a, self.b]))
+        self.assertAlmostEqual(ab.phi(set([("a", True), ("b", True)])), 0.54)
+        with self.assertRaises(ValueError):
+            jt.joint_marginal(set([self.a, self.c]))
+
+    def test_function_factors(self):
+        ""
+        fs = set(
+            [
+                Factor(gid=f.id(), scope_vars=f.scope_vars(), factor_fn=f.phi)
+                for f in self.chain.factors()
+            ]
+        )
+        model = PGModel(
+            gid="m", nodes=self.chain.nodes(), edges=self.chain.edges(), factors=fs
+        )
+        jt = model.junction_tree()
+        jt.calibrate(set([("a", True)]))
+        self.assertAlmostEqual(jt.marginal(self.c).phi(set([("c", True)])), 0.32)
+
+    def test_bayesian_network(self):
+        "same query as BayesianNetworkTest.test_conditional_inference, normalized"
+        C = NumCatRVariable(
+            node_id="C", input_data={"outcome-values": [True, False]},
+            distribution=lambda x: 0.5,
+        )
+        E = NumCatRVariable(
+            node_id="E", input_data={"outcome-values": [True, False]},
+            distribution=lambda x: 0.5,
+        )
+        F = NumCatRVariable(
+            node_id="F", input_data={"outcome-values": [True, False]},
+            distribution=lambda x: 0.5,
+        )
+        CE = Edge(edge_id="CE", start_node=C, end_node=E, edge_type=EdgeType.DIRECTED)
+        EF = Edge(edge_id="EF", start_node=E, end_node=F, edge_type=EdgeType.DIRECTED)
+        bn = BayesianNetwork(
+            gid="bn",
+            nodes=set([C, E, F]),
+            edges=set([CE, EF]),
+            factors=set(
+                [
+                    TabularFactor(gid="c", scope_vars=[C], values=[0.8, 0.2]),
+                    TabularFactor(gid="ce", scope_vars=[C, E], values=[0.9, 0.1, 0.7, 0.3]),
+                    TabularFactor(gid="ef", scope_vars=[E, F], values=[0.9, 0.1, 0.5, 0.5]),
+                ]
+            ),
+        )
+        jt = bn.junction_tree()
+        jt.calibrate(set([("F", True)]))
+        self.assertAlmostEqual(
+            jt.marginal(E).phi(set([("E", True)])), 0.774 / (0.774 + 0.07)
+        )
+        self.assertAlmostEqual(jt.probability_of_evidence(), 0.774 + 0.07)
+
+    def test_bad_evidence(self):
+        ""
+        jt = self.chain.junction_tree()
+        with self.assertRaises(ValueError):
+            jt.calibrate(set([("x", True)]))
+        with self.assertRaises(ValueError):
+            jt.calibrate(set([("a", 3)]))
+
+    def test_zero_probability_evidence(self):
+        ""
+        a_f = TabularFactor(gid="a", scope_vars=[self.a], values=[1.0, 0.0])
+        fs = set([f for f in self.chain.factors() if f.id() != "a"] + [a_f])
+        model = PGModel(
+            gid="m", nodes=self.chain.nodes(), edges=self.chain.edges(), factors=fs
+        )
+        jt = model.junction_tree()
+        with self.assertRaises(ValueError):
+            jt.calibrate(set([("a", False)]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+"""!
+test for meanfield.py
+"""
+from gmodels.meanfield import MeanField
+from gmodels.tabularfactor import TabularFactor
+from gmodels.markov import MarkovNetwork
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+from itertools import product
+import math
+import unittest
+
+
+class TestMeanField(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        "a 3 x 3 grid"
+        idata = {"outcome-values": [True, False]}
+        cells = {}
+        for i in range(3):
+            for j in range(3):
+                cells[(i, j)] = NumCatRVariable(
+                    node_id=str(i) + str(j),
+                    input_data=idata,
+                    distribution=lambda x: 0.5,
+                )
+        edges = set()
+        factors = set()
+        for (i, j), x in cells.items():
+            factors.add(
+                TabularFactor(
+                    gid="u" + x.id(),
+                    scope_vars=[x],
+                    values=[1.0 + 0.1 * i, 1.0 + 0.1 * j],
+                )
+            )
+            for y in [cells.get((i + 1, j)), cells.get((i, j + 1))]:
+                if y is None:
+                    continue
+                edges.add(
+                    Edge(
+                        edge_id=x.id() + y.id(),
+                        edge_type=EdgeType.UNDIRECTED,
+                        start_node=x,
+                        end_node=y,
+                    )
+                )
+                factors.add(
+                    TabularFactor(
+                        gid=x.id() + y.id(),
+                        scope_vars=[x, y],
+                        values=[1.2, 1.0, 1.0, 1.2],
+                    )
+                )
+        self.cells = cells
+        self.grid = MarkovNetwork(
+            gid="grid", nodes=set(cells.values()), edges=edges, factors=factors
+        )
+
+    def test_marginals(self):
+        "weak couplings give marginals close to the exact ones"
+        jt = self.grid.junction_tree()
+        jt.calibrate(set([("11", False)]))
+        mf = self.grid.mean_field(tolerance=1e-10)
+        self.assertTrue(mf.run(set([("11", False)])))
+        marginals = mf.marginals()
+        self.assertEqual(len(marginals), 9)
+        self.assertEqual(marginals["11"].phi(set([("11", False)])), 1.0)
+        for vid, m in marginals.items():
+            if vid == "11":
+                continue
+            self.assertAlmostEqual(
+                m.phi(set([(vid, True)])),
+                jt.marginal(vid).phi(set([(vid, True)])),
+                places=2,
+            )
+
+    def test_elbo(self):
+        "the lower bound increases at each iteration and stays below ln Z"
+        ids = sorted(self.grid.V)
+        z = 0.0
+        for values in product([True, False], repeat=len(ids)):
+            assignment = set(zip(ids, values))
+            p = 1.0
+            for f in self.grid.factors():
+                p *= f.phi(assignment)
+            z += p
+        log_z = math.log(z)
+        mf = MeanField(self.grid, tolerance=1e-12, max_iterations=50)
+        self.assertTrue(mf.run())
+        self.assertEqual(len(mf.elbo), len(mf.stats))
+        for before, after in zip(mf.elbo, mf.elbo[1:]):
+            self.assertGreaterEqual(after, before - 1e-12)
+        self.assertLess(mf.elbo[-1], log_z)
+        self.assertGreater(mf.elbo[-1], log_z - 0.1)
+
+    def test_query_engine(self):
+        "engines are swapped by configuration"
+        c = self.cells[(0, 0)]
+        evidences = set([("22", True)])
+        exact, _ = self.grid.cond_prod(set([c]), evidences)
+        expected, _ = self.grid.cond_prod_by_variable_elimination(set([c]), evidences)
+        self.assertEqual(
+            exact.phi(set([("00", True)])), expected.phi(set([("00", True)]))
+        )
+        self.grid.set_query_engine("mean-field", tolerance=1e-10)
+        queries = set([c, self.cells[(0, 1)]])
+        phi, alpha = self.grid.cond_prod(queries, evidences)
+        self.assertEqual(set(phi.var_of), set(["00", "01"]))
+        self.assertAlmostEqual(sum(phi.table_values()), 1.0)
+        mf = self.grid.mean_field(tolerance=1e-10)
+        mf.run(evidences)
+        self.assertAlmostEqual(
+            phi.phi(set([("00", True), ("01", True)])),
+            mf.marginal("00").phi(set([("00", True)]))
+            * mf.marginal("01").phi(set([("01", True)])),
+        )
+        # the result is cached
+        self.assertIs(self.grid.cond_prod(queries, evidences)[0], phi)
+        single = set([c])
+        mf, _ = self.grid.cond_prod(single, evidences)
+        # the query set of the caller is not consumed
+        self.assertEqual(single, set([c]))
+        self.assertAlmostEqual(
+            mf.phi(set([("00", True)])),
+            expected.phi_normal(set([("00", True)])),
+            places=2,
+        )
+        with self.assertRaises(ValueError):
+            self.grid.set_query_engine("sampling")
+
+    def test_zero_entries(self):
+        "a zero entry excludes values that its other variables make certain"
+        a, b = self.cells[(0, 0)], self.cells[(0, 1)]
+        model = MarkovNetwork(
+            gid="equal",
+            nodes=set([a, b]),
+            edges=set(
+                [
+                    Edge(
+                        edge_id="ab",
+                        edge_type=EdgeType.UNDIRECTED,
+                        start_node=a,
+                        end_node=b,
+                    )
+                ]
+            ),
+            factors=set(
+                [
+                    TabularFactor(gid="ab", scope_vars=[a, b], values=[1, 0, 0, 1]),
+                    TabularFactor(gid="a", scope_vars=[a], values=[0.3, 0.7]),
+                ]
+            ),
+        )
+        mf = model.mean_field()
+        self.assertTrue(mf.run(set([("00", True)])))
+        self.assertEqual(mf.marginal("01").phi(set([("01", True)])), 1.0)
+        self.assertEqual(mf.elbo[-1], math.log(0.3))
+
+    def test_deterministic_factors(self):
+        "uniform marginals exclude every value of B in an equality chain"
+        idata = {"outcome-values": [0, 1]}
+        a, b, c = [
+            NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["A", "B", "C"]
+        ]
+        edges = set()
+        factors = set()
+        for x, y in [(a, b), (b, c)]:
+            edges.add(
+                Edge(
+                    edge_id=x.id() + y.id(),
+                    edge_type=EdgeType.UNDIRECTED,
+                    start_node=x,
+                    end_node=y,
+                )
+            )
+            factors.add(
+                TabularFactor(
+                    gid=x.id() + y.id(), scope_vars=[x, y], values=[1, 0, 0, 1]
+                )
+            )
+        chain = MarkovNetwork(
+            gid="abc", nodes=set([a, b, c]), edges=edges, factors=factors
+        )
+        mf = MeanField(chain)
+        self.assertTrue(mf.run())
+        values = [mf.marginal(vid).phi(set([(vid, 0)])) for vid in "ABC"]
+        self.assertIn(values, [[1.0, 1.0, 1.0], [0.0, 0.0, 0.0]])
+        self.assertEqual(mf.elbo[-1], 0.0)
+        self.assertTrue(mf.run(set([("C", 1)])))
+        self.assertEqual(mf.marginal("A").phi(set([("A", 1)])), 1.0)
+        with self.assertRaises(ValueError):
+            mf.run(set([("A", 0), ("C", 1)]))
+        chain.set_query_engine("mean-field")
+        phi, _ = chain.cond_prod(set([a]), set([("B", 1)]))
+        self.assertEqual(phi.phi(set([("A", 1)])), 1.0)
+
+    def test_errors(self):
+        ""
+        with self.assertRaises(ValueError):
+            MeanField(self.grid, max_iterations=0)
+        mf = MeanField(self.grid)
+        with self.assertRaises(ValueError):
+            mf.marginal("00")
+        with self.assertRaises(ValueError):
+            mf.run(set([("x", True)]))
+        with self.assertRaises(ValueError):
+            mf.marginal("x")
+
+
+if __name__ == "__main__":
+    unittest.main()
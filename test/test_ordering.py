@@ -0,0 +1,105 @@
+"""!
+test for ordering.py
+"""
+from gmodels.ordering import (
+    HEURISTICS,
+    elimination_order,
+    evaluate_order,
+    triangulate,
+)
+import unittest
+
+
+class TestOrdering(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        "a chain, a loop over four nodes and a 3 x 3 grid"
+        self.chain = {"a": {"b"}, "b": {"a", "c"}, "c": {"b", "d"}, "d": {"c"}}
+        self.loop = {
+            "A": {"B", "D"},
+            "B": {"A", "C"},
+            "C": {"B", "D"},
+            "D": {"A", "C"},
+        }
+        self.grid = {}
+        for i in range(3):
+            for j in range(3):
+                ns = set()
+                for di, dj in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                    if 0 <= i + di < 3 and 0 <= j + dj < 3:
+                        ns.add(str(i + di) + str(j + dj))
+                self.grid[str(i) + str(j)] = ns
+
+    def test_chain(self):
+        "trees are eliminated from their leaves without fill"
+        for heuristic in HEURISTICS:
+            eo = elimination_order(self.chain, heuristic)
+            self.assertEqual(sorted(eo.order), ["a", "b", "c", "d"])
+            self.assertEqual(eo.width, 1)
+        self.assertEqual(elimination_order(self.chain).order, ["a", "b", "c", "d"])
+
+    def test_adjacency_is_not_modified(self):
+        ""
+        for heuristic in HEURISTICS:
+            elimination_order(self.loop, heuristic)
+            self.assertEqual(self.loop["A"], {"B", "D"})
+            self.assertEqual(self.loop["B"], {"A", "C"})
+
+    def test_grid_width(self):
+        "the treewidth of a 3 x 3 grid is 3"
+        for heuristic in HEURISTICS:
+            eo = elimination_order(self.grid, heuristic)
+            self.assertEqual(len(eo.order), 9)
+            self.assertGreaterEqual(eo.width, 3)
+        self.assertEqual(elimination_order(self.grid, "min-fill").width, 3)
+
+    def test_variables(self):
+        "kept variables count as neighbours and are not eliminated"
+        eo = elimination_order(self.chain, "min-fill", variables=set(["b", "c"]))
+        self.assertEqual(sorted(eo.order), ["b", "c"])
+        self.assertEqual(eo.width, 2)
+        eo = elimination_order(self.chain, "max-cardinality", variables=set(["a"]))
+        self.assertEqual(eo.order, ["a"])
+
+    def test_weighted_min_fill(self):
+        "fill edges between large variables are avoided"
+        cards = {"A": 10, "B": 2, "C": 10, "D": 2}
+        eo = elimination_order(self.loop, "weighted-min-fill", cardinalities=cards)
+        # eliminating A or C connects B and D, the cheaper fill edge
+        self.assertIn(eo.order[0], ["A", "C"])
+        self.assertEqual(eo.cost, evaluate_order(self.loop, eo.order, cards).cost)
+
+    def test_max_cardinality_is_perfect_on_chordal_graphs(self):
+        ""
+        order = elimination_order(self.grid, "min-fill").order
+        chordal = triangulate(self.grid, order)
+        mcs = elimination_order(chordal, "max-cardinality").order
+        self.assertEqual(triangulate(chordal, mcs), chordal)
+
+    def test_evaluate_order(self):
+        ""
+        eo = evaluate_order(self.loop, ["A", "B", "C", "D"], {"C": 3})
+        self.assertEqual(eo.width, 2)
+        # cliques ABD, BCD, CD, D
+        self.assertEqual(eo.cost, 8 + 12 + 6 + 2)
+        self.assertEqual(evaluate_order(self.loop, []).width, -1)
+
+    def test_triangulate(self):
+        ""
+        chordal = triangulate(self.loop, ["A", "B", "C", "D"])
+        self.assertIn("D", chordal["B"])
+        self.assertNotIn("C", chordal["A"])
+        self.assertEqual(self.loop["B"], {"A", "C"})
+
+    def test_errors(self):
+        ""
+        with self.assertRaises(ValueError):
+            elimination_order(self.chain, "min-width")
+        with self.assertRaises(ValueError):
+            elimination_order(self.chain, "min-fill", variables=set(["x"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""!
+test for parallel.py
+"""
+from gmodels.parallel import ParallelInference, worker_state
+from gmodels.bayesian import BayesianNetwork
+from gmodels.tabularfactor import TabularFactor
+from gmodels.factor import Factor
+from gmodels.pgmodel import PGModel
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+import unittest
+
+
+def worker_model():
+    "class of the worker model and whether its factors are views"
+    model = worker_state["model"]
+    return type(model).__name__, all([f.is_view() for f in model.factors()])
+
+
+class TestParallelInference(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        "a chain a - b - c - d with function factors and tabular factors"
+        idata = {"outcome-values": [True, False]}
+        self.vs = [
+            NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["a", "b", "c", "d"]
+        ]
+        edges = set()
+        factors = set(
+            [
+                Factor(
+                    gid="a",
+                    scope_vars=set([self.vs[0]]),
+                    factor_fn=lambda s: 0.6 if ("a", True) in s else 0.4,
+                )
+            ]
+        )
+        tables = [[0.9, 0.1, 0.2, 0.8], [0.3, 0.7, 0.5, 0.5], [0.6, 0.4, 0.1, 0.9]]
+        for x, y, values in zip(self.vs, self.vs[1:], tables):
+            edges.add(
+                Edge(
+                    edge_id=x.id() + y.id(),
+                    edge_type=EdgeType.UNDIRECTED,
+                    start_node=x,
+                    end_node=y,
+                )
+            )
+            factors.add(
+                TabularFactor(gid=x.id() + y.id(), scope_vars=[x, y], values=values)
+            )
+        self.model = PGModel(
+            gid="chain", nodes=set(self.vs), edges=edges, factors=factors
+        )
+        self.rows = [[True, False], [False, False], [True, True], [False, True]] * 3
+
+    def assertSameFactor(self, f, g):
+        ""
+        self.assertEqual(set(f.var_of), set(g.var_of))
+        for sp in g.scope_products:
+            self.assertAlmostEqual(f.phi(set(sp)), g.phi(set(sp)))
+
+    def test_cond_prod_batch(self):
+        ""
+        a, d = self.vs[0], self.vs[3]
+        queries = set([self.vs[2]])
+        expected = self.model.cond_prod_batch(queries, [a, d], self.rows)
+        for use_shared_memory in [True, False]:
+            pi = ParallelInference(
+                self.model,
+                max_workers=2,
+                chunksize=5,
+                use_shared_memory=use_shared_memory,
+            )
+            with pi:
+                phis = pi.cond_prod_batch(queries, [a, d], self.rows)
+            self.assertEqual(len(phis), len(self.rows))
+            for phi, e in zip(phis, expected):
+                self.assertSameFactor(phi, e)
+                # results are factors over the variables of the model
+                self.assertIs(phi.var_of["c"], self.vs[2])
+
+    def test_cond_prod_many(self):
+        "Darwiche 2009, p. 140"
+        tasks = [
+            (set([self.vs[2]]), set([("a", True)])),
+            (set([self.vs[2]]), set([("a", False)])),
+            (set([self.vs[1], self.vs[3]]), set()),
+        ]
+        with self.model.parallel_inference(max_workers=2, chunksize=1) as pi:
+            phis = pi.cond_prod_many(tasks)
+        self.assertEqual(round(phis[0].phi_normal(set([("c", True)])), 4), 0.32)
+        self.assertEqual(round(phis[1].phi_normal(set([("c", True)])), 4), 0.46)
+        expected, _ = self.model.cond_prod_by_variable_elimination(*tasks[2])
+        self.assertSameFactor(phis[2], expected)
+
+    def test_model_class(self):
+        "workers rebuild a bayesian network, factors are views over the tables"
+        edges = set(
+            [
+                Edge(
+                    edge_id=e.id(),
+                    edge_type=EdgeType.DIRECTED,
+                    start_node=e.start(),
+                    end_node=e.end(),
+                )
+                for e in self.model.edges()
+            ]
+        )
+        model = BayesianNetwork(
+            gid="chain",
+            nodes=set(self.vs),
+            edges=edges,
+            factors=self.model.factors(),
+        )
+        a, c = self.vs[0], self.vs[2]
+        expected = model.cond_prod_batch(set([c]), [a], [[True], [False]])
+        for use_shared_memory in [True, False]:
+            with ParallelInference(
+                model, max_workers=1, use_shared_memory=use_shared_memory
+            ) as pi:
+                name, views = pi.executor.submit(worker_model).result()
+                phis = pi.cond_prod_batch(set([c]), [a], [[True], [False]])
+            self.assertEqual(name, "BayesianNetwork")
+            self.assertTrue(views)
+            for phi, e in zip(phis, expected):
+                self.assertSameFactor(phi, e)
+
+    def test_cancel(self):
+        ""
+        pi = ParallelInference(self.model, max_workers=1)
+        pi.cancel()
+        with self.assertRaises(ValueError):
+            pi.cond_prod_batch(set([self.vs[2]]), ["a"], [[True]])
+        with self.assertRaises(ValueError):
+            ParallelInference(self.model, chunksize=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
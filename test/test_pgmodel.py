@@ -5,6 +5,7 @@ Test probabilistic graph model
 from gmodels.pgmodel import PGModel, min_unmarked_neighbours
 from gmodels.gtypes.edge import Edge, EdgeType
 from gmodels.factor import Factor
+from gmodels.tabularfactor import TabularFactor, LogTabularFactor
 from gmodels.randomvariable import NumCatRVariable
 from uuid import uuid4
 import pdb
@@ -395,6 +396,68 @@ class PGModelTest(unittest.TestCase):
                 self.assertEqual(f, 0.68)
         self.assertTrue(s, 1.0)
 
+    def test_cond_prod_encoded_evidence(self):
+        ""
+        codec = self.pgm.assignment_codec([self.a])
+        ev = codec.assignment(codec.encode(set([("a", True)])))
+        p, a = self.pgm.cond_prod_by_variable_elimination(set([self.c]), ev)
+        self.assertEqual(round(p.phi_normal(set([("c", True), ("a", True)])), 4), 0.32)
+
+    def test_cond_prod_many_evidence_sets(self):
+        "evidence does not modify the variables of the model"
+        for a, expected in [(True, 0.32), (False, 0.46), (True, 0.32)]:
+            p, alpha = self.pgm.cond_prod_by_variable_elimination(
+                set([self.c]), set([("a", a)])
+            )
+            self.assertEqual(round(p.phi_normal(set([("c", True)])), 4), expected)
+        self.assertEqual(self.a.values(), [True, False])
+
+    def test_compiled_plan_is_reused(self):
+        ""
+        plan = self.pgm.compile_query(set([self.c]), set(["a"]))
+        self.assertEqual(plan.order, ("b",))
+        self.assertEqual(plan.evidence, frozenset(["a"]))
+        for a, expected in [(True, 0.32), (False, 0.46)]:
+            p, alpha = self.pgm.cond_prod_by_variable_elimination(
+                set([self.c]), set([("a", a)])
+            )
+            self.assertEqual(round(p.phi_normal(set([("c", True)])), 4), expected)
+        self.assertIs(self.pgm.compile_query(set([self.c]), set(["a"])), plan)
+        self.assertEqual(len(self.pgm.elimination_plans), 1)
+
+    def test_compiled_plan_keeps_graph(self):
+        "planning does not add fill edges to the model graph"
+        nb_edges = len(self.pgm_mpe.edges())
+        self.pgm_mpe.cond_prod_by_variable_elimination(
+            set([self.J]), set([("O", False)])
+        )
+        self.assertEqual(len(self.pgm_mpe.edges()), nb_edges)
+
+    def test_elimination_order(self):
+        "orderings do not add fill edges to the model graph"
+        nb_edges = len(self.pgm_mpe.edges())
+        eo = self.pgm_mpe.elimination_order()
+        self.assertEqual(sorted(eo.order), ["I", "J", "O", "X", "Y"])
+        self.assertEqual(eo.width, 2)
+        self.pgm_mpe.order_by_greedy_metric(
+            nodes=self.pgm_mpe.nodes(), s=min_unmarked_neighbours
+        )
+        self.assertEqual(len(self.pgm_mpe.edges()), nb_edges)
+
+    def test_cond_prod_with_ordering_fn(self):
+        ""
+        p, a = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", True)]), ordering_fn=min_unmarked_neighbours
+        )
+        self.assertEqual(round(p.phi_normal(set([("c", True)])), 4), 0.32)
+
+    def test_cond_prod_observed_query(self):
+        ""
+        p, a = self.pgm.cond_prod_by_variable_elimination(
+            set([self.a, self.c]), set([("a", True)])
+        )
+        self.assertAlmostEqual(p.phi_normal(set([("a", True), ("c", True)])), 0.32)
+
     def test_mpe_prob(self):
         """!
         From Darwiche 2009, p. 250
@@ -403,6 +466,115 @@ class PGModelTest(unittest.TestCase):
         prob = self.pgm_mpe.mpe_prob(evidences=ev)
         self.assertEqual(round(prob, 5), 0.23042)
 
+    def test_query_cache(self):
+        ""
+        first = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", True)])
+        )
+        again = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", True)])
+        )
+        self.assertIs(first, again)
+        other = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", False)])
+        )
+        self.assertIsNot(first, other)
+        info = self.pgm.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 2, 2))
+        # replacing factors empties the cache
+        self.pgm.set_factor_representation(TabularFactor)
+        p, _ = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", True)])
+        )
+        self.assertIsNot(p, first[0])
+        self.assertEqual(round(p.phi_normal(set([("c", True)])), 4), 0.32)
+        self.assertEqual(self.pgm.cache_info().currsize, 1)
+
+    def test_query_set_unchanged(self):
+        ""
+        queries = set([self.c])
+        self.pgm.cond_prod_by_variable_elimination(queries, set([("a", True)]))
+        self.assertEqual(queries, set([self.c]))
+
+    def test_query_cache_update_in(self):
+        "updating a factor in place empties the cache"
+        self.pgm.set_factor_representation(TabularFactor)
+        query = (set([self.c]), set([("a", True)]))
+        first, _ = self.pgm.cond_prod_by_variable_elimination(*query)
+        f = [f for f in self.pgm.factors() if set(f.var_of) == set(["b", "c"])][0]
+        c = TabularFactor(gid="c", scope_vars=[self.c], values=[2.0, 1.0])
+        f.multiply_in(c)
+        p, _ = self.pgm.cond_prod_by_variable_elimination(*query)
+        self.assertIsNot(p, first)
+        self.assertEqual(round(p.phi_normal(set([("c", True)])), 4), 0.4848)
+        self.assertEqual(self.pgm.cache_info().misses, 2)
+
+    def test_query_cache_replaced_factor(self):
+        "a new factor never has the signature of a dropped one"
+        self.pgm.set_factor_representation(TabularFactor)
+        query = (set([self.c]), set([("a", True)]))
+        self.pgm.cond_prod_by_variable_elimination(*query)
+        signature = self.pgm.model_signature()
+        f = [f for f in self.pgm.factors() if set(f.var_of) == set(["b", "c"])][0]
+        serial, version = f.serial, f.version()
+        c = TabularFactor(gid="c", scope_vars=[self.c], values=[2.0, 1.0])
+        g, _ = f.product(c)
+        self.pgm.Fs.remove(f)
+        del f
+        self.pgm.Fs.add(g)
+        self.assertGreater(g.serial, serial)
+        self.assertNotEqual(g.version(), version)
+        self.assertNotEqual(self.pgm.model_signature(), signature)
+        p, _ = self.pgm.cond_prod_by_variable_elimination(*query)
+        self.assertEqual(round(p.phi_normal(set([("c", True)])), 4), 0.4848)
+
+    def test_cond_prod_batch(self):
+        "Darwiche 2009, p. 140"
+        rows = [[True], [False], [True]]
+        phis = self.pgm.cond_prod_batch(set([self.c]), [self.a], rows)
+        self.assertEqual(len(phis), 3)
+        self.assertIs(phis[0], phis[2])
+        expected = [0.32, 0.46, 0.32]
+        for phi, p in zip(phis, expected):
+            self.assertEqual(round(phi.phi_normal(set([("c", True)])), 4), p)
+
+    def test_cond_prod_batch_same_as_single_queries(self):
+        ""
+        rows = [[True, False], [False, False], [True, True], [False, True]]
+        queries = set([self.J, self.X])
+        phis = self.pgm_mpe.cond_prod_batch(queries, [self.O, self.I], rows)
+        self.pgm_mpe.set_query_cache(maxsize=0)
+        for row, phi in zip(rows, phis):
+            single, _ = self.pgm_mpe.cond_prod_by_variable_elimination(
+                queries, set([("O", row[0]), ("I", row[1])])
+            )
+            for sp in single.scope_products:
+                self.assertAlmostEqual(phi.phi(set(sp)), single.phi(set(sp)))
+
+    def test_cond_prod_batch_errors(self):
+        ""
+        with self.assertRaises(ValueError):
+            self.pgm.cond_prod_batch(set([self.c]), [self.a], [[True, False]])
+        with self.assertRaises(ValueError):
+            self.pgm.cond_prod_batch(set([self.c]), [self.a], [[3]])
+        with self.assertRaises(ValueError):
+            self.pgm.cond_prod_batch(set([self.c]), ["x"], [[True]])
+
+    def test_query_cache_mpe(self):
+        ""
+        ev = set([("J", True), ("O", False)])
+        self.pgm_mpe.set_query_cache(maxsize=1)
+        first = self.pgm_mpe.max_product_ve(evidences=ev)
+        again = self.pgm_mpe.max_product_ve(evidences=ev)
+        self.assertIs(again[1], first[1])
+        # assignments are copied, modifying them does not change the cache
+        self.assertEqual(again[0], first[0])
+        self.assertIsNot(again[0], first[0])
+        again[0]["J"] = False
+        self.assertEqual(self.pgm_mpe.max_product_ve(evidences=ev)[0], first[0])
+        self.assertEqual(round(self.pgm_mpe.mpe_prob(evidences=ev), 5), 0.23042)
+        self.assertEqual(self.pgm_mpe.cache_info().hits, 3)
+
     def test_max_product_ve(self):
         """!
         From Darwiche 2009, p. 250
@@ -418,5 +590,24 @@ class PGModelTest(unittest.TestCase):
         self.assertTrue(cond)
 
 
+    def test_set_factor_representation(self):
+        """!
+        Same computations as in test_cond_prod_by_variable_elimination and
+        test_mpe_prob with factors in log space
+        """
+        self.pgm.set_factor_representation(LogTabularFactor)
+        self.assertTrue(
+            all([isinstance(f, LogTabularFactor) for f in self.pgm.factors()])
+        )
+        p, a = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", True)])
+        )
+        self.assertEqual(round(p.phi_normal(set([("c", True), ("a", True)])), 4), 0.32)
+        self.pgm_mpe.set_factor_representation(LogTabularFactor)
+        ev = set([("J", True), ("O", False)])
+        prob = self.pgm_mpe.mpe_prob(evidences=ev)
+        self.assertEqual(round(prob, 5), 0.23042)
+
+
 if __name__ == "__main__":
     unittest.main()
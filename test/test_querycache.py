@@ -0,0 +1,82 @@
+"""!
+test for querycache.py
+"""
+from gmodels.querycache import QueryCache, result_cost
+from gmodels.tabularfactor import TabularFactor
+from gmodels.randomvariable import NumCatRVariable
+import unittest
+
+
+class TestQueryCache(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        ""
+        idata = {"outcome-values": [True, False]}
+        self.a = NumCatRVariable(node_id="a", input_data=idata, distribution=lambda x: 0.5)
+        self.b = NumCatRVariable(node_id="b", input_data=idata, distribution=lambda x: 0.5)
+        self.ab = TabularFactor(
+            gid="ab", scope_vars=[self.a, self.b], values=[1, 2, 3, 4]
+        )
+
+    def test_query_key(self):
+        "keys do not depend on the iteration order of sets"
+        k1 = QueryCache.query_key("q", set([self.a, self.b]), set([("a", True), ("b", 1)]))
+        k2 = QueryCache.query_key("q", set(["b", "a"]), set([("b", 1), ("a", True)]))
+        self.assertEqual(k1, k2)
+        self.assertNotEqual(k1, QueryCache.query_key("p", set(["a", "b"]), set()))
+
+    def test_lru_eviction(self):
+        ""
+        cache = QueryCache(maxsize=2)
+        cache.put("x", 1)
+        cache.put("y", 2)
+        self.assertEqual(cache.get("x"), (True, 1))
+        cache.put("z", 3)
+        # y is the least recently used result
+        self.assertEqual(cache.get("y"), (False, None))
+        self.assertEqual(cache.get("x"), (True, 1))
+        self.assertEqual(cache.get("z"), (True, 3))
+        info = cache.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (3, 1, 2))
+
+    def test_cost_eviction(self):
+        ""
+        self.assertEqual(result_cost((self.ab, [self.ab], {"k": 1})), 8)
+        self.assertEqual(result_cost([("a", True)]), 1)
+        cache = QueryCache(maxsize=None, maxcost=10)
+        cache.put("x", self.ab)
+        cache.put("y", (self.ab, 1))
+        self.assertEqual(cache.cache_info().currcost, 8)
+        cache.put("z", self.ab)
+        self.assertEqual(cache.get("x"), (False, None))
+        self.assertEqual(cache.cache_info().currcost, 8)
+        # a result larger than the bound is not cached
+        cache.put("w", [self.ab, self.ab, self.ab])
+        self.assertEqual(cache.get("w"), (False, None))
+
+    def test_validate(self):
+        ""
+        cache = QueryCache()
+        cache.validate(1)
+        cache.put("x", 1)
+        cache.validate(1)
+        self.assertEqual(cache.get("x"), (True, 1))
+        cache.validate(2)
+        self.assertEqual(cache.get("x"), (False, None))
+        self.assertEqual(cache.cache_info().hits, 1)
+        cache.clear()
+        self.assertEqual(cache.cache_info().hits, 0)
+
+    def test_disabled(self):
+        ""
+        cache = QueryCache(maxsize=0)
+        cache.put("x", 1)
+        self.assertEqual(cache.get("x"), (False, None))
+        with self.assertRaises(ValueError):
+            QueryCache(maxsize=-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,297 @@
+"""!
+test for sampling.py
+"""
+from gmodels.sampling import ForwardSampler, LikelihoodWeighting
+from gmodels.sampling import topological_order
+from gmodels.bayesian import BayesianNetwork
+from gmodels.gtypes.digraph import DiGraph
+from gmodels.tabularfactor import TabularFactor
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+import unittest
+
+
+class SamplingTest(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        "C -> E, E -> D, E -> F from Darwiche 2009, p. 132"
+        idata = {"outcome-values": [True, False]}
+        self.C, self.E, self.D, self.F = [
+            NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["C", "E", "D", "F"]
+        ]
+        edges = set(
+            [
+                Edge(
+                    edge_id=x.id() + y.id(),
+                    start_node=x,
+                    end_node=y,
+                    edge_type=EdgeType.DIRECTED,
+                )
+                for x, y in [(self.C, self.E), (self.E, self.D), (self.E, self.F)]
+            ]
+        )
+        factors = set(
+            [
+                TabularFactor(gid="C_f", scope_vars=[self.C], values=[0.8, 0.2]),
+                TabularFactor(
+                    gid="CE_f", scope_vars=[self.C, self.E], values=[0.9, 0.1, 0.7, 0.3]
+                ),
+                TabularFactor(
+                    gid="DE_f", scope_vars=[self.E, self.D], values=[0.7, 0.3, 0.4, 0.6]
+                ),
+                TabularFactor(
+                    gid="FE_f", scope_vars=[self.E, self.F], values=[0.9, 0.1, 0.5, 0.5]
+                ),
+            ]
+        )
+        self.bayes = BayesianNetwork(
+            gid="b",
+            nodes=set([self.C, self.E, self.D, self.F]),
+            edges=edges,
+            factors=factors,
+        )
+
+
+class TestForwardSampler(SamplingTest):
+    """!
+    """
+
+    def test_topological_order(self):
+        ""
+        self.assertEqual(
+            topological_order(self.bayes.parent_ids()), ["C", "E", "D", "F"]
+        )
+        with self.assertRaises(ValueError):
+            topological_order({"a": set(["b"]), "b": set(["a"])})
+
+    def test_conditional_tables(self):
+        ""
+        sampler = self.bayes.forward_sampler(seed=1)
+        cpt = sampler.cpts["E"]
+        self.assertEqual(cpt.parents, ["C"])
+        self.assertEqual(cpt.domain, [True, False])
+        self.assertAlmostEqual(cpt.cdfs[1][0], 0.7)
+        self.assertEqual(cpt.cdfs[1][1], 1.0)
+
+    def test_frequencies(self):
+        "P(E = True) = 0.86 and P(F = True) = 0.844"
+        sampler = ForwardSampler(self.bayes, seed=3)
+        columns = sampler.sample(20000)
+        self.assertEqual(len(columns["F"]), 20000)
+        self.assertEqual(columns["F"].typecode, "B")
+        self.assertAlmostEqual(sampler.frequencies(columns, "E")[True], 0.86, places=1)
+        self.assertAlmostEqual(sampler.frequencies(columns, "F")[True], 0.844, places=1)
+        # C and E agree more often than by chance
+        agree = sum([c == e for c, e in zip(columns["C"], columns["E"])]) / 20000
+        self.assertAlmostEqual(agree, 0.8 * 0.9 + 0.2 * 0.3, places=1)
+
+    def test_seed(self):
+        ""
+        first = self.bayes.forward_sampler(seed=7).sample(100)
+        second = self.bayes.forward_sampler(seed=7).sample(100)
+        self.assertEqual(first, second)
+        chunks = list(self.bayes.forward_sampler(seed=7).chunks(250, chunksize=100))
+        self.assertEqual([len(c["C"]) for c in chunks], [100, 100, 50])
+        self.assertEqual(chunks[0], first)
+
+    def test_assignments(self):
+        ""
+        sampler = self.bayes.forward_sampler(seed=0)
+        samples = list(sampler.assignments(sampler.sample(3)))
+        self.assertEqual(len(samples), 3)
+        self.assertEqual(set([vid for vid, _ in samples[0]]), set("CEDF"))
+
+    def test_errors(self):
+        "a network without a distribution for each node cannot be sampled"
+        bayes = BayesianNetwork(
+            gid="b2",
+            nodes=set([self.C, self.E]),
+            edges=set(),
+            factors=set(
+                [TabularFactor(gid="C_f", scope_vars=[self.C], values=[0.0, 0.0])]
+            ),
+        )
+        with self.assertRaises(ValueError):
+            bayes.forward_sampler()
+
+
+class TestLikelihoodWeighting(SamplingTest):
+    """!
+    """
+
+    def test_estimates(self):
+        "P(E = True | F = True) = 0.774 / 0.844"
+        lw = self.bayes.likelihood_weighting(set([("F", True)]), seed=5)
+        estimates = list(
+            lw.estimates(set([self.E]), chunksize=5000, max_samples=20000)
+        )
+        self.assertEqual(
+            [e.nb_samples for e in estimates], [5000, 10000, 15000, 20000]
+        )
+        last = estimates[-1]
+        self.assertEqual(set(last.marginals), set(["E"]))
+        self.assertAlmostEqual(
+            last.marginals["E"].phi(set([("E", True)])), 0.917, places=2
+        )
+        self.assertAlmostEqual(last.evidence_probability, 0.844, places=2)
+        self.assertLess(last.ess, 20000)
+        self.assertGreater(last.ess, 15000)
+        self.assertLess(last.stderr, estimates[0].stderr)
+
+    def test_node_evidence(self):
+        "evidence in node data, as set by add_evidence"
+        self.F.add_evidence(True)
+        lw = LikelihoodWeighting(self.bayes, seed=5)
+        self.F.pop_evidence()
+        self.assertEqual(lw.evidence, {"F": 0})
+        estimate = lw.run(tolerance=0.005, chunksize=5000)
+        self.assertLess(estimate.stderr, 0.005)
+        self.assertEqual(set(estimate.marginals), set(["C", "E", "D"]))
+        self.assertAlmostEqual(
+            estimate.marginals["E"].phi(set([("E", True)])), 0.917, places=2
+        )
+
+    def test_proposal(self):
+        "a uniform proposal for E gives the same estimate with other weights"
+        lw = self.bayes.likelihood_weighting(
+            set([("F", True)]), proposal={"E": [0.5, 0.5]}, seed=2
+        )
+        estimate = lw.run(set(["E"]), tolerance=0.003, max_samples=200000)
+        self.assertAlmostEqual(
+            estimate.marginals["E"].phi(set([("E", True)])), 0.917, places=2
+        )
+        self.assertLess(estimate.ess, estimate.nb_samples)
+
+    def test_reduced_distribution(self):
+        "P(A = True | B = True) = 0.27 / 0.41 with the table of B reduced to B"
+        idata = {"outcome-values": [True, False]}
+        a, b = [
+            NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["A", "B"]
+        ]
+        b.add_evidence(True)
+        bayes = BayesianNetwork(
+            gid="ab",
+            nodes=set([a, b]),
+            edges=set(
+                [
+                    Edge(
+                        edge_id="AB",
+                        start_node=a,
+                        end_node=b,
+                        edge_type=EdgeType.DIRECTED,
+                    )
+                ]
+            ),
+            factors=set(
+                [
+                    TabularFactor(gid="A", scope_vars=[a], values=[0.3, 0.7]),
+                    TabularFactor(
+                        gid="B", scope_vars=[a, b], values=[0.9, 0.1, 0.2, 0.8]
+                    ).reduced_by_value(set([("B", True)])),
+                ]
+            ),
+        )
+        lw = bayes.likelihood_weighting(seed=1)
+        self.assertEqual(lw.cpts["B"].domain, [True, False])
+        estimate = lw.run(tolerance=0.003)
+        self.assertAlmostEqual(estimate.evidence_probability, 0.41, places=2)
+        self.assertAlmostEqual(
+            estimate.marginals["A"].phi(set([("A", True)])), 0.27 / 0.41, places=2
+        )
+
+    def test_from_digraph_evidence(self):
+        "node evidence reduces the distribution of B in from_digraph"
+        idata = {"outcome-values": [True, False]}
+        a = NumCatRVariable(
+            node_id="A", input_data=idata, distribution=lambda x: 0.5
+        )
+        b = NumCatRVariable(
+            node_id="B",
+            input_data=idata,
+            distribution=lambda x: 0.6 if x is True else 0.4,
+        )
+        b.add_evidence(True)
+        edge = Edge(
+            edge_id="AB", start_node=a, end_node=b, edge_type=EdgeType.DIRECTED
+        )
+        bayes = BayesianNetwork.from_digraph(
+            DiGraph(gid="ab", nodes=set([a, b]), edges=set([edge]))
+        )
+        estimate = bayes.likelihood_weighting(seed=1).run(tolerance=0.003)
+        # samples are weighted by P(B = True | A), not by one
+        self.assertAlmostEqual(estimate.evidence_probability, 0.6)
+        expected, _ = bayes.cond_prod_by_variable_elimination(
+            set([a]), set([("B", True)])
+        )
+        self.assertAlmostEqual(
+            estimate.marginals["A"].phi(set([("A", True)])),
+            expected.phi_normal(set([("A", True)])),
+            places=2,
+        )
+
+    def test_zero_probability_evidence(self):
+        "B is always True, every sample has zero weight given B = False"
+        idata = {"outcome-values": [True, False]}
+        a, b = [
+            NumCatRVariable(node_id=n, input_data=idata, distribution=lambda x: 0.5)
+            for n in ["A", "B"]
+        ]
+        bayes = BayesianNetwork(
+            gid="ab",
+            nodes=set([a, b]),
+            edges=set(
+                [
+                    Edge(
+                        edge_id="AB",
+                        start_node=a,
+                        end_node=b,
+                        edge_type=EdgeType.DIRECTED,
+                    )
+                ]
+            ),
+            factors=set(
+                [
+                    TabularFactor(gid="A", scope_vars=[a], values=[0.5, 0.5]),
+                    TabularFactor(
+                        gid="B", scope_vars=[a, b], values=[1.0, 0.0, 1.0, 0.0]
+                    ),
+                ]
+            ),
+        )
+        lw = bayes.likelihood_weighting(set([("B", False)]), seed=1)
+        with self.assertRaises(ValueError):
+            lw.run(chunksize=100)
+        with self.assertRaises(ValueError):
+            next(lw.estimates())
+
+    def test_min_ess(self):
+        "a single sample has a standard error of 0"
+        lw = self.bayes.likelihood_weighting(set([("F", True)]), seed=5)
+        estimate = lw.run(set(["E"]), tolerance=0.05, chunksize=1)
+        self.assertGreaterEqual(estimate.ess, 100)
+        estimate = lw.run(set(["E"]), tolerance=0.05, chunksize=1, min_ess=0)
+        self.assertEqual(estimate.nb_samples, 1)
+
+    def test_likelihood_errors(self):
+        ""
+        with self.assertRaises(ValueError):
+            self.bayes.likelihood_weighting(set([("F", 3)]))
+        with self.assertRaises(ValueError):
+            self.bayes.likelihood_weighting(set([("x", True)]))
+        with self.assertRaises(ValueError):
+            self.bayes.likelihood_weighting(
+                set([("F", True)]), proposal={"F": [0.5, 0.5]}
+            )
+        with self.assertRaises(ValueError):
+            self.bayes.likelihood_weighting(proposal={"E": [[0.5, 0.5]]})
+        lw = self.bayes.likelihood_weighting()
+        with self.assertRaises(ValueError):
+            next(lw.estimates(set(["x"])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,290 @@
+"""!
+test for sparsefactor.py
+"""
+from gmodels.sparsefactor import SparseFactor
+from gmodels.tabularfactor import TabularFactor
+from gmodels.factor import Factor
+from gmodels.pgmodel import PGModel
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+import unittest
+
+
+class TestSparseFactor(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        ""
+        # Koller, Friedman 2009 p. 107
+        self.af = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.Bf = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50]},
+            distribution=lambda x: 0.5,
+        )
+        self.Cf = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [10, 50]},
+            distribution=lambda x: 0.5,
+        )
+        self.aB_t = TabularFactor(
+            gid="ab",
+            scope_vars=[self.af, self.Bf],
+            values=[0.5, 0.8, 0.1, 0, 0.3, 0.9],
+        )
+        self.bc_t = TabularFactor(
+            gid="bc", scope_vars=[self.Bf, self.Cf], values=[0.5, 0.7, 0.1, 0.2]
+        )
+        self.aB = SparseFactor.from_factor(self.aB_t)
+        self.bc = SparseFactor.from_factor(self.bc_t)
+        # deterministic C = B
+        self.eq = SparseFactor(
+            gid="eq", scope_vars=[self.Bf, self.Cf], entries={0: 1.0, 3: 1.0}
+        )
+
+    def assertSameValues(self, f, g):
+        ""
+        self.assertEqual(len(f.scope_products), len(g.scope_products))
+        for sp in g.scope_products:
+            self.assertAlmostEqual(f.phi(set(sp)), g.phi(set(sp)))
+
+    def test_entries(self):
+        ""
+        self.assertEqual(self.aB.nnz(), 5)
+        self.assertTrue(self.aB.is_sparse())
+        self.assertFalse(self.aB_t.is_sparse())
+        self.assertEqual(self.aB.phi(set([("A", 50), ("B", 50)])), 0.0)
+        self.assertEqual(self.aB.phi(5), 0.9)
+        self.assertEqual(self.eq.density(), 0.5)
+
+    def test_zero_entries_dropped(self):
+        ""
+        f = SparseFactor(gid="f", scope_vars=[self.Bf], entries={0: 0.0, 1: 2.0})
+        self.assertEqual(f.entries, {1: 2.0})
+
+    def test_entry_out_of_range(self):
+        ""
+        with self.assertRaises(ValueError):
+            SparseFactor(gid="f", scope_vars=[self.Bf], entries={2: 1.0})
+
+    def test_from_factor_function(self):
+        ""
+        f = Factor(gid="f", scope_vars=set([self.af, self.Bf]), factor_fn=self.aB_t.phi)
+        self.assertSameValues(SparseFactor.from_factor(f), self.aB_t)
+
+    def test_to_dense(self):
+        ""
+        d = self.aB.to_dense()
+        self.assertEqual(type(d), TabularFactor)
+        self.assertEqual(d.table, [0.5, 0.8, 0.1, 0.0, 0.3, 0.9])
+
+    def test_zval(self):
+        ""
+        self.assertAlmostEqual(self.aB.Z, 2.6)
+
+    def test_normalized(self):
+        ""
+        n = self.aB.normalized()
+        self.assertAlmostEqual(n.Z, 1.0)
+        self.assertAlmostEqual(n.phi(set([("A", 10), ("B", 10)])), 0.5 / 2.6)
+
+    def test_max_value(self):
+        ""
+        self.assertEqual(self.aB.max_value(), set([("A", 20), ("B", 50)]))
+
+    def test_phi_batch(self):
+        ""
+        self.assertEqual(self.aB.phi_batch([[1, 1], [2, 1]]), [0.0, 0.9])
+
+    def test_factor_product(self):
+        "from Koller, Friedman 2009, p. 107, figure 4.3"
+        aB_c, prod = self.aB.product(self.bc)
+        self.assertTrue(aB_c.is_sparse())
+        self.assertEqual(aB_c.var_ids, ["A", "B", "C"])
+        self.assertEqual(aB_c.nnz(), 10)
+        self.assertEqual(prod, 0.0)
+        expected, eprod = self.aB_t.product(self.bc_t)
+        self.assertSameValues(aB_c, expected)
+
+    def test_product_with_dense(self):
+        ""
+        aB_c, prod = self.aB.product(self.bc_t)
+        self.assertTrue(aB_c.is_sparse())
+        self.assertSameValues(aB_c, self.aB_t.product(self.bc_t)[0])
+        # a dense factor leaves the product to the sparse one
+        aB_c, prod = self.aB_t.product(self.bc)
+        self.assertTrue(aB_c.is_sparse())
+        self.assertSameValues(aB_c, self.aB_t.product(self.bc_t)[0])
+
+    def test_product_skips_zeros(self):
+        ""
+        aB_c, prod = self.aB.product(self.eq)
+        self.assertEqual(aB_c.nnz(), 5)
+        self.assertAlmostEqual(aB_c.phi(set([("A", 20), ("B", 50), ("C", 50)])), 0.9)
+        self.assertEqual(aB_c.phi(set([("A", 20), ("B", 50), ("C", 10)])), 0.0)
+
+    def test_reduced_by_value(self):
+        ""
+        aB_c, prod = self.aB.product(self.bc)
+        nf = aB_c.reduced_by_value(context=set([("C", 10)]))
+        self.assertEqual(len(nf.scope_products), 6)
+        self.assertEqual(nf.nnz(), 5)
+        self.assertAlmostEqual(nf.phi(set([("A", 10), ("B", 50), ("C", 10)])), 0.08)
+        self.assertEqual(self.Cf.values(), [10, 50])
+
+    def test_sumout_var(self):
+        "from Koller, Friedman 2009, p. 297 figure 9.7"
+        aB_c, prod = self.aB.product(self.bc)
+        a_c = aB_c.sumout_var(self.Bf)
+        expected, eprod = self.aB_t.product(self.bc_t)
+        self.assertSameValues(a_c, expected.sumout_var(self.Bf))
+
+    def test_maxout_var(self):
+        "from Koller, Friedman 2009, p. 555 figure 13.1"
+        aB_c, prod = self.aB.product(self.bc)
+        a_c, argmax = aB_c.maxout_var(self.Bf, with_argmax=True)
+        expected, eprod = self.aB_t.product(self.bc_t)
+        e_c, eargmax = expected.maxout_var(self.Bf, with_argmax=True)
+        self.assertSameValues(a_c, e_c)
+        for sp in e_c.scope_products:
+            self.assertEqual(argmax(set(sp)), eargmax(set(sp)))
+
+    def test_maxout_var_missing_cell(self):
+        "assignments without entries keep the first value of the axis"
+        f = SparseFactor(gid="f", scope_vars=[self.af, self.Bf], entries={5: 1.0})
+        a, argmax = f.maxout_var(self.Bf, with_argmax=True)
+        self.assertEqual(a.phi(set([("A", 10)])), 0.0)
+        self.assertEqual(argmax(set([("A", 10)])), ("B", 10))
+        self.assertEqual(argmax(set([("A", 20)])), ("B", 50))
+
+    def test_sumout_var_not_in_scope(self):
+        ""
+        with self.assertRaises(ValueError):
+            self.aB.sumout_var(self.Cf)
+
+    def test_divide(self):
+        ""
+        b = SparseFactor(gid="b", scope_vars=[self.Bf], entries={0: 2.0})
+        q = self.aB.divide(b)
+        self.assertTrue(q.is_sparse())
+        self.assertEqual(q.nnz(), 3)
+        self.assertAlmostEqual(q.phi(set([("A", 20), ("B", 10)])), 0.15)
+        self.assertSameValues(q, self.aB_t.divide(b.to_dense()))
+
+    def test_multiply_in(self):
+        ""
+        b = TabularFactor(gid="b", scope_vars=[self.Bf], values=[2.0, 0.0])
+        self.assertIs(self.aB.multiply_in(b), self.aB)
+        self.assertEqual(self.aB.nnz(), 3)
+        self.assertAlmostEqual(self.aB.phi(set([("A", 20), ("B", 10)])), 0.6)
+        self.assertAlmostEqual(self.aB.Z, 1.8)
+        self.aB.divide_in(b)
+        self.assertAlmostEqual(self.aB.phi(set([("A", 20), ("B", 10)])), 0.3)
+        self.assertAlmostEqual(self.aB.Z, 0.9)
+
+    def test_table_api(self):
+        "sparse factors are never views, positions are codes"
+        self.assertFalse(self.aB.is_view())
+        self.assertEqual(self.aB.table_position(3), 3)
+        self.assertEqual(self.aB.table_positions(), list(range(6)))
+        self.aB.materialize()
+        self.assertEqual(self.aB.table_values(), [0.5, 0.8, 0.1, 0.0, 0.3, 0.9])
+        # A in [50, 20] starts at the third entry of the table
+        v = self.aB.view(domains=[[50, 20], [10, 50]], offset=2)
+        self.assertTrue(v.is_sparse())
+        self.assertEqual(v.table_values(), [0.1, 0.0, 0.3, 0.9])
+        self.assertEqual(v.nnz(), 3)
+        self.assertSameValues(
+            self.aB.reduced(set([("B", 50)])),
+            self.aB_t.reduced(set([("B", 50)])),
+        )
+
+    def test_values(self):
+        "a sparse factor made from a dense table like a tabular factor"
+        f = SparseFactor(
+            gid="ab",
+            scope_vars=[self.af, self.Bf],
+            values=[0.5, 0.8, 0.1, 0, 0.3, 0.9],
+        )
+        self.assertEqual(f.nnz(), 5)
+        self.assertSameValues(f, self.aB_t)
+        with self.assertRaises(ValueError):
+            SparseFactor(gid="b", scope_vars=[self.Bf], values=[1.0])
+
+    def test_update_in_larger_scope(self):
+        ""
+        with self.assertRaises(ValueError):
+            self.aB.multiply_in(self.bc)
+
+
+class TestSparseFactorInference(unittest.TestCase):
+    """!
+    Variable elimination over sparse factors
+    """
+
+    def setUp(self):
+        """!
+        Graph made from values of
+        Darwiche 2009, p. 132, figure 6.4
+        """
+        idata = {"outcome-values": [True, False]}
+        self.a = NumCatRVariable(
+            node_id="a", input_data=idata, distribution=lambda x: 0.6 if x else 0.4
+        )
+        self.b = NumCatRVariable(node_id="b", input_data=idata, distribution=lambda x: 0.5)
+        self.c = NumCatRVariable(node_id="c", input_data=idata, distribution=lambda x: 0.5)
+        ab = Edge(
+            edge_id="ab",
+            edge_type=EdgeType.UNDIRECTED,
+            start_node=self.a,
+            end_node=self.b,
+        )
+        bc = Edge(
+            edge_id="bc",
+            edge_type=EdgeType.UNDIRECTED,
+            start_node=self.b,
+            end_node=self.c,
+        )
+        ba_f = TabularFactor(
+            gid="ba", scope_vars=[self.a, self.b], values=[0.9, 0.1, 0.2, 0.8]
+        )
+        cb_f = TabularFactor(
+            gid="cb", scope_vars=[self.b, self.c], values=[0.3, 0.7, 0.5, 0.5]
+        )
+        a_f = TabularFactor(gid="a", scope_vars=[self.a], values=[0.6, 0.4])
+        self.pgm = PGModel(
+            gid="pgm",
+            nodes=set([self.a, self.b, self.c]),
+            edges=set([ab, bc]),
+            factors=set([ba_f, cb_f, a_f]),
+        )
+
+    def test_cond_prod_by_variable_elimination(self):
+        """!
+        Test based on the computation in Darwiche 2009, p. 140
+        """
+        self.pgm.set_factor_representation(SparseFactor)
+        p, a = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", True)])
+        )
+        self.assertTrue(p.is_sparse())
+        self.assertAlmostEqual(p.phi_normal(set([("c", True), ("a", True)])), 0.32)
+        self.assertAlmostEqual(p.phi_normal(set([("c", False), ("a", True)])), 0.68)
+
+
+    def test_junction_tree(self):
+        "sparse clique beliefs, Darwiche 2009, p. 140"
+        jt = self.pgm.junction_tree(factor_type=SparseFactor)
+        jt.calibrate(set([("a", True)]))
+        c = jt.marginal(self.c)
+        self.assertTrue(c.is_sparse())
+        self.assertAlmostEqual(c.phi_normal(set([("c", True)])), 0.32)
+
+
+if __name__ == "__main__":
+    unittest.main()
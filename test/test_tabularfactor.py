@@ -0,0 +1,583 @@
+"""!
+test for tabularfactor.py
+"""
+from gmodels.tabularfactor import TabularFactor, broadcast_offsets
+from gmodels.assignmentcodec import strides_of
+from gmodels.tabularfactor import LogTabularFactor, logaddexp, logsumexp
+from gmodels.sparsefactor import SparseFactor
+from gmodels.factor import Factor
+from gmodels.pgmodel import PGModel
+from gmodels.randomvariable import NumCatRVariable
+from gmodels.gtypes.edge import Edge, EdgeType
+import unittest
+import math
+
+
+class TestTabularFactor(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        ""
+        # Koller, Friedman 2009 p. 107
+        self.af = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.Bf = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50]},
+            distribution=lambda x: 0.5,
+        )
+        self.Cf = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [10, 50]},
+            distribution=lambda x: 0.5,
+        )
+
+        def phiaB(scope_product):
+            ""
+            sfs = set(scope_product)
+            if sfs == set([("A", 10), ("B", 10)]):
+                return 0.5
+            elif sfs == set([("A", 10), ("B", 50)]):
+                return 0.8
+            elif sfs == set([("A", 50), ("B", 10)]):
+                return 0.1
+            elif sfs == set([("A", 50), ("B", 50)]):
+                return 0
+            elif sfs == set([("A", 20), ("B", 10)]):
+                return 0.3
+            elif sfs == set([("A", 20), ("B", 50)]):
+                return 0.9
+            else:
+                raise ValueError("unknown arg")
+
+        def phibc(scope_product):
+            ""
+            sfs = set(scope_product)
+            if sfs == set([("B", 10), ("C", 10)]):
+                return 0.5
+            elif sfs == set([("B", 10), ("C", 50)]):
+                return 0.7
+            elif sfs == set([("B", 50), ("C", 10)]):
+                return 0.1
+            elif sfs == set([("B", 50), ("C", 50)]):
+                return 0.2
+            else:
+                raise ValueError("unknown arg")
+
+        self.phiaB = phiaB
+        self.phibc = phibc
+        self.aB = TabularFactor(
+            gid="ab", scope_vars=set([self.af, self.Bf]), factor_fn=phiaB
+        )
+        self.bc = TabularFactor(
+            gid="bc", scope_vars=set([self.Bf, self.Cf]), factor_fn=phibc
+        )
+
+    def test_strides_of(self):
+        ""
+        self.assertEqual(strides_of([2, 3, 4]), [12, 4, 1])
+
+    def test_broadcast_offsets(self):
+        ""
+        offsets = broadcast_offsets([[0, 1], [0, 0, 0]])
+        self.assertEqual(offsets, [0, 0, 0, 1, 1, 1])
+
+    def test_axis_order(self):
+        ""
+        self.assertEqual(self.aB.var_ids, ["A", "B"])
+        f = TabularFactor(
+            gid="ba", scope_vars=[self.Bf, self.af], factor_fn=self.phiaB
+        )
+        self.assertEqual(f.var_ids, ["B", "A"])
+        self.assertEqual(f.phi(set([("A", 20), ("B", 50)])), 0.9)
+
+    def test_table(self):
+        ""
+        self.assertEqual(self.aB.table, [0.5, 0.8, 0.1, 0, 0.3, 0.9])
+
+    def test_table_size_mismatch(self):
+        ""
+        with self.assertRaises(ValueError):
+            TabularFactor(gid="t", scope_vars=set([self.Bf]), values=[1.0])
+
+    def test_default_marginal_table(self):
+        ""
+        f = TabularFactor(gid="t", scope_vars=set([self.af, self.Bf]))
+        g = Factor(gid="g", scope_vars=set([self.af, self.Bf]))
+        for sp in f.factor_domain():
+            self.assertAlmostEqual(f.phi(set(sp)), g.phi(set(sp)))
+
+    def test_from_factor(self):
+        ""
+        f = Factor(gid="f", scope_vars=set([self.af, self.Bf]), factor_fn=self.phiaB)
+        t = TabularFactor.from_factor(f)
+        self.assertEqual(t.id(), "f")
+        for sp in f.factor_domain():
+            self.assertEqual(t.phi(set(sp)), f.phi(set(sp)))
+
+    def test_phi_out_of_domain(self):
+        ""
+        with self.assertRaises(ValueError):
+            self.aB.phi(set([("A", 30), ("B", 10)]))
+
+    def test_phi_encoded(self):
+        ""
+        self.assertEqual(self.aB.phi(5), 0.9)
+        e = self.aB.assignment_codec().assignment(1)
+        self.assertEqual(self.aB.phi(e), 0.8)
+        with self.assertRaises(ValueError):
+            self.aB.phi(6)
+
+    def test_phi_batch(self):
+        ""
+        rows = [[0, 0], [2, 1], [1, 1], [2, 1]]
+        self.assertEqual(self.aB.phi_batch(rows), [0.5, 0.9, 0, 0.9])
+        normal = self.aB.phi_normal_batch([[0, 0]])
+        self.assertAlmostEqual(normal[0], 0.5 / 2.6)
+        self.assertEqual(self.aB.log_phi_batch([[1, 1]]), [float("-inf")])
+        with self.assertRaises(ValueError):
+            self.aB.phi_batch([[3, 0]])
+        with self.assertRaises(ValueError):
+            self.aB.phi_batch([[0]])
+
+    def test_zval(self):
+        ""
+        self.assertAlmostEqual(self.aB.Z, 2.6)
+
+    def test_normalized(self):
+        ""
+        n = self.aB.normalized()
+        self.assertAlmostEqual(sum(n.table), 1.0)
+        self.assertAlmostEqual(n.phi(set([("A", 10), ("B", 10)])), 0.5 / 2.6)
+
+    def test_max_value(self):
+        ""
+        self.assertEqual(self.aB.max_value(), set([("A", 20), ("B", 50)]))
+
+    def test_factor_product(self):
+        "from Koller, Friedman 2009, p. 107, figure 4.3"
+        aB_c, prod = self.aB.product(self.bc)
+        self.assertEqual(aB_c.var_ids, ["A", "B", "C"])
+        self.assertEqual(len(aB_c.scope_products), 12)
+        for p in aB_c.scope_products:
+            ps = set(p)
+            ab = set([s for s in ps if s[0] != "C"])
+            bc = set([s for s in ps if s[0] != "A"])
+            self.assertAlmostEqual(aB_c.phi(ps), self.phiaB(ab) * self.phibc(bc))
+
+    def test_product_with_factor(self):
+        ""
+        bc = Factor(gid="bc", scope_vars=set([self.Bf, self.Cf]), factor_fn=self.phibc)
+        aB_c, prod = self.aB.product(bc)
+        p = set([("A", 20), ("B", 10), ("C", 50)])
+        self.assertAlmostEqual(aB_c.phi(p), 0.21)
+
+    def test_reduced_by_value(self):
+        "from Koller, Friedman 2009, p. 111 figure 4.5"
+        aB_c, prod = self.aB.product(self.bc)
+        nf = aB_c.reduced_by_value(context=set([("C", 10)]))
+        sps = set([frozenset(s) for s in nf.scope_products])
+        self.assertEqual(len(sps), 6)
+        for p in nf.scope_products:
+            ps = set(p)
+            self.assertIn(("C", 10), ps)
+        self.assertAlmostEqual(nf.phi(set([("A", 10), ("B", 50), ("C", 10)])), 0.08)
+        self.assertAlmostEqual(nf.phi(set([("A", 20), ("B", 10), ("C", 10)])), 0.15)
+        # variables are left untouched
+        self.assertEqual(self.Cf.values(), [10, 50])
+
+    def test_reduced_view(self):
+        "reduction reads the parent table without copying it"
+        aB_c, prod = self.aB.product(self.bc)
+        nf = aB_c.reduced(set([("C", 10)]))
+        self.assertTrue(nf.is_view())
+        self.assertFalse(aB_c.is_view())
+        self.assertIs(nf.table, aB_c.table)
+        nnf = nf.reduced(set([("A", 20)]))
+        self.assertIs(nnf.table, aB_c.table)
+        for v, e in zip(nnf.linear_table(), [0.15, 0.09]):
+            self.assertAlmostEqual(v, e)
+        self.assertAlmostEqual(nnf.phi(set([("A", 20), ("B", 50), ("C", 10)])), 0.09)
+        self.assertAlmostEqual(nnf.Z, 0.24)
+        self.assertEqual(nnf.phi_batch([[0, 1, 0]]), [0.9 * 0.1])
+        self.assertEqual(nnf.max_value(), set([("A", 20), ("B", 10), ("C", 10)]))
+        b = nf.sumout_var(self.af).sumout_var(self.Bf)
+        self.assertAlmostEqual(b.phi(set([("C", 10)])), 0.62)
+        a_b, prod = nnf.product(self.aB)
+        self.assertAlmostEqual(a_b.phi(set([("A", 20), ("B", 10), ("C", 10)])), 0.045)
+        with self.assertRaises(ValueError):
+            nnf.phi(set([("A", 10), ("B", 10), ("C", 10)]))
+
+    def test_sumout_var(self):
+        "from Koller, Friedman 2009, p. 297 figure 9.7"
+        aB_c, prod = self.aB.product(self.bc)
+        a_c = aB_c.sumout_var(self.Bf)
+        self.assertEqual(a_c.var_ids, ["A", "C"])
+        expected = {
+            (10, 10): 0.33,
+            (10, 50): 0.51,
+            (50, 10): 0.05,
+            (50, 50): 0.07,
+            (20, 10): 0.24,
+            (20, 50): 0.39,
+        }
+        for (a, c), v in expected.items():
+            self.assertAlmostEqual(a_c.phi(set([("A", a), ("C", c)])), v)
+
+    def test_maxout_var(self):
+        "from Koller, Friedman 2009, p. 555 figure 13.1"
+        aB_c, prod = self.aB.product(self.bc)
+        a_c = aB_c.maxout_var(self.Bf)
+        expected = {
+            (10, 10): 0.25,
+            (10, 50): 0.35,
+            (50, 10): 0.05,
+            (50, 50): 0.07,
+            (20, 10): 0.15,
+            (20, 50): 0.21,
+        }
+        for (a, c), v in expected.items():
+            self.assertAlmostEqual(a_c.phi(set([("A", a), ("C", c)])), v)
+
+    def test_maxout_var_argmax(self):
+        ""
+        aB_c, prod = self.aB.product(self.bc)
+        a_c, argmax = aB_c.maxout_var(self.Bf, with_argmax=True)
+        self.assertEqual(argmax(set([("C", 50), ("A", 10)])), ("B", 10))
+        a, argmax_a = self.aB.maxout_var(self.Bf, with_argmax=True)
+        self.assertEqual(argmax_a(set([("A", 10)])), ("B", 50))
+        self.assertEqual(argmax_a(set([("A", 50)])), ("B", 10))
+        self.assertEqual(argmax_a(set([("A", 20)])), ("B", 50))
+        self.assertEqual(argmax(set([("C", 10), ("A", 50), ("D", 1)])), ("B", 10))
+
+    def test_sumout_var_not_in_scope(self):
+        ""
+        with self.assertRaises(ValueError):
+            self.aB.sumout_var(self.Cf)
+
+    def test_divide(self):
+        "from Koller, Friedman 2009, p. 365 figure 10.7"
+        a = TabularFactor(gid="a", scope_vars=[self.af], values=[0.8, 0.0, 0.6])
+        aB = TabularFactor(
+            gid="ab", scope_vars=[self.af, self.Bf], values=[0.5, 0.2, 0, 0, 0.3, 0.45]
+        )
+        q = aB.divide(a)
+        self.assertEqual(q.var_ids, ["A", "B"])
+        for v, e in zip(q.table, [0.625, 0.25, 0.0, 0.0, 0.5, 0.75]):
+            self.assertAlmostEqual(v, e)
+
+    def test_divide_by_sparse(self):
+        ""
+        b = SparseFactor(gid="b", scope_vars=[self.Bf], entries={0: 2.0})
+        q = self.aB.divide(b)
+        self.assertEqual(type(q), TabularFactor)
+        self.assertAlmostEqual(q.phi(set([("A", 20), ("B", 10)])), 0.15)
+        self.assertEqual(q.phi(set([("A", 20), ("B", 50)])), 0.0)
+
+    def test_multiply_in(self):
+        ""
+        b = TabularFactor(gid="b", scope_vars=[self.Bf], values=[2.0, 10.0])
+        table = self.aB.table
+        self.assertAlmostEqual(self.aB.Z, 2.6)
+        self.assertIs(self.aB.multiply_in(b), self.aB)
+        self.assertIs(self.aB.table, table)
+        self.assertAlmostEqual(self.aB.phi(set([("A", 20), ("B", 50)])), 9.0)
+        self.assertAlmostEqual(self.aB.Z, 1.0 + 8.0 + 0.2 + 0.6 + 9.0)
+        self.aB.divide_in(b)
+        self.assertAlmostEqual(self.aB.phi(set([("A", 20), ("B", 50)])), 0.9)
+        self.assertAlmostEqual(self.aB.Z, 2.6)
+
+    def test_divide_in_zero(self):
+        ""
+        b = TabularFactor(gid="b", scope_vars=[self.Bf], values=[0.0, 1.0])
+        self.aB.divide_in(b)
+        self.assertEqual(self.aB.phi(set([("A", 10), ("B", 10)])), 0.0)
+        self.assertAlmostEqual(self.aB.phi(set([("A", 10), ("B", 50)])), 0.8)
+
+    def test_update_in_view(self):
+        "a view copies its entries before it is updated"
+        aB_c, prod = self.aB.product(self.bc)
+        nf = aB_c.reduced(set([("C", 10)]))
+        ab = TabularFactor(
+            gid="ab", scope_vars=[self.af, self.Bf], values=[2, 2, 2, 2, 2, 2]
+        )
+        nf.multiply_in(ab)
+        self.assertFalse(nf.is_view())
+        self.assertIsNot(nf.table, aB_c.table)
+        self.assertAlmostEqual(nf.phi(set([("A", 10), ("B", 50), ("C", 10)])), 0.16)
+        self.assertAlmostEqual(aB_c.phi(set([("A", 10), ("B", 50), ("C", 10)])), 0.08)
+
+    def test_update_in_shared_view(self):
+        "views of an updated table drop their partition function"
+        r = self.aB.reduced(set([("B", 50)]))
+        self.assertAlmostEqual(r.Z, 1.7)
+        b = TabularFactor(gid="b", scope_vars=[self.Bf], values=[2.0, 10.0])
+        self.aB.multiply_in(b)
+        self.assertAlmostEqual(r.phi(set([("A", 20), ("B", 50)])), 9.0)
+        self.assertAlmostEqual(r.Z, 17.0)
+        self.assertAlmostEqual(r.phi_normal(set([("A", 20), ("B", 50)])), 9.0 / 17)
+
+    def test_update_in_larger_scope(self):
+        ""
+        with self.assertRaises(ValueError):
+            self.aB.multiply_in(self.bc)
+        with self.assertRaises(TypeError):
+            self.aB.multiply_in(2.0)
+
+    def test_update_in_missing_value(self):
+        ""
+        aB_c, prod = self.aB.product(self.bc)
+        c = aB_c.sumout_var(self.af).sumout_var(self.Bf).reduced(set([("C", 10)]))
+        with self.assertRaises(ValueError):
+            aB_c.multiply_in(c)
+
+
+class TestLogTabularFactor(unittest.TestCase):
+    """!
+    """
+
+    def setUp(self):
+        ""
+        self.A = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.B = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50]},
+            distribution=lambda x: 0.5,
+        )
+        self.C = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [10, 50]},
+            distribution=lambda x: 0.5,
+        )
+        # Koller, Friedman 2009 p. 107
+        self.aB = LogTabularFactor(
+            gid="ab", scope_vars=[self.A, self.B], values=[0.5, 0.8, 0.1, 0, 0.3, 0.9]
+        )
+        self.aB = LogTabularFactor.from_factor(
+            TabularFactor(
+                gid="ab",
+                scope_vars=[self.A, self.B],
+                values=[0.5, 0.8, 0.1, 0, 0.3, 0.9],
+            )
+        )
+        self.bc = LogTabularFactor.from_factor(
+            TabularFactor(
+                gid="bc", scope_vars=[self.B, self.C], values=[0.5, 0.7, 0.1, 0.2]
+            )
+        )
+
+    def test_log_phi_batch(self):
+        ""
+        f = LogTabularFactor.from_factor(self.aB)
+        rows = [[0, 0], [2, 1]]
+        self.assertAlmostEqual(f.log_phi_batch(rows)[1], math.log(0.9))
+        for v, e in zip(f.phi_batch(rows), [0.5, 0.9]):
+            self.assertAlmostEqual(v, e)
+        for v, e in zip(f.phi_normal_batch(rows), [0.5 / 2.6, 0.9 / 2.6]):
+            self.assertAlmostEqual(v, e)
+
+    def test_reduced_view(self):
+        ""
+        f = LogTabularFactor.from_factor(self.aB)
+        r = f.reduced(set([("B", 50)]))
+        self.assertIs(r.table, f.table)
+        self.assertAlmostEqual(r.phi(set([("A", 20), ("B", 50)])), 0.9)
+        self.assertAlmostEqual(r.Z, 1.7)
+        self.assertAlmostEqual(r.normalized().phi(set([("A", 10), ("B", 50)])), 0.8 / 1.7)
+
+    def test_logaddexp(self):
+        ""
+        self.assertAlmostEqual(logaddexp(math.log(2), math.log(3)), math.log(5))
+        self.assertEqual(logaddexp(float("-inf"), 1.0), 1.0)
+
+    def test_logsumexp(self):
+        ""
+        self.assertAlmostEqual(logsumexp([-1000.0, -1000.0]), -1000.0 + math.log(2))
+        self.assertEqual(logsumexp([float("-inf")]), float("-inf"))
+
+    def test_table_in_log_space(self):
+        ""
+        self.assertAlmostEqual(self.aB.log_phi(set([("A", 10), ("B", 50)])), math.log(0.8))
+        self.assertEqual(self.aB.log_phi(set([("A", 50), ("B", 50)])), float("-inf"))
+        self.assertAlmostEqual(self.aB.phi(set([("A", 10), ("B", 50)])), 0.8)
+        self.assertAlmostEqual(self.aB.Z, 2.6)
+
+    def test_sumout_var(self):
+        "from Koller, Friedman 2009, p. 297 figure 9.7"
+        aB_c, prod = self.aB.product(self.bc)
+        a_c = aB_c.sumout_var(self.B)
+        self.assertAlmostEqual(a_c.phi(set([("A", 10), ("C", 50)])), 0.51)
+        self.assertAlmostEqual(a_c.phi(set([("A", 20), ("C", 10)])), 0.24)
+
+    def test_maxout_var(self):
+        "from Koller, Friedman 2009, p. 555 figure 13.1"
+        aB_c, prod = self.aB.product(self.bc)
+        a_c = aB_c.maxout_var(self.B)
+        self.assertAlmostEqual(a_c.phi(set([("A", 10), ("C", 50)])), 0.35)
+        self.assertAlmostEqual(a_c.phi(set([("A", 50), ("C", 50)])), 0.07)
+
+    def test_product_with_linear_factor(self):
+        ""
+        bc = TabularFactor(
+            gid="bc", scope_vars=[self.B, self.C], values=[0.5, 0.7, 0.1, 0.2]
+        )
+        aB_c, prod = self.aB.product(bc)
+        self.assertIsInstance(aB_c, LogTabularFactor)
+        p = set([("A", 20), ("B", 10), ("C", 50)])
+        self.assertAlmostEqual(aB_c.phi(p), 0.21)
+
+    def test_divide(self):
+        ""
+        b = TabularFactor(gid="b", scope_vars=[self.B], values=[2.0, 0.0])
+        q = self.aB.divide(b)
+        self.assertIsInstance(q, LogTabularFactor)
+        self.assertAlmostEqual(q.phi(set([("A", 10), ("B", 10)])), 0.25)
+        self.assertEqual(q.log_phi(set([("A", 10), ("B", 50)])), float("-inf"))
+
+    def test_multiply_in(self):
+        ""
+        b = TabularFactor(gid="b", scope_vars=[self.B], values=[2.0, 10.0])
+        table = self.aB.table
+        self.aB.multiply_in(b)
+        self.assertIs(self.aB.table, table)
+        self.assertAlmostEqual(self.aB.phi(set([("A", 20), ("B", 50)])), 9.0)
+        self.assertAlmostEqual(self.aB.Z, 18.8)
+        self.aB.divide_in(b)
+        self.assertAlmostEqual(self.aB.phi(set([("A", 20), ("B", 50)])), 0.9)
+        self.assertAlmostEqual(self.aB.logZ, math.log(2.6))
+
+    def test_update_in_shared_view(self):
+        "views of an updated table drop their partition function"
+        r = self.aB.reduced(set([("B", 50)]))
+        self.assertAlmostEqual(r.logZ, math.log(1.7))
+        b = TabularFactor(gid="b", scope_vars=[self.B], values=[2.0, 10.0])
+        self.aB.multiply_in(b)
+        self.assertAlmostEqual(r.logZ, math.log(17.0))
+        self.assertAlmostEqual(r.Z, 17.0)
+
+    def test_no_underflow(self):
+        ""
+        small = TabularFactor(gid="s", scope_vars=[self.B, self.C], values=[1e-3] * 4)
+        linear = small
+        logf = LogTabularFactor.from_factor(small)
+        for i in range(400):
+            linear, v = linear.product(small)
+            logf, v = logf.product(small)
+        self.assertEqual(linear.phi(set([("B", 10), ("C", 10)])), 0.0)
+        self.assertAlmostEqual(
+            logf.log_phi(set([("B", 10), ("C", 10)])), 401 * math.log(1e-3)
+        )
+        b = logf.sumout_var(self.C)
+        self.assertAlmostEqual(
+            b.log_phi(set([("B", 10)])), 401 * math.log(1e-3) + math.log(2)
+        )
+        self.assertAlmostEqual(b.phi_normal(set([("B", 10)])), 0.5)
+
+
+class TestTabularFactorInference(unittest.TestCase):
+    """!
+    Variable elimination over tabular factors
+    """
+
+    def setUp(self):
+        """!
+        Graph made from values of
+        Darwiche 2009, p. 132, figure 6.4
+        """
+        idata = {"outcome-values": [True, False]}
+        self.a = NumCatRVariable(
+            node_id="a", input_data=idata, distribution=lambda x: 0.6 if x else 0.4
+        )
+        self.b = NumCatRVariable(
+            node_id="b", input_data=idata, distribution=lambda x: 0.5
+        )
+        self.c = NumCatRVariable(
+            node_id="c", input_data=idata, distribution=lambda x: 0.5
+        )
+        ab = Edge(
+            edge_id="ab",
+            edge_type=EdgeType.UNDIRECTED,
+            start_node=self.a,
+            end_node=self.b,
+        )
+        bc = Edge(
+            edge_id="bc",
+            edge_type=EdgeType.UNDIRECTED,
+            start_node=self.b,
+            end_node=self.c,
+        )
+        ba_f = TabularFactor(
+            gid="ba", scope_vars=[self.a, self.b], values=[0.9, 0.1, 0.2, 0.8]
+        )
+        cb_f = TabularFactor(
+            gid="cb", scope_vars=[self.b, self.c], values=[0.3, 0.7, 0.5, 0.5]
+        )
+        a_f = TabularFactor(gid="a", scope_vars=[self.a], values=[0.6, 0.4])
+        self.pgm = PGModel(
+            gid="pgm",
+            nodes=set([self.a, self.b, self.c]),
+            edges=set([ab, bc]),
+            factors=set([ba_f, cb_f, a_f]),
+        )
+
+    def test_sum_product_elimination(self):
+        """!
+        based on values of Darwiche 2009 p. 133
+        """
+        p = self.pgm.sum_product_elimination(
+            factors=self.pgm.factors(), Zs=[self.a, self.b]
+        )
+        self.assertAlmostEqual(p.phi(set([("c", True)])), 0.376)
+        self.assertAlmostEqual(p.phi(set([("c", False)])), 0.624)
+
+    def test_cond_prod_by_variable_elimination(self):
+        """!
+        Test based on the computation in Darwiche 2009, p. 140
+        """
+        p, a = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", True)])
+        )
+        self.assertAlmostEqual(p.phi_normal(set([("c", True), ("a", True)])), 0.32)
+        self.assertAlmostEqual(p.phi_normal(set([("c", False), ("a", True)])), 0.68)
+
+    def test_many_evidence_sets(self):
+        "the same model answers queries with different evidence"
+        for a, expected in [(True, 0.32), (False, 0.46), (True, 0.32)]:
+            p, alpha = self.pgm.cond_prod_by_variable_elimination(
+                set([self.c]), set([("a", a)])
+            )
+            self.assertAlmostEqual(p.phi_normal(set([("c", True)])), expected)
+        self.assertEqual(self.a.values(), [True, False])
+
+    def test_chain_of_twenty(self):
+        ""
+        idata = {"outcome-values": [True, False]}
+        vs = [
+            NumCatRVariable(node_id="x" + str(i), input_data=idata)
+            for i in range(20)
+        ]
+        fs = set([TabularFactor(gid="f0", scope_vars=[vs[0]], values=[0.3, 0.7])])
+        for i in range(1, 20):
+            fs.add(
+                TabularFactor(
+                    gid="f" + str(i),
+                    scope_vars=[vs[i - 1], vs[i]],
+                    values=[0.9, 0.1, 0.2, 0.8],
+                )
+            )
+        pgm = PGModel(gid="chain", nodes=set(vs), edges=set(), factors=fs)
+        p = pgm.sum_product_elimination(factors=pgm.factors(), Zs=vs[:-1])
+        self.assertEqual(p.var_ids, ["x19"])
+        self.assertAlmostEqual(sum(p.table), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()